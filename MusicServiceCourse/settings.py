@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 import os
@@ -45,7 +46,8 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django_extensions',
     'music',
-    'corsheaders'
+    'corsheaders',
+    'rest_framework',
 ]
 
 MIDDLEWARE = [
@@ -55,6 +57,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'music.middleware.TokenAuthenticationMiddleware',
+    'music.routers.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,12 +87,91 @@ WSGI_APPLICATION = 'MusicServiceCourse.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DB_ENGINE=sqlite (по умолчанию, для разработки) или postgres (продакшен)
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+# SQLite под параллельной записью: PRAGMA выполняются при каждом подключении
+# (music/sqlite.py), порядок важен — сначала ожидание блокировки
+SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),  # мс
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),  # байт
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-65536')),  # < 0 — в КиБ
+}
+SQLITE_OPTIONS = {
+    # Транзакция сразу берёт блокировку записи (BEGIN IMMEDIATE) и ждёт её
+    # busy_timeout; с DEFERRED транзакция, начавшая с чтения, при переходе
+    # к записи сразу получает «database is locked»
+    'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+}
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'music'),
+            'USER': os.getenv('DB_USER', 'music'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Перед повторным использованием соединение проверяется
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '0'))
+    if DB_POOL_MAX_SIZE:
+        # Пул соединений psycopg 3 на процесс (рекомендуется под ASGI);
+        # с пулом постоянные соединения Django не используются
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                'max_size': DB_POOL_MAX_SIZE,
+                'timeout': 10,
+            },
+        }
+    else:
+        # Постоянные соединения: одно на поток, живёт DB_CONN_MAX_AGE секунд
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': SQLITE_OPTIONS,
+            'PRAGMAS': SQLITE_PRAGMAS,
+        }
+    }
+
+# Реплики только для чтения: DB_REPLICAS — хосты PostgreSQL через запятую
+# (остальные параметры как у основной базы) или пути к файлам SQLite
+DB_REPLICA_FIELD = 'HOST' if DB_ENGINE == 'postgres' else 'NAME'
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        DB_REPLICA_FIELD: replica.strip(),
+        # В тестах реплика — та же тестовая база
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# База аналитики: журнал событий и агрегаты (routers.AnalyticsRouter)
+if DB_ENGINE == 'postgres':
+    DATABASES['analytics'] = {**DATABASES['default'], 'NAME': os.getenv('DB_ANALYTICS_NAME', 'music_analytics')}
+else:
+    DATABASES['analytics'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': BASE_DIR / 'analytics.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'PRAGMAS': SQLITE_PRAGMAS,
     }
-}
+# Сколько дней хранить сырые события после того, как они свёрнуты в агрегаты
+ANALYTICS_EVENTS_RETENTION_DAYS = 90
+# Не чаще раза в столько секунд процесс переносит прослушивания из журнала в счётчики основной базы
+ANALYTICS_FLUSH_INTERVAL = 60
+
+DATABASE_ROUTERS = ['music.routers.AnalyticsRouter', 'music.routers.ReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_STICKY_SECONDS = 10
 
 
 # Password validation
@@ -132,6 +215,100 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Поблочная загрузка аудиофайлов
+TRACK_UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'uploads')
+TRACK_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+TRACK_UPLOAD_MAX_CHUNK_SIZE = 16 * 1024 * 1024
+TRACK_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+# Блок, не дописанный за столько секунд, считается брошенным (процесс упал посреди записи)
+TRACK_UPLOAD_CHUNK_TIMEOUT = 10 * 60
+# Незавершённые загрузки без новых блоков удаляются через столько часов (проверка не чаще раза в интервал, с)
+TRACK_UPLOAD_EXPIRE_HOURS = 24
+TRACK_UPLOAD_PURGE_INTERVAL = 60 * 60
+
+# Фоновое построение отчётов: задание, которое строится дольше (с), считается зависшим
+REPORT_JOB_TIMEOUT = 30 * 60
+
+# Выгрузка полных таблиц: строк, читаемых из базы за один запрос
+EXPORT_CHUNK_SIZE = 2000
+
+# Распределения и когорты отчётов (distributions.py): недель в матрице удержания
+# и сколько секунд результаты живут в кэше
+ANALYTICS_COHORT_WEEKS = 8
+DISTRIBUTIONS_CACHE_TIMEOUT = 10 * 60
+
+# Волновая форма для плеера
+WAVEFORM_PEAKS_PER_SECOND = 10
+
+# Рекомендации «Похожие треки»
+SIMILAR_TRACKS_TOP_K = 20
+SIMILAR_TRACKS_RATING_WEIGHT = 1.0
+SIMILAR_TRACKS_PLAYLIST_WEIGHT = 1.0
+
+# Индекс «Звучит похоже» по аудио-признакам
+AUDIO_FEATURES_DIR = os.path.join(BASE_DIR, 'data', 'audio_features')
+SOUNDS_LIKE_NPROBE = 8
+
+# Режим «Радио»
+RADIO_TRANSITIONS_PER_TRACK = 50
+RADIO_GENRE_WEIGHT = 0.3
+RADIO_MAX_BATCH = 50
+
+# Умные плейлисты
+SMART_PLAYLIST_MAX_TRACKS = 500
+# Изменения треков копятся столько секунд и обрабатываются одним проходом
+SMART_PLAYLIST_REFRESH_DELAY = 1
+
+# REST API каталога (/api/v1/)
+API_MAX_BATCH_IDS = 100
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'music.tokens.StatelessTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+}
+
+# Токены API (JWT): access/refresh без обращения к сессии
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'USER_ID_FIELD': 'id',
+    'TOKEN_USER_CLASS': 'music.tokens.TokenUser',
+    'TOKEN_OBTAIN_SERIALIZER': 'music.tokens.ObtainSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'music.tokens.RefreshSerializer',
+    'UPDATE_LAST_LOGIN': False,
+}
+TOKEN_REVOCATION_REFRESH = 30
+# Токен принимается только на путях API: HTML-страницы работают с пользователем из сессии
+TOKEN_AUTH_PATH_PREFIXES = ('/api/', '/music/api/')
+
+# Кеш: Redis, если задан REDIS_URL (нужен пакет redis), иначе память процесса
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL},
+        'sessions': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL,
+                     'KEY_PREFIX': 'sessions'},
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+        'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+    }
+
+# Хранилище сессий: db | cached_db | cache | signed_cookies
+SESSION_STRATEGY = os.getenv('SESSION_STRATEGY', 'cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_STRATEGY}'
+SESSION_CACHE_ALIAS = 'sessions'
+# Как часто (в секундах) удалять истёкшие сессии из базы в фоне
+SESSION_PURGE_INTERVAL = 6 * 60 * 60
+
+# История прослушиваний (база аналитики): сколько записей хранить на пользователя и сколько дней
+PLAY_HISTORY_SIZE = 200
+PLAY_HISTORY_MAX_AGE_DAYS = 365
+# Не чаще раза в столько секунд процесс обрезает историю в фоне
+PLAY_HISTORY_TRIM_INTERVAL = 10 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -157,9 +334,16 @@ EMAIL_PORT = os.getenv('EMAIL_PORT')
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS')
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
-DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'yakov.goryachev@mail.ru')
 SERVER_EMAIL = os.getenv('SERVER_EMAIL')
 
+# Очередь рассылок (mailing.py): писем за один захват, не больше писем в секунду,
+# попыток на письмо и пауза (с) перед первой повторной попыткой — дальше она удваивается
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_RATE = float(os.getenv('EMAIL_OUTBOX_RATE', '10'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60
+
 # Fallback for development (console backend)
 if DEBUG:
     # Uncomment the line below to use console backend for testing
@@ -2,8 +2,13 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
     User, Group, Artist, ArtistGroup, Album, Genre, Track, 
-    TrackGenre, Playlist, PlaylistTrack, TrackRating, AlbumRating, Comment
+    TrackGenre, Playlist, PlaylistTrack, TrackRating, AlbumRating, Comment,
+    TrackUpload, TrackWaveform, JobWatermark, SimilarTrack, TrackAudioFeatures,
+    TrackTransition, UserStats, RevokedToken, PlayEvent, PlayHistory, DailyTrackPlays, ReportJob,
+    TrackDimension, AlbumDimension, GenreDimension, UserDimension, TrackFacts, AlbumFacts, GenreFacts,
+    UserActivityFacts, EmailCampaign, EmailOutbox
 )
+from .playlists import refresh_totals
 
 
 @admin.register(User)
@@ -98,23 +103,25 @@ class TrackGenreAdmin(admin.ModelAdmin):
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
     """Админ-панель для плейлистов"""
-    list_display = ('name', 'user', 'is_public', 'creation_date', 'get_track_count')
+    list_display = ('name', 'user', 'is_public', 'creation_date', 'track_count', 'total_duration')
     list_filter = ('is_public', 'creation_date', 'user')
     search_fields = ('name', 'user__login', 'description')
+    readonly_fields = ('track_count', 'total_duration')
     ordering = ('-creation_date', 'name')
-    
-    def get_track_count(self, obj):
-        return obj.tracks.count()
-    get_track_count.short_description = 'Количество треков'
 
 
 @admin.register(PlaylistTrack)
 class PlaylistTrackAdmin(admin.ModelAdmin):
     """Админ-панель для связи плейлистов и треков"""
-    list_display = ('playlist', 'track', 'added_date')
+    list_display = ('playlist', 'track', 'position', 'added_date')
     list_filter = ('added_date', 'playlist__user')
     search_fields = ('playlist__name', 'track__name')
     ordering = ('-added_date', 'playlist__name')
+    
+    def delete_queryset(self, request, queryset):
+        playlist_ids = set(queryset.values_list('playlist_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_totals(playlist_ids)
 
 
 @admin.register(TrackRating)
@@ -143,3 +150,190 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ('user__login', 'track__name', 'text')
     ordering = ('-created_at',)
     list_per_page = 50
+
+
+
+@admin.register(TrackUpload)
+class TrackUploadAdmin(admin.ModelAdmin):
+    """Админ-панель для поблочных загрузок"""
+    list_display = ('filename', 'user', 'track', 'received', 'size', 'status', 'updated_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('filename', 'user__login', 'track__name')
+    ordering = ('-updated_at',)
+
+
+@admin.register(TrackWaveform)
+class TrackWaveformAdmin(admin.ModelAdmin):
+    """Админ-панель для волновых форм"""
+    list_display = ('track', 'peaks_per_second', 'source', 'computed_at')
+    search_fields = ('track__name',)
+    exclude = ('peaks',)
+    ordering = ('-computed_at',)
+
+
+@admin.register(JobWatermark)
+class JobWatermarkAdmin(admin.ModelAdmin):
+    """Админ-панель для отметок фоновых заданий"""
+    list_display = ('name', 'value')
+    ordering = ('name',)
+
+
+@admin.register(SimilarTrack)
+class SimilarTrackAdmin(admin.ModelAdmin):
+    """Админ-панель для похожих треков"""
+    list_display = ('track', 'neighbor', 'score', 'rank')
+    search_fields = ('track__name', 'neighbor__name')
+    raw_id_fields = ('track', 'neighbor')
+    ordering = ('track__name', 'rank')
+
+
+@admin.register(TrackAudioFeatures)
+class TrackAudioFeaturesAdmin(admin.ModelAdmin):
+    """Админ-панель для аудио-признаков треков"""
+    list_display = ('track', 'source', 'computed_at')
+    search_fields = ('track__name',)
+    exclude = ('vector',)
+    ordering = ('-computed_at',)
+
+
+@admin.register(TrackTransition)
+class TrackTransitionAdmin(admin.ModelAdmin):
+    """Админ-панель для переходов между треками"""
+    list_display = ('source', 'target', 'weight')
+    search_fields = ('source__name', 'target__name')
+    raw_id_fields = ('source', 'target')
+    ordering = ('source__name', '-weight')
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    """Админ-панель для статистики пользователей"""
+    list_display = ('user', 'playlists_count', 'tracks_count', 'ratings_count', 'comments_count', 'plays_count', 'last_activity')
+    search_fields = ('user__login',)
+    raw_id_fields = ('user',)
+    ordering = ('-last_activity',)
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    """Админ-панель для отозванных токенов API"""
+    list_display = ('jti', 'revoked_at', 'expires_at')
+    search_fields = ('jti',)
+    ordering = ('-revoked_at',)
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """Админ-панель для заданий построения отчётов"""
+    list_display = ('format', 'export', 'status', 'progress', 'created_at', 'finished_at', 'requested_by')
+    list_filter = ('format', 'export', 'status')
+    search_fields = ('fingerprint',)
+    raw_id_fields = ('requested_by',)
+    readonly_fields = ('fingerprint',)
+    ordering = ('-created_at',)
+
+
+@admin.register(PlayEvent)
+class PlayEventAdmin(admin.ModelAdmin):
+    """Админ-панель для журнала прослушиваний (база аналитики)"""
+    list_display = ('track_id', 'user_id', 'played_at')
+    search_fields = ('track_id', 'user_id')
+    ordering = ('-played_at',)
+
+
+@admin.register(PlayHistory)
+class PlayHistoryAdmin(admin.ModelAdmin):
+    """Админ-панель для истории прослушиваний (база аналитики)"""
+    list_display = ('user_id', 'track_id', 'played_at')
+    search_fields = ('user_id', 'track_id')
+    ordering = ('-played_at',)
+
+
+@admin.register(DailyTrackPlays)
+class DailyTrackPlaysAdmin(admin.ModelAdmin):
+    """Админ-панель для дневных агрегатов прослушиваний (база аналитики)"""
+    list_display = ('day', 'track_id', 'plays', 'listeners')
+    search_fields = ('track_id',)
+    list_filter = ('day',)
+    ordering = ('-day', '-plays')
+
+
+@admin.register(TrackDimension)
+class TrackDimensionAdmin(admin.ModelAdmin):
+    """Админ-панель для измерения треков витрины отчётов"""
+    list_display = ('name', 'album_name', 'performer', 'duration', 'created_at')
+    search_fields = ('name', 'album_name', 'performer')
+
+
+@admin.register(AlbumDimension)
+class AlbumDimensionAdmin(admin.ModelAdmin):
+    """Админ-панель для измерения альбомов витрины отчётов"""
+    list_display = ('name', 'performer', 'release_year')
+    search_fields = ('name', 'performer')
+
+
+@admin.register(GenreDimension)
+class GenreDimensionAdmin(admin.ModelAdmin):
+    """Админ-панель для измерения жанров витрины отчётов"""
+    list_display = ('name',)
+    search_fields = ('name',)
+
+
+@admin.register(UserDimension)
+class UserDimensionAdmin(admin.ModelAdmin):
+    """Админ-панель для измерения пользователей витрины отчётов"""
+    list_display = ('login', 'role', 'registration_date')
+    search_fields = ('login',)
+    list_filter = ('role',)
+
+
+@admin.register(TrackFacts)
+class TrackFactsAdmin(admin.ModelAdmin):
+    """Админ-панель для показателей треков витрины отчётов"""
+    list_display = ('track', 'play_count', 'rating_count', 'rating_avg', 'comment_count')
+    search_fields = ('track__name',)
+    ordering = ('-play_count',)
+
+
+@admin.register(AlbumFacts)
+class AlbumFactsAdmin(admin.ModelAdmin):
+    """Админ-панель для показателей альбомов витрины отчётов"""
+    list_display = ('album', 'track_count', 'play_count', 'rating_count', 'rating_avg')
+    search_fields = ('album__name',)
+    ordering = ('-play_count',)
+
+
+@admin.register(GenreFacts)
+class GenreFactsAdmin(admin.ModelAdmin):
+    """Админ-панель для показателей жанров витрины отчётов"""
+    list_display = ('genre', 'track_count', 'rating_count', 'rating_avg')
+    ordering = ('-track_count',)
+
+
+@admin.register(UserActivityFacts)
+class UserActivityFactsAdmin(admin.ModelAdmin):
+    """Админ-панель для дневной активности пользователей витрины отчётов"""
+    list_display = ('day', 'user', 'playlists', 'comments', 'ratings', 'plays')
+    search_fields = ('user__login',)
+    list_filter = ('day',)
+    ordering = ('-day',)
+
+
+@admin.register(EmailCampaign)
+class EmailCampaignAdmin(admin.ModelAdmin):
+    """Админ-панель для рассылок"""
+    list_display = ('subject', 'created_by', 'created_at', 'finished_at')
+    search_fields = ('subject',)
+    raw_id_fields = ('created_by',)
+    ordering = ('-created_at',)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """Админ-панель для исходящих писем"""
+    list_display = ('to_email', 'campaign', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to_email', 'campaign__subject')
+    raw_id_fields = ('campaign',)
+    readonly_fields = ('lock_token', 'locked_until', 'last_error')
+    ordering = ('-next_attempt_at',)
@@ -0,0 +1,135 @@
+"""Журнал прослушиваний и дневные агрегаты в отдельной базе аналитики.
+
+Каждое прослушивание (в том числе анонимное) добавляет строку ``PlayEvent``
+в базу ``analytics`` (см. routers.AnalyticsRouter) — это одна вставка без
+блокировок основной базы; журнал же служит историей прослушиваний (history.py).
+Счётчики основной базы (``Track.play_count``, ``UserStats.plays_count``)
+догоняют журнал пачками: ``flush_counters`` запускается в фоне не чаще раза
+в ``ANALYTICS_FLUSH_INTERVAL`` секунд на процесс и одним UPDATE на трек
+и пользователя учитывает события с прошлой отметки.
+
+``rollup`` сворачивает события в ``DailyTrackPlays`` начиная с дня последней
+свёртки (отметка в ``JobWatermark`` основной базы) и удаляет события старше
+``ANALYTICS_EVENTS_RETENTION_DAYS``. Отчёты читают
+только агрегаты, а названия треков подтягивают из основной базы одним запросом.
+"""
+import threading
+from datetime import datetime, time, timedelta
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyTrackPlays, JobWatermark, PlayEvent, Track
+from .routers import analytics_db
+from .stats import bump
+from .tasks import run_in_background
+
+WATERMARK = 'play_rollup'
+
+COUNTERS_WATERMARK = 'play_counters'
+
+# Событие записывается с временем до вставки; последние секунды журнала
+# учитываются следующим проходом, чтобы не пропустить ещё не закоммиченные
+COUNTERS_LAG = timedelta(seconds=30)
+
+_flush_lock = threading.Lock()
+_flushed_at = None
+
+
+def record_play(user_id, track_id):
+    """Добавляет событие прослушивания в журнал"""
+    PlayEvent.objects.create(user_id=user_id, track_id=track_id, played_at=timezone.now())
+    schedule_flush()
+
+
+def schedule_flush():
+    """Запускает flush_counters в фоне, если процесс не делал этого ANALYTICS_FLUSH_INTERVAL секунд"""
+    global _flushed_at
+    now = monotonic()
+    with _flush_lock:
+        if _flushed_at is not None and now - _flushed_at < settings.ANALYTICS_FLUSH_INTERVAL:
+            return None
+        _flushed_at = now
+    return run_in_background(flush_counters)
+
+
+def flush_counters():
+    """Переносит новые события журнала в счётчики треков и пользователей. Возвращает число событий."""
+    until = timezone.now() - COUNTERS_LAG
+    since = JobWatermark.get(COUNTERS_WATERMARK)
+    if since is not None and since >= until:
+        return 0
+    events = PlayEvent.objects.filter(played_at__lt=until)
+    if since is not None:
+        events = events.filter(played_at__gte=since)
+    tracks = list(events.values('track_id').annotate(plays=Count('id')).order_by())
+    users = list(events.filter(user_id__isnull=False).values('user_id').annotate(plays=Count('id')).order_by())
+
+    with transaction.atomic():
+        # Отметка сдвигается условным UPDATE: из параллельных проходов с одной
+        # отметкой события учтёт только первый
+        if since is None:
+            if not JobWatermark.objects.get_or_create(name=COUNTERS_WATERMARK, defaults={'value': until})[1]:
+                return 0
+        elif not JobWatermark.objects.filter(name=COUNTERS_WATERMARK, value=since).update(value=until):
+            return 0
+        # updated_at сдвигается вместе со счётчиком — иначе срез витрины (snapshots.py) его не заметит
+        now = timezone.now()
+        for row in tracks:
+            Track.objects.filter(pk=row['track_id']).update(play_count=F('play_count') + row['plays'], updated_at=now)
+        for row in users:
+            bump(row['user_id'], plays_count=row['plays'])
+    return sum(row['plays'] for row in tracks)
+
+
+def rollup(full=False):
+    """Пересчитывает дневные агрегаты с дня последней свёртки (или все). Возвращает число строк."""
+    flush_counters()
+    now = timezone.now()
+    last = None if full else JobWatermark.get(WATERMARK)
+    if last is None:
+        # Полный пересчёт — с первого сохранившегося события: более ранние
+        # дни уже удалены из журнала и остаются только в агрегатах
+        last = PlayEvent.objects.order_by('played_at').values_list('played_at', flat=True).first() or now
+    # День последней свёртки мог быть посчитан не полностью — пересчитываем его целиком
+    day = timezone.localdate(last)
+    events = PlayEvent.objects.filter(played_at__gte=timezone.make_aware(datetime.combine(day, time.min)))
+    rows = [
+        DailyTrackPlays(**row)
+        for row in events.filter(played_at__lt=now)
+        .annotate(day=TruncDate('played_at'))
+        .values('day', 'track_id')
+        .annotate(plays=Count('id'), listeners=Count('user_id', distinct=True))
+        .order_by()
+    ]
+
+    with transaction.atomic(using=analytics_db()):
+        DailyTrackPlays.objects.filter(day__gte=day).delete()
+        DailyTrackPlays.objects.bulk_create(rows, batch_size=1000)
+
+    if settings.ANALYTICS_EVENTS_RETENTION_DAYS:
+        PlayEvent.objects.filter(played_at__lt=now - timedelta(days=settings.ANALYTICS_EVENTS_RETENTION_DAYS)).delete()
+    JobWatermark.set(WATERMARK, now)
+    return len(rows)
+
+
+def top_tracks(days=30, limit=20):
+    """Самые прослушиваемые треки за последние дни: список (трек, прослушивания, слушатели за день — суммарно)"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = list(
+        DailyTrackPlays.objects.filter(day__gte=since)
+        .values('track_id')
+        .annotate(plays=Sum('plays'), listeners=Sum('listeners'))
+        .order_by('-plays')[:limit]
+    )
+    # Каталог в другой базе — JOIN невозможен, берём треки одним запросом
+    tracks = Track.objects.select_related('album').in_bulk([row['track_id'] for row in totals])
+    return [
+        (tracks[row['track_id']], row['plays'], row['listeners'])
+        for row in totals
+        if row['track_id'] in tracks
+    ]
@@ -0,0 +1,184 @@
+"""REST API каталога ``/api/v1/`` (Django REST framework).
+
+Все эндпоинты только читают и понимают общие параметры:
+
+* ``?fields=name,duration`` — разреженный набор полей (``id`` есть всегда);
+* ``?include=album,genres`` — вложенные связанные объекты. Каждая связь
+  подгружается одним JOIN (``select_related``) или одним дополнительным
+  запросом на всю страницу (``prefetch_related``);
+* ``?ids=<uuid>,<uuid>`` — пакетное чтение по идентификаторам без пагинации.
+
+Поэтому число запросов к базе зависит только от набора ``include``,
+но не от размера страницы.
+"""
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from rest_framework import status, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Album, Artist, Genre, Group, Playlist, PlaylistTrack, Track
+from .serializers import (
+    AlbumSerializer, ArtistSerializer, GenreSerializer, GroupSerializer,
+    PlaylistEntrySerializer, PlaylistSerializer, TrackSerializer,
+)
+from .tokens import StatelessTokenAuthentication, revoke
+
+# Связь для ?include=: сериализатор, атрибут объекта, список или один объект,
+# и как её подгрузить — select_related или prefetch_related (строка или Prefetch)
+Include = namedtuple('Include', ['serializer', 'source', 'many', 'select', 'prefetch'])
+
+
+def select(serializer, source):
+    return Include(serializer, source, False, source, None)
+
+
+def prefetch(serializer, source, lookup=None):
+    return Include(serializer, source, True, None, lookup or source)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+class CatalogPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CatalogViewSet(viewsets.ReadOnlyModelViewSet):
+    """Базовый набор эндпоинтов каталога: fields, include и ids"""
+    pagination_class = CatalogPagination
+    includes = {}
+
+    def requested_includes(self):
+        names = _split(self.request.query_params.get('include'))
+        unknown = [name for name in names if name not in self.includes]
+        if unknown:
+            raise ValidationError({'include': f"Неизвестная связь: {', '.join(unknown)}"})
+        return {name: self.includes[name] for name in names}
+
+    def requested_ids(self):
+        try:
+            ids = [uuid.UUID(value) for value in _split(self.request.query_params.get('ids'))]
+        except ValueError:
+            raise ValidationError({'ids': 'Неверный идентификатор'})
+        if len(ids) > settings.API_MAX_BATCH_IDS:
+            raise ValidationError({'ids': f'Не больше {settings.API_MAX_BATCH_IDS} идентификаторов'})
+        return ids
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for spec in self.requested_includes().values():
+            if spec.select:
+                queryset = queryset.select_related(spec.select)
+            else:
+                queryset = queryset.prefetch_related(spec.prefetch)
+        if self.action == 'list' and 'ids' in self.request.query_params:
+            queryset = queryset.filter(pk__in=self.requested_ids())
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        # Пакетное чтение отдаёт все запрошенные объекты сразу
+        if 'ids' in self.request.query_params:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.request.query_params.get('fields')
+        if fields is not None:
+            kwargs['fields'] = _split(fields)
+        kwargs['include'] = {
+            name: self.include_field(name, spec) for name, spec in self.requested_includes().items()
+        }
+        return super().get_serializer(*args, **kwargs)
+
+    @staticmethod
+    def include_field(name, spec):
+        # DRF запрещает source, совпадающий с именем поля
+        options = {'source': spec.source} if spec.source != name else {}
+        return spec.serializer(many=spec.many, read_only=True, **options)
+
+
+class GenreViewSet(CatalogViewSet):
+    queryset = Genre.objects.order_by('name')
+    serializer_class = GenreSerializer
+
+
+class GroupViewSet(CatalogViewSet):
+    queryset = Group.objects.order_by('name', 'id')
+    serializer_class = GroupSerializer
+    includes = {
+        'albums': prefetch(AlbumSerializer, 'album_set'),
+    }
+
+
+class ArtistViewSet(CatalogViewSet):
+    queryset = Artist.objects.order_by('name', 'id')
+    serializer_class = ArtistSerializer
+    includes = {
+        'albums': prefetch(AlbumSerializer, 'album_set'),
+    }
+
+
+class AlbumViewSet(CatalogViewSet):
+    queryset = Album.objects.order_by('-release_date', 'name', 'id')
+    serializer_class = AlbumSerializer
+    includes = {
+        'artist': select(ArtistSerializer, 'artist'),
+        'group': select(GroupSerializer, 'group'),
+        'tracks': prefetch(TrackSerializer, 'track_set'),
+    }
+
+
+class TrackViewSet(CatalogViewSet):
+    queryset = Track.objects.order_by('-created_at', 'id')
+    serializer_class = TrackSerializer
+    includes = {
+        'album': select(AlbumSerializer, 'album'),
+        'genres': prefetch(GenreSerializer, 'genres'),
+    }
+
+
+class PlaylistViewSet(CatalogViewSet):
+    queryset = Playlist.objects.order_by('-creation_date', 'id')
+    serializer_class = PlaylistSerializer
+    includes = {
+        'genres': prefetch(GenreSerializer, 'genres'),
+        'tracks': prefetch(
+            PlaylistEntrySerializer, 'playlist_tracks',
+            Prefetch('playlist_tracks', queryset=PlaylistTrack.objects.select_related('track').order_by('position')),
+        ),
+    }
+
+    def get_queryset(self):
+        # Чужие закрытые плейлисты не видны
+        visible = Q(is_public=True)
+        if self.request.user.is_authenticated:
+            visible |= Q(user_id=self.request.user.pk)
+        return super().get_queryset().filter(visible)
+
+
+class TokenRevokeView(APIView):
+    """Выход из API: отзывает refresh-токен из тела запроса и access-токен из заголовка"""
+    authentication_classes = [StatelessTokenAuthentication]
+    permission_classes = []
+
+    def post(self, request):
+        try:
+            refresh = RefreshToken(request.data.get('refresh', ''))
+        except TokenError:
+            raise ValidationError({'refresh': 'Недействительный токен'})
+
+        revoke(refresh)
+        if request.auth is not None:
+            revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
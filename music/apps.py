@@ -5,3 +5,6 @@ class MusicConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'music'
     verbose_name = 'Музыкальный сервис'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,89 @@
+"""Декодирование аудиофайлов в отсчёты NumPy.
+
+WAV читается стандартным модулем ``wave``, остальные форматы (MP3, FLAC,
+OGG) — через ``ffmpeg``, если он установлен. Отсчёты отдаются блоками,
+поэтому файл любой длины декодируется с постоянным расходом памяти.
+"""
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+
+# Размер блока в отсчётах (на канал)
+BLOCK_FRAMES = 1 << 16
+
+# Частота дискретизации, к которой ffmpeg приводит сжатые форматы
+FFMPEG_SAMPLE_RATE = 22050
+
+
+class AudioDecodeError(Exception):
+    """Файл не удалось декодировать"""
+
+
+def _pcm_to_float(raw, sample_width, channels):
+    """Преобразует PCM-байты в моно-сигнал float32 в диапазоне [-1, 1]"""
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        # 24-бит: дополняем каждый отсчёт до 32 бит и сдвигаем обратно со знаком
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = (b[:, 0] << 8) | (b[:, 1] << 16) | (b[:, 2] << 24)
+        samples = (ints >> 8).astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f'Неподдерживаемая разрядность: {sample_width * 8} бит')
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def _iter_wav(path, block_frames):
+    with wave.open(path, 'rb') as wav_file:
+        channels = wav_file.getnchannels()
+        sample_width = wav_file.getsampwidth()
+        while True:
+            raw = wav_file.readframes(block_frames)
+            if not raw:
+                break
+            yield _pcm_to_float(raw, sample_width, channels)
+
+
+def _iter_ffmpeg(path, block_frames):
+    process = subprocess.Popen(
+        ['ffmpeg', '-v', 'error', '-i', path, '-f', 'f32le', '-ac', '1',
+         '-ar', str(FFMPEG_SAMPLE_RATE), '-'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        block_bytes = block_frames * 4
+        while True:
+            raw = process.stdout.read(block_bytes)
+            if not raw:
+                break
+            # Обрезаем хвост, не кратный размеру отсчёта
+            raw = raw[:len(raw) - len(raw) % 4]
+            yield np.frombuffer(raw, dtype='<f4')
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def open_audio(path, block_frames=BLOCK_FRAMES):
+    """Возвращает (частота дискретизации, генератор моно-блоков float32)"""
+    if path.lower().endswith('.wav'):
+        try:
+            with wave.open(path, 'rb') as wav_file:
+                sample_rate = wav_file.getframerate()
+        except (wave.Error, EOFError) as e:
+            raise AudioDecodeError(str(e)) from e
+        return sample_rate, _iter_wav(path, block_frames)
+
+    if shutil.which('ffmpeg') is None:
+        raise AudioDecodeError('Для декодирования этого формата требуется ffmpeg')
+    return FFMPEG_SAMPLE_RATE, _iter_ffmpeg(path, block_frames)
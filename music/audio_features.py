@@ -0,0 +1,135 @@
+"""Извлечение аудио-эмбеддинга фиксированной длины из файла трека.
+
+Сигнал режется на кадры, для каждого кадра считаются MFCC и спектральные
+признаки (центроид, ширина, спад, плоскостность, ZCR, громкость). Эмбеддинг —
+среднее и стандартное отклонение этих признаков по всем кадрам. Статистики
+накапливаются по блокам, поэтому файл не загружается в память целиком.
+"""
+import numpy as np
+from django.utils import timezone
+
+from .audio import open_audio
+
+N_FFT = 2048
+HOP_LENGTH = 1024
+N_MELS = 40
+N_MFCC = 20
+ROLLOFF = 0.85
+EPS = 1e-10
+
+# MFCC + центроид, ширина, спад, плоскостность, ZCR, громкость
+FRAME_FEATURES = N_MFCC + 6
+EMBEDDING_SIZE = FRAME_FEATURES * 2
+
+
+def mel_filterbank(sample_rate, n_fft=N_FFT, n_mels=N_MELS):
+    """Треугольные мел-фильтры, матрица (n_mels, n_fft // 2 + 1)"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    edges = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2.0), n_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (freqs - lower) / (center - lower)
+    falling = (upper - freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def dct_matrix(n_out=N_MFCC, n_in=N_MELS):
+    """Ортонормированная матрица DCT-II"""
+    k = np.arange(n_out)[:, None]
+    n = np.arange(n_in)[None, :]
+    basis = np.cos(np.pi / n_in * (n + 0.5) * k) * np.sqrt(2.0 / n_in)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+class FeatureAccumulator:
+    """Накопитель покадровых признаков: считает сумму и сумму квадратов"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.window = np.hanning(N_FFT).astype(np.float32)
+        self.freqs = np.fft.rfftfreq(N_FFT, 1.0 / sample_rate).astype(np.float32)
+        self.filterbank = mel_filterbank(sample_rate)
+        self.dct = dct_matrix()
+        self.count = 0
+        self.total = np.zeros(FRAME_FEATURES, dtype=np.float64)
+        self.total_sq = np.zeros(FRAME_FEATURES, dtype=np.float64)
+
+    def frame_features(self, frames):
+        """Признаки для пачки кадров (n_frames, N_FFT) -> (n_frames, FRAME_FEATURES)"""
+        nyquist = self.sample_rate / 2.0
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        total = power.sum(axis=1) + EPS
+
+        mfcc = np.log(power @ self.filterbank.T + EPS) @ self.dct.T
+        centroid = (power @ self.freqs) / total
+        bandwidth = np.sqrt(np.maximum((power @ self.freqs ** 2) / total - centroid ** 2, 0.0))
+        rolloff = self.freqs[np.argmax(np.cumsum(power, axis=1) >= ROLLOFF * total[:, None], axis=1)]
+        flatness = np.exp(np.log(power + EPS).mean(axis=1)) / (power.mean(axis=1) + EPS)
+        zcr = np.abs(np.diff(np.signbit(frames), axis=1)).mean(axis=1)
+        loudness = 10.0 * np.log10((frames ** 2).mean(axis=1) + EPS)
+
+        return np.column_stack([
+            mfcc,
+            centroid / nyquist,
+            bandwidth / nyquist,
+            rolloff / nyquist,
+            flatness,
+            zcr,
+            loudness,
+        ])
+
+    def add(self, frames):
+        features = self.frame_features(frames).astype(np.float64)
+        self.count += features.shape[0]
+        self.total += features.sum(axis=0)
+        self.total_sq += (features ** 2).sum(axis=0)
+
+    def embedding(self):
+        if not self.count:
+            return None
+        mean = self.total / self.count
+        std = np.sqrt(np.maximum(self.total_sq / self.count - mean ** 2, 0.0))
+        return np.concatenate([mean, std]).astype(np.float32)
+
+
+def compute_embedding(path):
+    """Эмбеддинг файла длиной EMBEDDING_SIZE (float32) или None для слишком короткого файла"""
+    sample_rate, blocks = open_audio(path)
+    accumulator = FeatureAccumulator(sample_rate)
+    leftover = np.empty(0, dtype=np.float32)
+
+    for block in blocks:
+        data = np.concatenate((leftover, block)) if leftover.size else block
+        if data.size < N_FFT:
+            leftover = data
+            continue
+        frames = np.lib.stride_tricks.sliding_window_view(data, N_FFT)[::HOP_LENGTH]
+        accumulator.add(frames)
+        leftover = data[frames.shape[0] * HOP_LENGTH:]
+
+    return accumulator.embedding()
+
+
+def extract_features(track):
+    """Считает эмбеддинг файла трека и сохраняет его"""
+    from .models import TrackAudioFeatures
+
+    vector = compute_embedding(track.file.path)
+    if vector is None:
+        return None
+
+    features, _ = TrackAudioFeatures.objects.update_or_create(
+        track=track,
+        defaults={
+            'vector': vector.tobytes(),
+            'source': track.file.name,
+            'computed_at': timezone.now(),
+        },
+    )
+    return features
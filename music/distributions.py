@@ -0,0 +1,203 @@
+"""Распределения и когорты для отчётов, посчитанные в NumPy.
+
+Нужные столбцы (оценки, прослушивания, длительности, даты регистрации
+и активности) выгружаются из базы порциями по ``CHUNK_SIZE`` строк прямо
+в массивы NumPy — без экземпляров моделей и без промежуточных списков на всю
+таблицу, — а гистограммы, перцентили и матрица удержания считаются
+векторно. Когорты строятся по витрине (snapshots.py): измерению
+пользователей и их дневной активности.
+
+Каждая таблица — список кортежей для страницы отчётов, XLSX/PDF
+и выгрузки CSV. ``build`` считает все таблицы и кладёт их в кэш на
+``DISTRIBUTIONS_CACHE_TIMEOUT`` секунд; его вызывают build_snapshots
+и фоновое задание. Запросы расчёт не ждут: ``summary`` при пустом кэше
+запускает ``build`` в фоне и возвращает None («ещё не готово»).
+"""
+import threading
+from datetime import date, datetime, time
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import AlbumRating, Track, TrackRating, UserActivityFacts, UserDimension
+from .tasks import run_in_background
+
+CHUNK_SIZE = 10000
+
+CACHE_KEY = 'music:distributions'
+
+# Особые типы столбцов для load_columns
+UUID = 'uuid'  # hex-строка
+DAY = 'day'    # порядковый номер местной даты (date.toordinal)
+
+PERCENTILES = (50, 75, 90, 95, 99)
+
+# Гистограмма длительностей: корзины по минуте, последняя — «и дольше»
+DURATION_BIN = 60
+DURATION_BINS = 10
+
+_build_lock = threading.Lock()
+_builder = None
+
+
+def load_columns(queryset, **fields):
+    """Выгружает поля queryset в массивы NumPy порциями по CHUNK_SIZE строк.
+
+    Значение аргумента — dtype NumPy, ``UUID`` или ``DAY``.
+    """
+    names = list(fields)
+    rows = queryset.values_list(*names).iterator(chunk_size=CHUNK_SIZE)
+    parts = {name: [] for name in names}
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        for name, values in zip(names, zip(*chunk)):
+            parts[name].append(_array(values, fields[name]))
+    return [
+        np.concatenate(parts[name]) if parts[name] else _array((), fields[name])
+        for name in names
+    ]
+
+
+def _array(values, kind):
+    if kind == UUID:
+        return np.array([value.hex for value in values], dtype='U32')
+    if kind == DAY:
+        return np.array([_ordinal(value) for value in values], dtype=np.int64)
+    return np.array(values, dtype=kind)
+
+
+def _ordinal(value):
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.toordinal()
+
+
+def _week(ordinal):
+    # Порядковый номер 1 (01.01.0001) — понедельник, поэтому недели начинаются с понедельника
+    return (ordinal - 1) // 7
+
+
+def _share(count, total):
+    return round(100 * int(count) / int(total), 1) if total else 0.0
+
+
+def rating_distribution():
+    """Гистограмма оценок: (оценка, оценок треков, %, оценок альбомов, %)"""
+    (tracks,) = load_columns(TrackRating.objects.all(), value=np.int64)
+    (albums,) = load_columns(AlbumRating.objects.all(), value=np.int64)
+    track_counts = np.bincount(tracks, minlength=6)[1:6]
+    album_counts = np.bincount(albums, minlength=6)[1:6]
+    return [
+        (value, int(track_count), _share(track_count, tracks.size), int(album_count), _share(album_count, albums.size))
+        for value, track_count, album_count in zip(range(1, 6), track_counts, album_counts)
+    ]
+
+
+def play_count_percentiles():
+    """Перцентили и сводка прослушиваний треков: (показатель, значение)"""
+    (plays,) = load_columns(Track.objects.all(), play_count=np.int64)
+    if not plays.size:
+        return []
+    values = np.percentile(plays, PERCENTILES)
+    return [(f'{p}-й перцентиль', round(float(v), 1)) for p, v in zip(PERCENTILES, values)] + [
+        ('Среднее', round(float(plays.mean()), 1)),
+        ('Максимум', int(plays.max())),
+        ('Треков без прослушиваний, %', _share(np.count_nonzero(plays == 0), plays.size)),
+    ]
+
+
+def duration_distribution():
+    """Гистограмма длительностей треков: (интервал, треков, %)"""
+    (durations,) = load_columns(Track.objects.filter(duration__isnull=False), duration=np.int64)
+    counts = np.bincount(np.minimum(durations // DURATION_BIN, DURATION_BINS), minlength=DURATION_BINS + 1)
+    minutes = DURATION_BIN // 60
+    labels = [f'{i * minutes}–{(i + 1) * minutes} мин' for i in range(DURATION_BINS)]
+    labels.append(f'{DURATION_BINS * minutes}+ мин')
+    return [(label, int(count), _share(count, durations.size)) for label, count in zip(labels, counts)]
+
+
+def retention_cohorts(weeks=None):
+    """Недельные когорты: (понедельник недели регистрации, пользователей, % активных на неделе 0..weeks-1)
+
+    Активность — любой день в ``UserActivityFacts`` (прослушивания, оценки,
+    комментарии, плейлисты). Ещё не наступившие недели и пустые когорты — None.
+    """
+    weeks = weeks or settings.ANALYTICS_COHORT_WEEKS
+    first = _week(timezone.localdate().toordinal()) - weeks + 1
+    since = date.fromordinal(first * 7 + 1)
+
+    users, registered = load_columns(
+        UserDimension.objects.filter(registration_date__gte=timezone.make_aware(datetime.combine(since, time.min))),
+        id=UUID, registration_date=DAY,
+    )
+    cohorts = _week(registered) - first
+    order = np.argsort(users)
+    users, cohorts = users[order], cohorts[order]
+    sizes = np.bincount(cohorts, minlength=weeks)[:weeks]
+
+    retained = np.zeros((weeks, weeks), dtype=np.int64)
+    if users.size:
+        active, days = load_columns(UserActivityFacts.objects.filter(day__gte=since), user_id=UUID, day=DAY)
+        codes = np.minimum(np.searchsorted(users, active), users.size - 1)
+        known = users[codes] == active
+        codes = codes[known]
+        offsets = _week(days[known]) - first - cohorts[codes]
+        valid = offsets >= 0
+        # Пользователь считается на неделе один раз, сколько бы дней он ни был активен
+        pairs = np.unique(codes[valid] * weeks + offsets[valid])
+        cells = cohorts[pairs // weeks] * weeks + pairs % weeks
+        retained = np.bincount(cells, minlength=weeks * weeks).reshape(weeks, weeks)
+
+    return [
+        (date.fromordinal((first + cohort) * 7 + 1), int(sizes[cohort]), *[
+            _share(retained[cohort, offset], sizes[cohort]) if sizes[cohort] and cohort + offset < weeks else None
+            for offset in range(weeks)
+        ])
+        for cohort in range(weeks)
+    ]
+
+
+# Имя таблицы: (название, заголовки колонок, функция расчёта)
+TABLES = {
+    'ratings': ('Распределение оценок', [
+        'Оценка', 'Оценок треков', 'Доля треков, %', 'Оценок альбомов', 'Доля альбомов, %',
+    ], rating_distribution),
+    'plays': ('Перцентили прослушиваний', ['Показатель', 'Прослушиваний трека'], play_count_percentiles),
+    'durations': ('Длительность треков', ['Длительность', 'Треков', 'Доля, %'], duration_distribution),
+    'retention': ('Удержание по неделям', [
+        'Неделя регистрации', 'Пользователей',
+        *[f'Неделя {offset}, %' for offset in range(settings.ANALYTICS_COHORT_WEEKS)],
+    ], retention_cohorts),
+}
+
+
+def build():
+    """Считает все таблицы распределений и кладёт их в кэш: {имя: строки}"""
+    tables = {name: compute() for name, (title, header, compute) in TABLES.items()}
+    cache.set(CACHE_KEY, tables, settings.DISTRIBUTIONS_CACHE_TIMEOUT)
+    return tables
+
+
+def schedule_build():
+    """Запускает build в фоне, если процесс уже не считает таблицы"""
+    global _builder
+    with _build_lock:
+        if _builder is not None and _builder.is_alive():
+            return None
+        _builder = run_in_background(build)
+        return _builder
+
+
+def summary():
+    """Все таблицы распределений из кэша: {имя: строки}; None, пока они считаются в фоне"""
+    tables = cache.get(CACHE_KEY)
+    if tables is None:
+        schedule_build()
+    return tables
+
+
+def table(name):
+    """Строки одной таблицы распределений для выгрузки: из кэша, а при пустом кэше — посчитанные здесь же"""
+    return (cache.get(CACHE_KEY) or build())[name]
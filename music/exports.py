@@ -0,0 +1,123 @@
+"""Выгрузка полных таблиц в CSV и XLSX с постоянным расходом памяти.
+
+Строки читаются ``QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE)`` в виде
+кортежей (``values_list``, без экземпляров моделей) и сразу уходят дальше:
+в CSV — по строке в ``StreamingHttpResponse``, в XLSX — в лист openpyxl
+в режиме write-only, который держит строки во временном файле, а не в памяти.
+CSV отдаётся прямо в запросе; книгу XLSX запрос не ждёт — её собирает
+фоновое задание отчёта (``ReportJob`` с полем ``export``, см. reports.py),
+а файл скачивается по готовности. Под ASGI строки забираются порциями через
+``sync_to_async`` (streaming.py), иначе Django прочитал бы ответ целиком
+перед отправкой.
+Порядок выгрузки совпадает с существующими индексами, поэтому база не
+сортирует всю таблицу перед первой строкой. Таблицы распределений
+(distributions.py) небольшие и берутся из их кэша.
+"""
+import csv
+import tempfile
+from datetime import datetime
+from functools import partial
+from uuid import UUID
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from . import distributions, streaming
+from .models import Comment, PlaylistTrack, Track, TrackRating
+
+# Имя выгрузки: (название, заголовки колонок, функция, возвращающая values_list или строки)
+EXPORTS = {
+    'tracks': ('Треки', [
+        'ID', 'Название', 'Альбом', 'Артист', 'Группа', 'Длительность (с)',
+        'Прослушивания', 'Файл', 'Дата добавления',
+    ], lambda: Track.objects.order_by('pk').values_list(
+        'id', 'name', 'album__name', 'album__artist__name', 'album__group__name', 'duration',
+        'play_count', 'file', 'created_at',
+    )),
+    'ratings': ('Оценки треков', [
+        'Пользователь', 'Трек', 'Оценка', 'Дата оценки',
+    ], lambda: TrackRating.objects.order_by('user_id', 'track_id').values_list(
+        'user__login', 'track__name', 'value', 'rating_date',
+    )),
+    'comments': ('Комментарии', [
+        'Трек', 'Пользователь', 'Текст', 'Дата создания',
+    ], lambda: Comment.objects.order_by('track_id', '-created_at').values_list(
+        'track__name', 'user__login', 'text', 'created_at',
+    )),
+    'playlists': ('Состав плейлистов', [
+        'ID плейлиста', 'Плейлист', 'Владелец', 'Публичный', 'Позиция', 'Трек', 'Дата добавления',
+    ], lambda: PlaylistTrack.objects.order_by('playlist_id', 'position').values_list(
+        'playlist_id', 'playlist__name', 'playlist__user__login', 'playlist__is_public', 'position',
+        'track__name', 'added_date',
+    )),
+}
+
+# Таблицы распределений (distributions.py) выгружаются под именами stats_<имя>
+STATS_PREFIX = 'stats_'
+EXPORTS.update({
+    STATS_PREFIX + name: (title, header, partial(distributions.table, name))
+    for name, (title, header, _) in distributions.TABLES.items()
+})
+
+FORMATS = ['csv', 'xlsx']
+
+
+def rows(name):
+    """Строки выгрузки без заголовка, порциями из базы"""
+    source = EXPORTS[name][2]()
+    if isinstance(source, QuerySet):
+        return source.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    return iter(source)
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: записанная строка сразу возвращается"""
+
+    def write(self, value):
+        return value
+
+
+def _value(value):
+    # Даты — в местном времени без пояса (Excel не хранит пояс), UUID — строкой
+    if isinstance(value, datetime):
+        return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _csv_lines(name):
+    writer = csv.writer(_Echo())
+    # BOM — чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+    yield '\ufeff' + writer.writerow(EXPORTS[name][1])
+    for row in rows(name):
+        yield writer.writerow([_value(value) for value in row])
+
+
+def csv_response(request, name):
+    response = StreamingHttpResponse(
+        streaming.content(request, _csv_lines(name), settings.EXPORT_CHUNK_SIZE),
+        content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+    return response
+
+
+def xlsx_file(name):
+    """Книга XLSX с выгрузкой ``name`` во временном файле (выполняется в фоне, см. reports.build)"""
+    import openpyxl
+
+    title, header, _ = EXPORTS[name]
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows(name):
+        sheet.append([_value(value) for value in row])
+
+    # Файл удаляется при закрытии
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import User, Playlist, Comment, Track, Album, Artist, Group, Genre
+from .smart_playlists import RULES as SMART_RULES
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -70,6 +71,32 @@ class UserLoginForm(forms.Form):
 
 class PlaylistForm(forms.ModelForm):
     """Форма создания/редактирования плейлиста"""
+    is_smart = forms.BooleanField(
+        required=False,
+        label='Умный плейлист',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    min_rating = forms.FloatField(
+        required=False, min_value=1, max_value=5,
+        label='Оценка не ниже',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.5'})
+    )
+    min_duration = forms.IntegerField(
+        required=False, min_value=0,
+        label='Длительность от (сек)',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    max_duration = forms.IntegerField(
+        required=False, min_value=1,
+        label='Длительность до (сек)',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    added_within_days = forms.IntegerField(
+        required=False, min_value=1,
+        label='Добавлен за последние (дней)',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    
     class Meta:
         model = Playlist
         fields = ['name', 'description', 'is_public', 'photo', 'genres']
@@ -95,11 +122,33 @@ class PlaylistForm(forms.ModelForm):
             })
         }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        rules = self.instance.rules
+        if rules is not None:
+            self.initial['is_smart'] = True
+            self.initial.update(rules)
+    
     def clean_name(self):
         name = self.cleaned_data.get('name')
         if not name.strip():
             raise forms.ValidationError('Название плейлиста не может быть пустым')
         return name.strip()
+    
+    def save(self, commit=True):
+        playlist = super().save(commit=False)
+        if self.cleaned_data.get('is_smart'):
+            playlist.rules = {
+                field: self.cleaned_data[field]
+                for field in SMART_RULES
+                if self.cleaned_data.get(field) is not None
+            }
+        else:
+            playlist.rules = None
+        if commit:
+            playlist.save()
+            self.save_m2m()
+        return playlist
 
 
 class CommentForm(forms.ModelForm):
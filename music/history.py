@@ -0,0 +1,93 @@
+"""История прослушиваний пользователя.
+
+История — отдельная таблица ``PlayHistory`` в базе аналитики рядом с журналом
+``PlayEvent`` (analytics.py): прослушивание добавляет по строке в обе, поэтому
+поток прослушиваний не нагружает основную базу. «Последние N» читаются по
+покрывающему индексу (user_id, -played_at, track_id). У каждого пользователя
+хранится не больше ``PLAY_HISTORY_SIZE`` записей: ``trim`` в фоне (не чаще
+раза в ``PLAY_HISTORY_TRIM_INTERVAL`` секунд на процесс) удаляет у тех, кто
+слушал с прошлой очистки, записи сверх буфера, а у всех — записи старше
+``PLAY_HISTORY_MAX_AGE_DAYS``.
+"""
+import threading
+from datetime import timedelta
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics
+from .models import JobWatermark, PlayHistory, Track
+from .routers import analytics_db
+from .tasks import run_in_background
+
+WATERMARK = 'play_history_trim'
+
+_trim_lock = threading.Lock()
+_trimmed_at = None
+
+
+def record_play(user, track):
+    """Учитывает прослушивание трека: событие в журнале аналитики и запись в истории пользователя"""
+    with transaction.atomic(using=analytics_db()):
+        analytics.record_play(user.pk, track.pk)
+        if user.is_authenticated:
+            PlayHistory.objects.create(user_id=user.pk, track_id=track.pk, played_at=timezone.now())
+    if user.is_authenticated:
+        schedule_trim()
+
+
+def recent(user):
+    """История пользователя, начиная с последнего прослушивания"""
+    return PlayHistory.objects.filter(user_id=user.pk).order_by('-played_at')[:settings.PLAY_HISTORY_SIZE]
+
+
+def with_tracks(plays):
+    """Подставляет прослушиваниям треки (``play.track``) одним запросом к основной базе; удалённые треки пропускаются"""
+    plays = list(plays)
+    # Каталог в другой базе — JOIN невозможен
+    tracks = Track.objects.select_related('album', 'album__artist', 'album__group').in_bulk(
+        {play.track_id for play in plays}
+    )
+    for play in plays:
+        play.track = tracks.get(play.track_id)
+    return [play for play in plays if play.track is not None]
+
+
+def trim(user_ids=None):
+    """Удаляет записи сверх буфера и старше PLAY_HISTORY_MAX_AGE_DAYS. Возвращает их количество.
+
+    Без ``user_ids`` буфер обрезается у пользователей, слушавших с прошлой очистки.
+    """
+    now = timezone.now()
+    incremental = user_ids is None
+    if incremental:
+        since = JobWatermark.get(WATERMARK)
+        active = PlayHistory.objects.all()
+        if since is not None:
+            active = active.filter(played_at__gte=since)
+        user_ids = active.values_list('user_id', flat=True).distinct().order_by()
+
+    count = 0
+    for user_id in list(user_ids):
+        keep = PlayHistory.objects.filter(user_id=user_id).order_by('-played_at').values('pk')[:settings.PLAY_HISTORY_SIZE]
+        count += PlayHistory.objects.filter(user_id=user_id).exclude(pk__in=keep).delete()[0]
+    if settings.PLAY_HISTORY_MAX_AGE_DAYS:
+        count += PlayHistory.objects.filter(
+            played_at__lt=now - timedelta(days=settings.PLAY_HISTORY_MAX_AGE_DAYS)
+        ).delete()[0]
+    if incremental:
+        JobWatermark.set(WATERMARK, now)
+    return count
+
+
+def schedule_trim():
+    """Запускает trim в фоне, если процесс не делал этого PLAY_HISTORY_TRIM_INTERVAL секунд"""
+    global _trimmed_at
+    now = monotonic()
+    with _trim_lock:
+        if _trimmed_at is not None and now - _trimmed_at < settings.PLAY_HISTORY_TRIM_INTERVAL:
+            return None
+        _trimmed_at = now
+    return run_in_background(trim)
@@ -0,0 +1,198 @@
+"""Рассылки администратора через очередь исходящих писем.
+
+``enqueue`` сохраняет рассылку и по строке ``EmailOutbox`` на получателя
+и запускает ``deliver`` в фоне — запрос администратора не ждёт SMTP.
+``deliver`` захватывает письма порциями по ``EMAIL_OUTBOX_BATCH_SIZE``
+условным UPDATE с арендой (``lock_token``, ``locked_until``), поэтому два
+обработчика не отправят одно письмо дважды, и отправляет их через одно
+соединение ``get_connection()`` на весь проход — не быстрее
+``EMAIL_OUTBOX_RATE`` писем в секунду. Неудачная попытка откладывает письмо
+с удваивающейся паузой; после ``EMAIL_OUTBOX_MAX_ATTEMPTS`` попыток (или сразу,
+если сервер отверг адрес) письмо помечается ошибкой. Очередь переживает
+перезапуск процесса: ``send_outbox`` доотправляет оставшееся.
+"""
+import logging
+import smtplib
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Min, Q, Subquery
+from django.utils import timezone
+
+from .models import EmailCampaign, EmailOutbox
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+# Наименьшая аренда захваченной порции: после неё письма упавшего обработчика снова в очереди
+LEASE = timedelta(minutes=10)
+
+# Адрес отвергнут сервером — повторять бесполезно
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+# Соединение разорвано — его нужно открыть заново
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, OSError)
+
+# В процессе работает один обработчик: иначе лимит скорости умножался бы на число потоков
+_running = threading.Lock()
+
+
+def enqueue(subject, message, recipients, user=None):
+    """Ставит рассылку в очередь и запускает отправку в фоне"""
+    with transaction.atomic():
+        campaign = EmailCampaign.objects.create(
+            subject=subject, message=message, from_email=settings.DEFAULT_FROM_EMAIL, created_by=user,
+        )
+        EmailOutbox.objects.bulk_create(
+            [EmailOutbox(campaign=campaign, to_email=email) for email in dict.fromkeys(recipients)],
+            batch_size=1000,
+        )
+        transaction.on_commit(lambda: run_in_background(deliver))
+    return campaign
+
+
+def deliver(wait=True):
+    """Отправляет письма из очереди; с ``wait`` дожидается и повторных попыток. Возвращает число отправленных."""
+    sent = 0
+    while _running.acquire(blocking=False):
+        try:
+            sent += _deliver(wait)
+        finally:
+            _running.release()
+        # Письма, поставленные, пока обработчик завершался, иначе ждали бы send_outbox
+        if not _due().exists():
+            break
+    return sent
+
+
+def progress(campaign_id):
+    """Счётчики писем рассылки"""
+    counts = EmailOutbox.objects.filter(campaign_id=campaign_id).aggregate(
+        total=Count('pk'),
+        sent=Count('pk', filter=Q(status='sent')),
+        failed=Count('pk', filter=Q(status='failed')),
+        pending=Count('pk', filter=Q(status='pending')),
+    )
+    counts['status'] = 'running' if counts['pending'] else 'done'
+    return counts
+
+
+def _due(now=None):
+    now = now or timezone.now()
+    return EmailOutbox.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        status='pending', next_attempt_at__lte=now,
+    )
+
+
+def lease():
+    """Аренда порции: вдвое дольше её отправки с лимитом EMAIL_OUTBOX_RATE, но не меньше LEASE"""
+    if settings.EMAIL_OUTBOX_RATE <= 0:
+        return LEASE
+    return max(LEASE, timedelta(seconds=2 * settings.EMAIL_OUTBOX_BATCH_SIZE / settings.EMAIL_OUTBOX_RATE))
+
+
+def _claim(token):
+    """Захватывает очередную порцию писем, срок отправки которых наступил"""
+    now = timezone.now()
+    due = _due(now).order_by('next_attempt_at').values('pk')[:settings.EMAIL_OUTBOX_BATCH_SIZE]
+    # Условия повторены снаружи: PostgreSQL перепроверит их, если строку уже захватил другой обработчик
+    _due(now).filter(pk__in=Subquery(due)).update(lock_token=token, locked_until=now + lease())
+    return list(EmailOutbox.objects.filter(lock_token=token, status='pending').select_related('campaign'))
+
+
+def _renew(token):
+    """Продлевает аренду ещё не отправленных писем порции"""
+    EmailOutbox.objects.filter(lock_token=token, status='pending').update(locked_until=timezone.now() + lease())
+
+
+def _deliver(wait):
+    token = uuid.uuid4()
+    interval = 1 / settings.EMAIL_OUTBOX_RATE if settings.EMAIL_OUTBOX_RATE > 0 else 0
+    sent = 0
+    while True:
+        # Соединение открыто на весь проход и закрывается на время ожидания повторных попыток
+        with get_connection() as connection:
+            next_send = time.monotonic()
+            while batch := _claim(token):
+                # Медленный сервер может растянуть порцию дольше аренды — продлеваем её на полпути
+                renew_at = time.monotonic() + lease().total_seconds() / 2
+                for email in batch:
+                    if time.monotonic() >= renew_at:
+                        _renew(token)
+                        renew_at = time.monotonic() + lease().total_seconds() / 2
+                    time.sleep(max(0, next_send - time.monotonic()))
+                    next_send = max(next_send, time.monotonic()) + interval
+                    if _send(connection, email):
+                        sent += 1
+                _finish({email.campaign_id for email in batch})
+
+        if not wait:
+            return sent
+        pause = _next_retry()
+        if pause is None:
+            return sent
+        time.sleep(pause)
+
+
+def _send(connection, email):
+    message = EmailMessage(
+        subject=email.campaign.subject, body=email.campaign.message,
+        from_email=email.campaign.from_email, to=[email.to_email], connection=connection,
+    )
+    try:
+        # По одному письму, чтобы знать исход каждого; соединение при этом не переоткрывается
+        connection.send_messages([message])
+    except Exception as error:
+        logger.warning('Не удалось отправить письмо %s: %s', email.to_email, error)
+        _fail(email, error)
+        if isinstance(error, CONNECTION_ERRORS):
+            _reopen(connection)
+        return False
+    EmailOutbox.objects.filter(pk=email.pk).update(
+        status='sent', sent_at=timezone.now(), attempts=email.attempts + 1,
+        last_error='', lock_token=None, locked_until=None,
+    )
+    return True
+
+
+def _fail(email, error):
+    attempts = email.attempts + 1
+    failed = isinstance(error, PERMANENT_ERRORS) or attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    EmailOutbox.objects.filter(pk=email.pk).update(
+        status='failed' if failed else 'pending',
+        attempts=attempts,
+        next_attempt_at=timezone.now() + timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)),
+        last_error=str(error),
+        lock_token=None,
+        locked_until=None,
+    )
+
+
+def _reopen(connection):
+    connection.close()
+    try:
+        connection.open()
+    except Exception as error:
+        # Следующие письма порции тоже уйдут на повтор
+        logger.warning('Не удалось переподключиться к почтовому серверу: %s', error)
+
+
+def _finish(campaign_ids):
+    """Отмечает завершёнными рассылки без писем в очереди"""
+    EmailCampaign.objects.filter(pk__in=campaign_ids, finished_at__isnull=True).exclude(
+        emails__status='pending'
+    ).update(finished_at=timezone.now())
+
+
+def _next_retry():
+    """Секунды до ближайшей повторной попытки или None, если очередь пуста"""
+    first = EmailOutbox.objects.filter(status='pending').aggregate(first=Min('next_attempt_at'))['first']
+    if first is None:
+        return None
+    return max(0.0, (first - timezone.now()).total_seconds())
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from music.models import Track, User
+
+# Эндпоинт: (HTTP-метод, функция построения URL по треку)
+ENDPOINTS = {
+    'playlists': ('get', lambda track: reverse('music:api_get_playlists')),
+    'play': ('post', lambda track: reverse('music:api_play_track', args=[track.pk])),
+}
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность JSON API под WSGI и ASGI при параллельных запросах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='playlists',
+                            help='Проверяемый эндпоинт')
+        parser.add_argument('--requests', type=int, default=500, help='Количество запросов')
+        parser.add_argument('--concurrency', type=int, default=50, help='Одновременных запросов под ASGI')
+        parser.add_argument('--threads', type=int, default=4, help='Рабочих потоков WSGI-сервера')
+        parser.add_argument('--user', help='Логин пользователя, от имени которого идут запросы')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(login=options['user']) if options['user'] else User.objects.order_by('date_joined')
+        user = users.first()
+        track = Track.objects.first()
+        if user is None or track is None:
+            raise CommandError('Для замера нужны хотя бы один пользователь и один трек')
+
+        method, build_url = ENDPOINTS[options['endpoint']]
+        url = build_url(track)
+        total = options['requests']
+
+        results = {
+            'WSGI': self._run_wsgi(user, method, url, total, options['threads']),
+            'ASGI': asyncio.run(self._run_asgi(user, method, url, total, options['concurrency'])),
+        }
+        for name, (elapsed, failed) in results.items():
+            self.stdout.write(
+                f'{name}: {total / elapsed:.1f} запросов/с, {elapsed * 1000 / total:.2f} мс на запрос, ошибок: {failed}'
+            )
+        speedup = results['WSGI'][0] / results['ASGI'][0]
+        self.stdout.write(self.style.SUCCESS(f'ASGI / WSGI: {speedup:.2f}x'))
+
+    def _run_wsgi(self, user, method, url, total, threads):
+        """Синхронный обработчик: не больше ``threads`` запросов одновременно"""
+        def worker(count):
+            client = Client()
+            client.force_login(user)
+            failed = 0
+            try:
+                for _ in range(count):
+                    failed += getattr(client, method)(url).status_code >= 400
+            finally:
+                close_old_connections()
+            return failed
+
+        shares = [total // threads + (i < total % threads) for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            failed = sum(executor.map(worker, shares))
+        return time.perf_counter() - started, failed
+
+    async def _run_asgi(self, user, method, url, total, concurrency):
+        """Асинхронный обработчик: ``concurrency`` запросов в одном цикле событий"""
+        client = AsyncClient()
+        await client.aforce_login(user)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                response = await getattr(client, method)(url)
+            return response.status_code >= 400
+
+        started = time.perf_counter()
+        failed = sum(await asyncio.gather(*(request() for _ in range(total))))
+        return time.perf_counter() - started, failed
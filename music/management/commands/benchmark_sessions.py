@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from music.models import User
+
+STRATEGIES = ['db', 'cached_db', 'cache', 'signed_cookies']
+
+PAGES = ['music:home', 'music:track_list', 'music:playlist_list']
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает число запросов к базе на страницу для разных хранилищ сессий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Запросов на режим')
+        parser.add_argument('--user', help='Логин пользователя для режима со входом')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(login=options['user']) if options['user'] else User.objects.order_by('date_joined')
+        user = users.first()
+        if user is None:
+            raise CommandError('Для замера нужен хотя бы один пользователь')
+
+        urls = [reverse(name) for name in PAGES]
+        count = options['requests']
+        self.stdout.write(f"{'Хранилище':<16}{'Гость':>18}{'Со входом':>18}   (запросов на страницу / из них к сессиям)")
+        for strategy in STRATEGIES:
+            with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{strategy}'):
+                anonymous = self._measure(Client(), urls, count)
+                client = Client()
+                client.force_login(user)
+                logged_in = self._measure(client, urls, count)
+            self.stdout.write(
+                f'{strategy:<16}{anonymous[0]:>10.2f} / {anonymous[1]:<5.2f}{logged_in[0]:>10.2f} / {logged_in[1]:<5.2f}'
+            )
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def _measure(self, client, urls, count):
+        """Среднее число запросов на страницу: (всего, к таблице сессий)"""
+        # Первый проход прогревает кеш сессии и выставляет cookie
+        for url in urls:
+            client.get(url)
+        total = sessions = 0
+        for i in range(count):
+            with CaptureQueriesContext(connection) as queries:
+                client.get(urls[i % len(urls)])
+            total += len(queries)
+            sessions += sum('django_session' in query['sql'] for query in queries.captured_queries)
+        return total / count, sessions / count
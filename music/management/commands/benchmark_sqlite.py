@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+from django.test import Client
+from django.urls import reverse
+
+from music.models import Track, User
+
+# Режим: (OPTIONS, PRAGMAS); первый — настройки Django и SQLite по умолчанию
+PROFILES = {
+    'По умолчанию': ({}, {'journal_mode': 'delete'}),
+    'WAL + IMMEDIATE': (settings.SQLITE_OPTIONS, settings.SQLITE_PRAGMAS),
+}
+
+# Пишущие запросы, между которыми делится нагрузка: (имя URL, данные формы)
+WRITES = [
+    ('music:rate_track', {'rating': '4'}),
+    ('music:api_play_track', {}),
+    ('music:add_comment', {'text': 'Замер параллельной записи'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность записи и долю ошибок блокировки SQLite до и после настройки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=600, help='Пишущих запросов на режим')
+        parser.add_argument('--threads', type=int, default=8, help='Параллельных потоков')
+        parser.add_argument('--user', help='Логин пользователя, от имени которого идут запросы')
+
+    def handle(self, *args, **options):
+        aliases = [alias for alias in connections if connections[alias].vendor == 'sqlite']
+        if 'default' not in aliases:
+            raise CommandError('Замер только для SQLite (DB_ENGINE=sqlite)')
+        for alias in aliases:
+            if not os.path.exists(connections[alias].settings_dict['NAME']):
+                raise CommandError(f'База {alias} не найдена: выполните migrate --database={alias}')
+
+        users = User.objects.filter(login=options['user']) if options['user'] else User.objects.order_by('date_joined')
+        user = users.first()
+        tracks = list(Track.objects.values_list('pk', flat=True)[:50])
+        if user is None or not tracks:
+            raise CommandError('Для замера нужны хотя бы один пользователь и один трек')
+
+        total = options['requests']
+        results = {}
+        for name, (db_options, pragmas) in PROFILES.items():
+            with self._copies(aliases, db_options, pragmas):
+                results[name] = self._run(user, tracks, total, options['threads'])
+        rates = []
+        for name, (elapsed, locked, failed) in results.items():
+            # Пропускная способность — только по успешным записям, ошибки показываются отдельно
+            succeeded = total - locked - failed
+            rates.append(succeeded / elapsed)
+            self.stdout.write(
+                f'{name}: {rates[-1]:.1f} успешных записей/с, успешно: {succeeded * 100 / total:.1f}%, '
+                f'ошибок «database is locked»: {locked} ({locked * 100 / total:.1f}%), '
+                f'других ответов 5xx: {failed}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Ускорение записи: {rates[-1] / rates[0]:.2f}x'))
+
+    @contextmanager
+    def _copies(self, aliases, db_options, pragmas):
+        """Подменяет базы SQLite временными копиями с заданными параметрами соединения"""
+        saved = {alias: dict(connections[alias].settings_dict) for alias in aliases}
+        with tempfile.TemporaryDirectory() as directory:
+            for alias in aliases:
+                config = connections[alias].settings_dict
+                path = os.path.join(directory, f'{alias}.sqlite3')
+                with sqlite3.connect(config['NAME']) as source, sqlite3.connect(path) as target:
+                    source.backup(target)
+                connections[alias].close()
+                # Словарь настроек общий для соединений всех потоков
+                config.update(NAME=path, OPTIONS=db_options, PRAGMAS=pragmas)
+            try:
+                yield
+            finally:
+                for thread in threading.enumerate():
+                    if thread.name.startswith('task-'):
+                        thread.join()
+                for alias in aliases:
+                    connections[alias].close()
+                    connections[alias].settings_dict.update(saved[alias])
+
+    def _run(self, user, tracks, total, threads):
+        """Выполняет ``total`` пишущих запросов в ``threads`` потоков: (время, ошибок блокировки, других ответов 5xx)"""
+        clients = []
+        for _ in range(threads):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        connections.close_all()
+
+        def worker(index):
+            client = clients[index]
+            locked = failed = 0
+            try:
+                for number in range(index, total, threads):
+                    name, data = WRITES[number % len(WRITES)]
+                    url = reverse(name, args=[tracks[number % len(tracks)]])
+                    try:
+                        response = client.post(url, data)
+                    except OperationalError as error:
+                        if 'locked' not in str(error):
+                            raise
+                        locked += 1
+                        continue
+                    if response.status_code < 400:
+                        continue
+                    # Представления API сами ловят исключения и отвечают JSON с кодом 5xx —
+                    # такая запись не удалась, даже если исключение до клиента не дошло;
+                    # 503 — OperationalError базы (api_play_track), то есть блокировка
+                    body = response.content.decode('utf-8', 'replace')
+                    if response.status_code < 500:
+                        raise CommandError(f'POST {url}: {response.status_code} {body[:200]}')
+                    if response.status_code == 503 or 'locked' in body:
+                        locked += 1
+                    else:
+                        failed += 1
+            finally:
+                close_old_connections()
+            return locked, failed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            counts = list(executor.map(worker, range(threads)))
+        elapsed = time.perf_counter() - started
+        return elapsed, sum(locked for locked, _ in counts), sum(failed for _, failed in counts)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from music.recommendations import refresh_similar_tracks
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу «Похожие треки» по оценкам и плейлистам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Полный пересчёт (учитывает удаления и изменения оценок)')
+        parser.add_argument('--top-k', type=int, default=None, help='Количество соседей на трек')
+
+    def handle(self, *args, **options):
+        count = refresh_similar_tracks(full=options['full'], top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано треков: {count}'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from music import distributions
+from music.snapshots import refresh
+
+
+class Command(BaseCommand):
+    help = 'Обновляет витрину отчётов (измерения и факты в базе аналитики) с прошлого среза'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересобрать витрину целиком, учитывая удаления и переименования')
+
+    def handle(self, *args, **options):
+        tracks, albums, genres, users = refresh(full=options['full'])
+        # Когорты строятся по витрине — пересчитываем их по свежему срезу
+        distributions.build()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено треков: {tracks}, альбомов: {albums}, жанров: {genres}, пользователей: {users}'
+        ))
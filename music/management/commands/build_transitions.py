@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from music.radio import build_transitions
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу переходов между треками для режима «Радио»'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-track', type=int, default=None,
+                            help='Сколько самых вероятных переходов хранить для трека')
+
+    def handle(self, *args, **options):
+        count = build_transitions(per_track=options['per_track'])
+        self.stdout.write(self.style.SUCCESS(f'Сохранено переходов: {count}'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from music.audio import AudioDecodeError
+from music.models import Track, TrackWaveform
+from music.waveform import build_waveform
+
+
+class Command(BaseCommand):
+    help = 'Рассчитывает пики волновой формы для треков, у которых их ещё нет или сменился файл'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересчитать пики для всех треков')
+        parser.add_argument('--track', action='append', default=[], help='ID трека (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        tracks = Track.objects.exclude(file='').exclude(file__isnull=True).only('id', 'name', 'file')
+        if options['track']:
+            tracks = tracks.filter(pk__in=options['track'])
+
+        # Файл, по которому уже рассчитаны пики, для каждого трека
+        computed = dict(TrackWaveform.objects.values_list('track_id', 'source'))
+
+        done = skipped = failed = 0
+        for track in tracks.iterator(chunk_size=500):
+            if not options['force'] and computed.get(track.pk) == track.file.name:
+                skipped += 1
+                continue
+            try:
+                waveform = build_waveform(track)
+            except (AudioDecodeError, OSError) as e:
+                failed += 1
+                self.stderr.write(f'{track.name}: {e}')
+                continue
+            done += 1
+            self.stdout.write(f'{track.name}: {len(waveform.peaks)} байт')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Рассчитано: {done}, без изменений: {skipped}, ошибок: {failed}'
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from music.audio import AudioDecodeError
+from music.audio_features import extract_features
+from music.models import Track, TrackAudioFeatures
+from music.sounds_like import build_index
+
+
+class Command(BaseCommand):
+    help = 'Извлекает аудио-эмбеддинги треков и перестраивает индекс «Звучит похоже»'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересчитать эмбеддинги для всех треков')
+        parser.add_argument('--track', action='append', default=[], help='ID трека (можно указать несколько раз)')
+        parser.add_argument('--no-index', action='store_true', help='Не перестраивать индекс после извлечения')
+
+    def handle(self, *args, **options):
+        tracks = Track.objects.exclude(file='').exclude(file__isnull=True).only('id', 'name', 'file')
+        if options['track']:
+            tracks = tracks.filter(pk__in=options['track'])
+
+        computed = dict(TrackAudioFeatures.objects.values_list('track_id', 'source'))
+
+        done = skipped = failed = 0
+        for track in tracks.iterator(chunk_size=500):
+            if not options['force'] and computed.get(track.pk) == track.file.name:
+                skipped += 1
+                continue
+            try:
+                features = extract_features(track)
+            except (AudioDecodeError, OSError) as e:
+                failed += 1
+                self.stderr.write(f'{track.name}: {e}')
+                continue
+            if features is None:
+                failed += 1
+                self.stderr.write(f'{track.name}: файл слишком короткий')
+                continue
+            done += 1
+
+        self.stdout.write(f'Рассчитано: {done}, без изменений: {skipped}, ошибок: {failed}')
+
+        if not options['no_index']:
+            rows = TrackAudioFeatures.objects.values_list('track_id', 'vector').iterator(chunk_size=2000)
+            count = build_index(rows)
+            self.stdout.write(self.style.SUCCESS(f'Индекс перестроен: {count} треков'))
@@ -0,0 +1,167 @@
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+
+from music import tasks
+from music import urls as music_urls
+from music.models import Album, Artist, Comment, Genre, Group, Playlist, Track, TrackUpload, User
+
+# Модель для параметра URL: по имени параметра (track_id) или, для pk, по имени URL.
+# Порядок важен: в «remove_from_playlist» и «playlist_detail» главный объект — плейлист.
+SAMPLES = [
+    ('playlist', Playlist),
+    ('comment', Comment),
+    ('upload', TrackUpload),
+    ('genre', Genre),
+    ('album', Album),
+    ('artist', Artist),
+    ('group', Group),
+    ('track', Track),
+]
+
+# Проблемы в плане запроса: (вид, регулярное выражение по строке плана; группа 1 — таблица)
+PROBLEMS = {
+    'sqlite': [
+        ('полный просмотр таблицы', re.compile(r'^SCAN ([^\s(]\S*)$')),
+        ('сортировка во временном B-дереве', re.compile(r'^USE TEMP B-TREE FOR (.+)$')),
+    ],
+    'postgresql': [
+        ('полный просмотр таблицы', re.compile(r'Seq Scan on (\S+)')),
+        ('сортировка', re.compile(r'Sort Key: (.+)')),
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = 'Открывает каждый URL приложения, выполняет EXPLAIN для его запросов и показывает полные просмотры и сортировки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Логин пользователя, от имени которого идут запросы (по умолчанию — администратор)')
+        parser.add_argument('--url', help='Проверять только URL, содержащие эту строку')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(login=options['user']) if options['user'] else User.objects.filter(role='admin')
+        user = users.first()
+        if user is None:
+            raise CommandError('Пользователь не найден')
+
+        self.verbosity = options['verbosity']
+        flagged = total = 0
+        # Страницы могут писать (счётчики, история) — всё откатывается
+        with self._atomic(), self._no_background_tasks():
+            client = Client()
+            for name, kwargs in self._urls():
+                if kwargs is None:
+                    if not options['url']:
+                        self.stdout.write(self.style.WARNING(f'{name}: нет объекта для параметров URL, пропущен'))
+                    continue
+                url = reverse(f'music:{name}', kwargs=kwargs)
+                if options['url'] and options['url'] not in url:
+                    continue
+                total += 1
+                # Среди URL есть выход из аккаунта — входим заново перед каждым
+                client.force_login(user)
+                flagged += self._audit(client, url)
+            for alias in connections:
+                transaction.set_rollback(True, using=alias)
+
+        self.stdout.write(self.style.SUCCESS(f'Проверено URL: {total}, с проблемами: {flagged}'))
+
+    def _atomic(self):
+        """Транзакция (или точка сохранения) во всех базах"""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(transaction.atomic(using=alias))
+        return stack
+
+    def _no_background_tasks(self):
+        """Отключает фоновые задачи: их поток пишет своим соединением, мимо откатываемой транзакции"""
+        stack = ExitStack()
+        original = tasks.run_in_background
+        # Модули импортируют run_in_background по имени — подменяем в каждом
+        for name, module in list(sys.modules.items()):
+            if name.startswith('music.') and getattr(module, 'run_in_background', None) is original:
+                stack.enter_context(mock.patch.object(module, 'run_in_background', lambda *args, **kwargs: None))
+        return stack
+
+    def _urls(self):
+        """Имена URL приложения и параметры для них (None — нет подходящего объекта)"""
+        for pattern in self._patterns(music_urls.urlpatterns):
+            params = list(pattern.pattern.regex.groupindex)
+            if 'format' in params:
+                continue
+            kwargs = {}
+            for param in params:
+                word = param[:-3] if param.endswith('_id') else pattern.name
+                model = next((model for prefix, model in SAMPLES if prefix in word.lower()), None)
+                pk = model.objects.values_list('pk', flat=True).first() if model else None
+                if pk is None:
+                    kwargs = None
+                    break
+                kwargs[param] = pk
+            yield pattern.name, kwargs
+
+    def _patterns(self, patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from self._patterns(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                yield pattern
+
+    def _audit(self, client, url):
+        """Запрашивает URL и проверяет планы его SELECT-запросов. Возвращает 1, если есть проблемы."""
+        with ExitStack() as stack:
+            captured = {alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections}
+            try:
+                with self._atomic():
+                    status = client.get(url).status_code
+            except Exception as error:
+                status = type(error).__name__
+
+        problems = Counter()
+        examples = {}
+        count = 0
+        for alias, queries in captured.items():
+            count += len(queries)
+            for sql in dict.fromkeys(query['sql'] for query in queries.captured_queries):
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                for problem in self._explain(connections[alias], sql):
+                    problems[problem] += 1
+                    examples.setdefault(problem, sql)
+
+        line = f'GET {url} [{status}] — запросов: {count}'
+        if not problems:
+            self.stdout.write(line)
+            return 0
+        self.stdout.write(self.style.WARNING(line))
+        for (kind, table), times in problems.most_common():
+            self.stdout.write(f'  {kind}: {table}' + (f' ×{times}' if times > 1 else ''))
+            if self.verbosity > 1:
+                self.stdout.write(f'    {examples[kind, table][:300]}')
+        return 1
+
+    def _explain(self, connection, sql):
+        """Проблемы в плане запроса: список (вид, таблица)"""
+        rules = PROBLEMS.get(connection.vendor)
+        if rules is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            # В SQLite строка плана — (id, parent, notused, detail), в PostgreSQL — (строка,)
+            plan = [row[-1] for row in cursor.fetchall()]
+        found = []
+        for step in plan:
+            for kind, pattern in rules:
+                match = pattern.search(step.strip())
+                if match:
+                    found.append((kind, match.group(1)))
+        return found
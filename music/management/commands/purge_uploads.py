@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from music.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Удаляет незавершённые загрузки старше TRACK_UPLOAD_EXPIRE_HOURS и их временные файлы'
+
+    def handle(self, *args, **options):
+        count = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {count}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from music.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику пользователей (UserStats) из исходных таблиц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', default=None,
+                            help='ID пользователя (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        count = rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено пользователей: {count}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from music.smart_playlists import refresh_all
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает снимки треков умных плейлистов (в т.ч. правила «добавлен за N дней»)'
+
+    def handle(self, *args, **options):
+        count = refresh_all()
+        self.stdout.write(self.style.SUCCESS(f'Обновлено умных плейлистов: {count}'))
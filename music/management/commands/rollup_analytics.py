@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from music.analytics import rollup
+
+
+class Command(BaseCommand):
+    help = 'Сворачивает журнал прослушиваний в дневные агрегаты базы аналитики'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать все дни, сохранившиеся в журнале, а не только с последней свёртки')
+
+    def handle(self, *args, **options):
+        count = rollup(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Агрегатов записано: {count}'))
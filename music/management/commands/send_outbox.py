@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from music.mailing import deliver
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди рассылок, срок отправки которых наступил'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wait', action='store_true',
+                            help='Дождаться повторных попыток, пока очередь не опустеет')
+
+    def handle(self, *args, **options):
+        sent = deliver(wait=options['wait'])
+        self.stdout.write(self.style.SUCCESS(f'Отправлено писем: {sent}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from music.history import trim
+
+
+class Command(BaseCommand):
+    help = 'Удаляет устаревшие записи истории прослушиваний (за пределами буфера и старше PLAY_HISTORY_MAX_AGE_DAYS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', default=None,
+                            help='ID пользователя (можно указать несколько раз)')
+
+    def handle(self, *args, **options):
+        count = trim(options['users'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {count}'))
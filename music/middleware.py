@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.exceptions import AuthenticationFailed
+
+from .tokens import StatelessTokenAuthentication
+
+
+class TokenAuthenticationMiddleware(MiddlewareMixin):
+    """Подставляет пользователя из токена ``Authorization: Bearer`` вместо сессии.
+
+    Ставится после AuthenticationMiddleware: её ленивый ``request.user``
+    заменяется до того, как кто-то к нему обратится, поэтому ни сессия,
+    ни строка пользователя из базы не читаются. Работает только на путях
+    ``TOKEN_AUTH_PATH_PREFIXES``: представления API фильтруют по ``user_id``,
+    а HTML-страницы передают ``request.user`` в ORM как экземпляр модели.
+    """
+
+    def process_request(self, request):
+        if not request.path_info.startswith(settings.TOKEN_AUTH_PATH_PREFIXES):
+            return None
+        try:
+            result = StatelessTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return JsonResponse({'error': 'Недействительный токен'}, status=401)
+        if result is None:
+            return None
+
+        user = result[0]
+
+        async def auser():
+            return user
+
+        request.user = user
+        request.auser = auser
+        # Токен передаётся явно, а не cookie, поэтому CSRF-проверка не нужна
+        request._dont_enforce_csrf_checks = True
+        return None
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 06:52
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0010_playlist_genres'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер файла (байт)')),
+                ('received', models.BigIntegerField(default=0, verbose_name='Получено байт')),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('complete', 'Завершена')], default='uploading', max_length=20, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('track', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='music.track', verbose_name='Трек')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Загрузка трека',
+                'verbose_name_plural': 'Загрузки треков',
+                'db_table': 'загрузки_треков',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 06:54
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0011_trackupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackWaveform',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('peaks', models.BinaryField(verbose_name='Пики (int8: min, max)')),
+                ('peaks_per_second', models.PositiveSmallIntegerField(verbose_name='Пар пиков в секунду')),
+                ('source', models.CharField(max_length=255, verbose_name='Файл, по которому рассчитаны пики')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчета')),
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='waveform', to='music.track', verbose_name='Трек')),
+            ],
+            options={
+                'verbose_name': 'Волновая форма',
+                'verbose_name_plural': 'Волновые формы',
+                'db_table': 'волновые_формы',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 06:56
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0012_trackwaveform'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobWatermark',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Задание')),
+                ('value', models.DateTimeField(verbose_name='Обработано до')),
+            ],
+            options={
+                'verbose_name': 'Отметка задания',
+                'verbose_name_plural': 'Отметки заданий',
+                'db_table': 'отметки_заданий',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarTrack',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='music.track', verbose_name='Похожий трек')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_tracks', to='music.track', verbose_name='Трек')),
+            ],
+            options={
+                'verbose_name': 'Похожий трек',
+                'verbose_name_plural': 'Похожие треки',
+                'db_table': 'похожие_треки',
+                'indexes': [models.Index(fields=['track', 'rank'], name='similar_track_rank_idx')],
+                'unique_together': {('track', 'neighbor')},
+            },
+        ),
+    ]
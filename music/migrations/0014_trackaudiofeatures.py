@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 06:59
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0013_jobwatermark_similartrack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackAudioFeatures',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('vector', models.BinaryField(verbose_name='Эмбеддинг (float32)')),
+                ('source', models.CharField(max_length=255, verbose_name='Файл, по которому рассчитан эмбеддинг')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчета')),
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='audio_features', to='music.track', verbose_name='Трек')),
+            ],
+            options={
+                'verbose_name': 'Аудио-признаки трека',
+                'verbose_name_plural': 'Аудио-признаки треков',
+                'db_table': 'аудио_признаки',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 07:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0014_trackaudiofeatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackTransition',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('weight', models.FloatField(verbose_name='Вероятность перехода')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='music.track', verbose_name='Трек')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='music.track', verbose_name='Следующий трек')),
+            ],
+            options={
+                'verbose_name': 'Переход между треками',
+                'verbose_name_plural': 'Переходы между треками',
+                'db_table': 'переходы_треков',
+                'indexes': [models.Index(fields=['source', '-weight'], name='transition_source_weight_idx')],
+                'unique_together': {('source', 'target')},
+            },
+        ),
+    ]
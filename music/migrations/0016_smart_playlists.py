@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 07:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0015_tracktransition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='rules',
+            field=models.JSONField(blank=True, null=True, verbose_name='Правила умного плейлиста'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+    ]
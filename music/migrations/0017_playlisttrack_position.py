@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-19 08:10
+
+from django.db import migrations, models
+
+POSITION_GAP = 1024
+
+
+def fill_positions(apps, schema_editor):
+    """Нумерует треки существующих плейлистов в порядке добавления"""
+    PlaylistTrack = apps.get_model('music', 'PlaylistTrack')
+    batch = []
+    previous, index = None, 0
+    for entry in PlaylistTrack.objects.order_by('playlist_id', 'added_date').only('id', 'playlist_id').iterator(chunk_size=2000):
+        index = index + 1 if entry.playlist_id == previous else 1
+        previous = entry.playlist_id
+        entry.position = index * POSITION_GAP
+        batch.append(entry)
+        if len(batch) >= 1000:
+            PlaylistTrack.objects.bulk_update(batch, ['position'])
+            batch = []
+    if batch:
+        PlaylistTrack.objects.bulk_update(batch, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0016_smart_playlists'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='playlisttrack',
+            options={'ordering': ['position'], 'verbose_name': 'Трек в плейлисте', 'verbose_name_plural': 'Треки в плейлистах'},
+        ),
+        migrations.AddField(
+            model_name='playlisttrack',
+            name='position',
+            field=models.BigIntegerField(default=0, verbose_name='Позиция'),
+        ),
+        migrations.AddIndex(
+            model_name='playlisttrack',
+            index=models.Index(fields=['playlist', 'position'], name='playlist_track_position_idx'),
+        ),
+        migrations.RunPython(fill_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-19 07:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    """Считает количество треков и длительность существующих плейлистов"""
+    Playlist = apps.get_model('music', 'Playlist')
+    PlaylistTrack = apps.get_model('music', 'PlaylistTrack')
+    entries = PlaylistTrack.objects.filter(playlist=OuterRef('pk')).order_by().values('playlist')
+    Playlist.objects.update(
+        track_count=Coalesce(Subquery(entries.annotate(n=Count('pk')).values('n')), 0),
+        total_duration=Coalesce(Subquery(entries.annotate(s=Sum('track__duration')).values('s')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0017_playlisttrack_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='total_duration',
+            field=models.PositiveIntegerField(default=0, verbose_name='Общая длительность (в секундах)'),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='track_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество треков'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
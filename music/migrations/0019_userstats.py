@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-19 07:09
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_user_stats(apps, schema_editor):
+    """Создаёт строки статистики для существующих пользователей"""
+    User = apps.get_model('music', 'User')
+    UserStats = apps.get_model('music', 'UserStats')
+    # Идентификаторы копируются сырым SQL как хранятся: в старой базе есть id с дефисами,
+    # а через ORM они вернулись бы в другой записи и не совпали бы с ключом пользователя
+    quote = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT {quote("id")} FROM {quote(User._meta.db_table)}')
+        user_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            f'INSERT INTO {quote(UserStats._meta.db_table)} ({quote("id")}, {quote("user_id")}, '
+            f'{quote("playlists_count")}, {quote("tracks_count")}, {quote("total_duration")}, '
+            f'{quote("ratings_count")}, {quote("comments_count")}, {quote("plays_count")}) '
+            f'VALUES (%s, %s, 0, 0, 0, 0, 0, 0)',
+            [(uuid.uuid4().hex, user_id) for user_id in user_ids],
+        )
+
+    def count(model_name):
+        rows = apps.get_model('music', model_name).objects.filter(user=OuterRef('user_id')).order_by().values('user')
+        return Coalesce(Subquery(rows.annotate(n=Count('pk')).values('n')), 0)
+
+    playlists = apps.get_model('music', 'Playlist').objects.filter(user=OuterRef('user_id')).order_by().values('user')
+    UserStats.objects.update(
+        playlists_count=count('Playlist'),
+        ratings_count=count('TrackRating') + count('AlbumRating'),
+        comments_count=count('Comment'),
+        tracks_count=Coalesce(Subquery(playlists.annotate(n=Sum('track_count')).values('n')), 0),
+        total_duration=Coalesce(Subquery(playlists.annotate(n=Sum('total_duration')).values('n')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0018_playlist_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('playlists_count', models.PositiveIntegerField(default=0, verbose_name='Плейлистов')),
+                ('tracks_count', models.PositiveIntegerField(default=0, verbose_name='Треков в плейлистах')),
+                ('total_duration', models.PositiveBigIntegerField(default=0, verbose_name='Длительность плейлистов (в секундах)')),
+                ('ratings_count', models.PositiveIntegerField(default=0, verbose_name='Оценок')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('plays_count', models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')),
+                ('last_activity', models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+                'db_table': 'статистика_пользователей',
+                'indexes': [models.Index(fields=['-playlists_count'], name='user_stats_playlists_idx'), models.Index(fields=['-comments_count'], name='user_stats_comments_idx'), models.Index(fields=['-last_activity'], name='user_stats_activity_idx')],
+            },
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
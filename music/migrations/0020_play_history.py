@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 07:13
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0019_userstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayHistory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('slot', models.PositiveIntegerField(verbose_name='Ячейка')),
+                ('played_at', models.DateTimeField(verbose_name='Время прослушивания')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='music.track', verbose_name='Трек')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='play_history', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Прослушивание',
+                'verbose_name_plural': 'История прослушиваний',
+                'db_table': 'история_прослушиваний',
+                'indexes': [models.Index(fields=['user', '-played_at', 'track'], name='play_history_recent_idx')],
+                'unique_together': {('user', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 07:18
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0020_play_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('jti', models.CharField(max_length=64, unique=True, verbose_name='Идентификатор токена')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+                ('revoked_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата отзыва')),
+            ],
+            options={
+                'verbose_name': 'Отозванный токен',
+                'verbose_name_plural': 'Отозванные токены',
+                'db_table': 'отозванные_токены',
+            },
+        ),
+    ]
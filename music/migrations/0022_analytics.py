@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-19 07:25
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0021_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField(blank=True, null=True, verbose_name='Пользователь')),
+                ('track_id', models.UUIDField(verbose_name='Трек')),
+                ('played_at', models.DateTimeField(db_index=True, verbose_name='Время прослушивания')),
+            ],
+            options={
+                'verbose_name': 'Событие прослушивания',
+                'verbose_name_plural': 'События прослушиваний',
+                'db_table': 'события_прослушиваний',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyTrackPlays',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField(verbose_name='День')),
+                ('track_id', models.UUIDField(verbose_name='Трек')),
+                ('plays', models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')),
+                ('listeners', models.PositiveIntegerField(default=0, verbose_name='Слушателей')),
+            ],
+            options={
+                'verbose_name': 'Прослушивания за день',
+                'verbose_name_plural': 'Прослушивания по дням',
+                'db_table': 'прослушивания_по_дням',
+                'unique_together': {('day', 'track_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-19 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('music', '0022_analytics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['-release_date', 'name', 'id'], name='album_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['artist', '-release_date'], name='album_artist_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['group', '-release_date'], name='album_group_release_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['-play_count'], name='album_play_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='artist',
+            index=models.Index(fields=['name', 'id'], name='artist_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['track', '-created_at'], name='comment_track_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['name', 'id'], name='group_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-creation_date', 'id'], name='playlist_public_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(fields=['user', '-creation_date'], name='playlist_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlisttrack',
+            index=models.Index(fields=['playlist', 'added_date'], name='playlist_track_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['-play_count', '-id'], name='track_play_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['-created_at', 'id'], name='track_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-registration_date'], name='user_registration_idx'),
+        ),
+    ]
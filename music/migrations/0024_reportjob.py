@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-19 07:34
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0023_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Отпечаток данных')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Строится'), ('done', 'Готов'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Готовность, %')),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/', verbose_name='Файл отчёта')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало построения')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание построения')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Запросил')),
+            ],
+            options={
+                'verbose_name': 'Задание отчёта',
+                'verbose_name_plural': 'Задания отчётов',
+                'db_table': 'задания_отчётов',
+                'unique_together': {('format', 'fingerprint')},
+            },
+        ),
+    ]
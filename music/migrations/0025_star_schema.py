@@ -0,0 +1,185 @@
+# Generated by Django 5.2 on 2026-10-19 07:46
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0024_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlbumDimension',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False, verbose_name='Альбом')),
+                ('name', models.CharField(max_length=200, verbose_name='Название альбома')),
+                ('performer', models.CharField(blank=True, max_length=200, verbose_name='Исполнитель')),
+                ('release_year', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Год выпуска')),
+            ],
+            options={
+                'verbose_name': 'Альбом (витрина)',
+                'verbose_name_plural': 'Альбомы (витрина)',
+                'db_table': 'измерение_альбомов',
+            },
+        ),
+        migrations.CreateModel(
+            name='GenreDimension',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False, verbose_name='Жанр')),
+                ('name', models.CharField(max_length=100, verbose_name='Название жанра')),
+            ],
+            options={
+                'verbose_name': 'Жанр (витрина)',
+                'verbose_name_plural': 'Жанры (витрина)',
+                'db_table': 'измерение_жанров',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackDimension',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False, verbose_name='Трек')),
+                ('name', models.CharField(max_length=200, verbose_name='Название трека')),
+                ('album_id', models.UUIDField(blank=True, null=True, verbose_name='Альбом')),
+                ('album_name', models.CharField(blank=True, max_length=200, verbose_name='Название альбома')),
+                ('performer', models.CharField(blank=True, max_length=200, verbose_name='Исполнитель')),
+                ('duration', models.PositiveIntegerField(blank=True, null=True, verbose_name='Продолжительность (в секундах)')),
+                ('created_at', models.DateTimeField(verbose_name='Дата добавления')),
+            ],
+            options={
+                'verbose_name': 'Трек (витрина)',
+                'verbose_name_plural': 'Треки (витрина)',
+                'db_table': 'измерение_треков',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserActivityFacts',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField(verbose_name='День')),
+                ('playlists', models.PositiveIntegerField(default=0, verbose_name='Плейлистов')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('ratings', models.PositiveIntegerField(default=0, verbose_name='Оценок')),
+                ('plays', models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')),
+            ],
+            options={
+                'verbose_name': 'Активность пользователя за день',
+                'verbose_name_plural': 'Активность пользователей по дням',
+                'db_table': 'активность_пользователей_по_дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserDimension',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False, verbose_name='Пользователь')),
+                ('login', models.CharField(max_length=100, verbose_name='Логин')),
+                ('role', models.CharField(max_length=20, verbose_name='Роль')),
+                ('registration_date', models.DateTimeField(db_index=True, verbose_name='Дата регистрации')),
+            ],
+            options={
+                'verbose_name': 'Пользователь (витрина)',
+                'verbose_name_plural': 'Пользователи (витрина)',
+                'db_table': 'измерение_пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='albumrating',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='trackrating',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+        migrations.CreateModel(
+            name='AlbumFacts',
+            fields=[
+                ('album', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facts', serialize=False, to='music.albumdimension', verbose_name='Альбом')),
+                ('track_count', models.PositiveIntegerField(default=0, verbose_name='Треков')),
+                ('play_count', models.PositiveBigIntegerField(default=0, verbose_name='Прослушиваний треков')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Оценок')),
+                ('rating_avg', models.FloatField(blank=True, null=True, verbose_name='Средняя оценка')),
+            ],
+            options={
+                'verbose_name': 'Показатели альбома',
+                'verbose_name_plural': 'Показатели альбомов',
+                'db_table': 'факты_альбомов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='albumdimension',
+            index=models.Index(fields=['-release_year'], name='album_dim_year_idx'),
+        ),
+        migrations.CreateModel(
+            name='GenreFacts',
+            fields=[
+                ('genre', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facts', serialize=False, to='music.genredimension', verbose_name='Жанр')),
+                ('track_count', models.PositiveIntegerField(default=0, verbose_name='Треков')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Оценок треков')),
+                ('rating_avg', models.FloatField(blank=True, null=True, verbose_name='Средняя оценка треков')),
+            ],
+            options={
+                'verbose_name': 'Показатели жанра',
+                'verbose_name_plural': 'Показатели жанров',
+                'db_table': 'факты_жанров',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackFacts',
+            fields=[
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facts', serialize=False, to='music.trackdimension', verbose_name='Трек')),
+                ('play_count', models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Оценок')),
+                ('rating_avg', models.FloatField(blank=True, null=True, verbose_name='Средняя оценка')),
+                ('comment_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Показатели трека',
+                'verbose_name_plural': 'Показатели треков',
+                'db_table': 'факты_треков',
+            },
+        ),
+        migrations.AddField(
+            model_name='useractivityfacts',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='music.userdimension', verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='albumfacts',
+            index=models.Index(fields=['-play_count'], name='album_facts_plays_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='albumfacts',
+            index=models.Index(fields=['-rating_avg'], name='album_facts_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackfacts',
+            index=models.Index(fields=['-play_count'], name='track_facts_plays_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackfacts',
+            index=models.Index(fields=['-rating_avg'], name='track_facts_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackfacts',
+            index=models.Index(fields=['-comment_count'], name='track_facts_comments_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='useractivityfacts',
+            unique_together={('day', 'user')},
+        ),
+    ]
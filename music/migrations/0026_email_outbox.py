@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 07:54
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0025_star_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailCampaign',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('message', models.TextField(verbose_name='Сообщение')),
+                ('from_email', models.CharField(max_length=254, verbose_name='Отправитель')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Рассылка',
+                'verbose_name_plural': 'Рассылки',
+                'db_table': 'рассылки',
+            },
+        ),
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('to_email', models.EmailField(max_length=254, verbose_name='Получатель')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('lock_token', models.UUIDField(blank=True, null=True, verbose_name='Обработчик')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Захвачено до')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='music.emailcampaign', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Исходящее письмо',
+                'verbose_name_plural': 'Исходящие письма',
+                'db_table': 'исходящие_письма',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'), models.Index(fields=['campaign', 'status'], name='outbox_campaign_status_idx'), models.Index(fields=['lock_token'], name='outbox_lock_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 08:06
+
+from django.db import migrations, models, router
+from django.utils import timezone
+
+
+def start_counters(apps, schema_editor):
+    """Прослушивания до миграции уже учтены в счётчиках — журнал переносится в них с этого момента"""
+    JobWatermark = apps.get_model('music', 'JobWatermark')
+    db = schema_editor.connection.alias
+    if not router.allow_migrate_model(db, JobWatermark):
+        return
+    JobWatermark.objects.using(db).update_or_create(name='play_counters', defaults={'value': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0026_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playevent',
+            index=models.Index(fields=['user_id', '-played_at'], name='play_event_user_recent_idx'),
+        ),
+        migrations.DeleteModel(
+            name='PlayHistory',
+        ),
+        migrations.RunPython(start_counters, migrations.RunPython.noop),
+    ]
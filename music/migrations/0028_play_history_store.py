@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-19 08:24
+
+import uuid
+from django.conf import settings
+from django.db import migrations, models, router
+
+
+def fill_history(apps, schema_editor):
+    """Последние прослушивания пользователей переносятся из журнала событий"""
+    PlayEvent = apps.get_model('music', 'PlayEvent')
+    PlayHistory = apps.get_model('music', 'PlayHistory')
+    db = schema_editor.connection.alias
+    if not router.allow_migrate_model(db, PlayHistory):
+        return
+
+    rows, user_id, taken = [], None, 0
+    events = (
+        PlayEvent.objects.using(db).filter(user_id__isnull=False)
+        .order_by('user_id', '-played_at').values_list('user_id', 'track_id', 'played_at')
+    )
+    for event_user_id, track_id, played_at in events.iterator():
+        if event_user_id != user_id:
+            user_id, taken = event_user_id, 0
+        if taken < settings.PLAY_HISTORY_SIZE:
+            rows.append(PlayHistory(user_id=user_id, track_id=track_id, played_at=played_at))
+            taken += 1
+    PlayHistory.objects.using(db).bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0027_play_history_from_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayHistory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField(verbose_name='Пользователь')),
+                ('track_id', models.UUIDField(verbose_name='Трек')),
+                ('played_at', models.DateTimeField(verbose_name='Время прослушивания')),
+            ],
+            options={
+                'verbose_name': 'Прослушивание',
+                'verbose_name_plural': 'История прослушиваний',
+                'db_table': 'история_прослушиваний',
+                'indexes': [models.Index(fields=['user_id', '-played_at', 'track_id'], name='play_history_recent_idx'), models.Index(fields=['played_at'], name='play_history_played_idx')],
+            },
+        ),
+        # Без подсказки роутер не пустит операцию в базу аналитики
+        migrations.RunPython(fill_history, migrations.RunPython.noop, hints={'model_name': 'playhistory'}),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0028_play_history_store'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='reportjob',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='export',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='Выгрузка'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reportjob',
+            unique_together={('format', 'export', 'fingerprint')},
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 import uuid
 import os
 
@@ -69,6 +70,9 @@ class User(AbstractUser):
         db_table = 'пользователи'
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            models.Index(fields=['-registration_date'], name='user_registration_idx'),
+        ]
     
     def __str__(self):
         return self.login
@@ -85,6 +89,9 @@ class Group(models.Model):
         db_table = 'группа'
         verbose_name = 'Группа'
         verbose_name_plural = 'Группы'
+        indexes = [
+            models.Index(fields=['name', 'id'], name='group_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -102,6 +109,9 @@ class Artist(models.Model):
         db_table = 'артисты'
         verbose_name = 'Артист'
         verbose_name_plural = 'Артисты'
+        indexes = [
+            models.Index(fields=['name', 'id'], name='artist_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -133,11 +143,19 @@ class Album(models.Model):
     release_date = models.DateField(null=True, blank=True, verbose_name='Дата выпуска')
     photo = models.ImageField(upload_to='albums/', null=True, blank=True, verbose_name='Обложка альбома')
     play_count = models.PositiveIntegerField(default=0, verbose_name='Количество прослушиваний')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения')
     
     class Meta:
         db_table = 'альбомы'
         verbose_name = 'Альбом'
         verbose_name_plural = 'Альбомы'
+        indexes = [
+            # Каталог новинок и API (-release_date, name, id), страницы артиста и группы
+            models.Index(fields=['-release_date', 'name', 'id'], name='album_release_idx'),
+            models.Index(fields=['artist', '-release_date'], name='album_artist_release_idx'),
+            models.Index(fields=['group', '-release_date'], name='album_group_release_idx'),
+            models.Index(fields=['-play_count'], name='album_play_count_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -195,11 +213,19 @@ class Track(models.Model):
     photo = models.ImageField(upload_to='track_photos/', verbose_name='Фото трека', null=True, blank=True)
     play_count = models.PositiveIntegerField(default=0, verbose_name='Количество прослушиваний')
     genres = models.ManyToManyField(Genre, through='TrackGenre', verbose_name='Жанры')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата добавления')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения')
     
     class Meta:
         db_table = 'трек'
         verbose_name = 'Трек'
         verbose_name_plural = 'Треки'
+        indexes = [
+            # Популярные треки: order_by('-play_count', '-id') и топы отчётов
+            models.Index(fields=['-play_count', '-id'], name='track_play_count_idx'),
+            # Новинки в API: order_by('-created_at', 'id')
+            models.Index(fields=['-created_at', 'id'], name='track_recent_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -292,11 +318,22 @@ class Playlist(models.Model):
     creation_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     tracks = models.ManyToManyField(Track, through='PlaylistTrack', verbose_name='Треки')
     genres = models.ManyToManyField(Genre, blank=True, verbose_name='Жанры')
+    rules = models.JSONField(null=True, blank=True, verbose_name='Правила умного плейлиста')
+    # Поддерживаются при каждом изменении состава плейлиста (см. playlists.refresh_totals)
+    track_count = models.PositiveIntegerField(default=0, verbose_name='Количество треков')
+    total_duration = models.PositiveIntegerField(default=0, verbose_name='Общая длительность (в секундах)')
     
     class Meta:
         db_table = 'плейлисты'
         verbose_name = 'Плейлист'
         verbose_name_plural = 'Плейлисты'
+        indexes = [
+            # Публичные плейлисты от новых к старым и плейлисты пользователя в профиле.
+            # Частичный индекс: SQLite пишет filter(is_public=True) как WHERE "is_public",
+            # и составной индекс (is_public, ...) по такому условию не выбирается
+            models.Index(fields=['-creation_date', 'id'], condition=models.Q(is_public=True), name='playlist_public_recent_idx'),
+            models.Index(fields=['user', '-creation_date'], name='playlist_user_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.user.login})"
@@ -305,23 +342,55 @@ class Playlist(models.Model):
     def owner(self):
         """Возвращает владельца плейлиста"""
         return self.user
+    
+    @property
+    def is_smart(self):
+        """Умный плейлист: треки подбираются по правилам"""
+        return self.rules is not None
 
 
 class PlaylistTrack(models.Model):
     """Связующая таблица между плейлистами и треками"""
+    # Шаг между соседними позициями: перемещение трека занимает середину промежутка
+    POSITION_GAP = 1024
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, verbose_name='Плейлист', related_name='playlist_tracks')
     track = models.ForeignKey(Track, on_delete=models.CASCADE, verbose_name='Трек')
     added_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')
+    position = models.BigIntegerField(default=0, verbose_name='Позиция')
     
     class Meta:
         db_table = 'плейлисты_треки'
         verbose_name = 'Трек в плейлисте'
         verbose_name_plural = 'Треки в плейлистах'
         unique_together = ['playlist', 'track']
+        ordering = ['position']
+        indexes = [
+            models.Index(fields=['playlist', 'position'], name='playlist_track_position_idx'),
+            models.Index(fields=['playlist', 'added_date'], name='playlist_track_added_idx'),
+        ]
     
     def __str__(self):
         return f"{self.track.name} в {self.playlist.name}"
+    
+    @classmethod
+    def next_position(cls, playlist_id):
+        """Позиция для трека, добавляемого в конец плейлиста"""
+        last = cls.objects.filter(playlist_id=playlist_id).aggregate(last=models.Max('position'))['last']
+        return cls.POSITION_GAP if last is None else last + cls.POSITION_GAP
+    
+    def save(self, *args, **kwargs):
+        # Новый трек без явной позиции попадает в конец плейлиста
+        if self._state.adding and not self.position:
+            self.position = self.next_position(self.playlist_id)
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        from .playlists import refresh_totals
+        result = super().delete(*args, **kwargs)
+        refresh_totals([self.playlist_id])
+        return result
 
 
 class TrackRating(models.Model):
@@ -334,6 +403,7 @@ class TrackRating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
     track = models.ForeignKey(Track, on_delete=models.CASCADE, verbose_name='Трек', related_name='ratings')
     rating_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата оценки')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения')
     
     class Meta:
         db_table = 'оценка_трека'
@@ -355,6 +425,7 @@ class AlbumRating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
     album = models.ForeignKey(Album, on_delete=models.CASCADE, verbose_name='Альбом', related_name='ratings')
     rating_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата оценки')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения')
     
     class Meta:
         db_table = 'оценка_альбома'
@@ -379,6 +450,482 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['-created_at']
+        indexes = [
+            # Комментарии трека от новых к старым
+            models.Index(fields=['track', '-created_at'], name='comment_track_recent_idx'),
+        ]
     
     def __str__(self):
         return f"Комментарий {self.user.login} к {self.track.name}"
+
+
+class TrackUpload(models.Model):
+    """Сессия поблочной (возобновляемой) загрузки аудиофайла"""
+    STATUS_CHOICES = [
+        ('uploading', 'Загружается'),
+        ('complete', 'Завершена'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
+    track = models.ForeignKey(Track, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Трек')
+    filename = models.CharField(max_length=255, verbose_name='Имя файла')
+    size = models.BigIntegerField(verbose_name='Размер файла (байт)')
+    received = models.BigIntegerField(default=0, verbose_name='Получено байт')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading', verbose_name='Статус')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        db_table = 'загрузки_треков'
+        verbose_name = 'Загрузка трека'
+        verbose_name_plural = 'Загрузки треков'
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+    @property
+    def is_complete(self):
+        """Все ли байты файла получены"""
+        return self.received >= self.size
+
+
+class ReportJob(models.Model):
+    """Фоновое построение отчёта администратора (см. reports.py)"""
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Строится'),
+        ('done', 'Готов'),
+        ('failed', 'Ошибка'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    format = models.CharField(max_length=10, verbose_name='Формат')
+    # Имя выгрузки таблицы (exports.py); пусто — сводный отчёт
+    export = models.CharField(max_length=50, blank=True, default='', verbose_name='Выгрузка')
+    # Отпечаток данных, по которым строится отчёт: одинаковые данные — один файл
+    fingerprint = models.CharField(max_length=64, verbose_name='Отпечаток данных')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='Готовность, %')
+    file = models.FileField(upload_to='reports/', null=True, blank=True, verbose_name='Файл отчёта')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Запросил')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начало построения')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Окончание построения')
+
+    class Meta:
+        db_table = 'задания_отчётов'
+        verbose_name = 'Задание отчёта'
+        verbose_name_plural = 'Задания отчётов'
+        unique_together = ['format', 'export', 'fingerprint']
+
+    def __str__(self):
+        return f"{self.export or self.format} {self.fingerprint[:12]} ({self.status})"
+
+
+class EmailCampaign(models.Model):
+    """Рассылка администратора; письма получателям — в очереди EmailOutbox (см. mailing.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    message = models.TextField(verbose_name='Сообщение')
+    from_email = models.CharField(max_length=254, verbose_name='Отправитель')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Автор')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата завершения')
+
+    class Meta:
+        db_table = 'рассылки'
+        verbose_name = 'Рассылка'
+        verbose_name_plural = 'Рассылки'
+
+    def __str__(self):
+        return self.subject
+
+
+class EmailOutbox(models.Model):
+    """Письмо рассылки одному получателю"""
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    campaign = models.ForeignKey(EmailCampaign, on_delete=models.CASCADE, related_name='emails', verbose_name='Рассылка')
+    to_email = models.EmailField(verbose_name='Получатель')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Следующая попытка')
+    # Захват обработчиком: до истечения аренды письмо не возьмёт другой обработчик
+    lock_token = models.UUIDField(null=True, blank=True, verbose_name='Обработчик')
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name='Захвачено до')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата отправки')
+
+    class Meta:
+        db_table = 'исходящие_письма'
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+            models.Index(fields=['campaign', 'status'], name='outbox_campaign_status_idx'),
+            models.Index(fields=['lock_token'], name='outbox_lock_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} ({self.get_status_display()})"
+
+
+class TrackWaveform(models.Model):
+    """Предрассчитанные пики волновой формы трека"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    track = models.OneToOneField(Track, on_delete=models.CASCADE, related_name='waveform', verbose_name='Трек')
+    peaks = models.BinaryField(verbose_name='Пики (int8: min, max)')
+    peaks_per_second = models.PositiveSmallIntegerField(verbose_name='Пар пиков в секунду')
+    source = models.CharField(max_length=255, verbose_name='Файл, по которому рассчитаны пики')
+    computed_at = models.DateTimeField(verbose_name='Дата расчета')
+
+    class Meta:
+        db_table = 'волновые_формы'
+        verbose_name = 'Волновая форма'
+        verbose_name_plural = 'Волновые формы'
+
+    def __str__(self):
+        return f"Волновая форма {self.track.name}"
+
+
+class JobWatermark(models.Model):
+    """Отметка, до которой фоновое задание уже обработало данные"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100, unique=True, verbose_name='Задание')
+    value = models.DateTimeField(verbose_name='Обработано до')
+
+    class Meta:
+        db_table = 'отметки_заданий'
+        verbose_name = 'Отметка задания'
+        verbose_name_plural = 'Отметки заданий'
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def get(cls, name):
+        """Возвращает отметку задания или None, если задание ещё не запускалось"""
+        return cls.objects.filter(name=name).values_list('value', flat=True).first()
+
+    @classmethod
+    def set(cls, name, value):
+        cls.objects.update_or_create(name=name, defaults={'value': value})
+
+
+class SimilarTrack(models.Model):
+    """Предрассчитанный сосед трека для рекомендаций «Похожие треки»"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='similar_tracks', verbose_name='Трек')
+    neighbor = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='+', verbose_name='Похожий трек')
+    score = models.FloatField(verbose_name='Сходство')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+
+    class Meta:
+        db_table = 'похожие_треки'
+        verbose_name = 'Похожий трек'
+        verbose_name_plural = 'Похожие треки'
+        unique_together = ['track', 'neighbor']
+        indexes = [
+            models.Index(fields=['track', 'rank'], name='similar_track_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.track.name} ~ {self.neighbor.name} ({self.score:.2f})"
+
+
+class TrackAudioFeatures(models.Model):
+    """Аудио-эмбеддинг трека для поиска «Звучит похоже»"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    track = models.OneToOneField(Track, on_delete=models.CASCADE, related_name='audio_features', verbose_name='Трек')
+    vector = models.BinaryField(verbose_name='Эмбеддинг (float32)')
+    source = models.CharField(max_length=255, verbose_name='Файл, по которому рассчитан эмбеддинг')
+    computed_at = models.DateTimeField(verbose_name='Дата расчета')
+
+    class Meta:
+        db_table = 'аудио_признаки'
+        verbose_name = 'Аудио-признаки трека'
+        verbose_name_plural = 'Аудио-признаки треков'
+
+    def __str__(self):
+        return f"Аудио-признаки {self.track.name}"
+
+
+class TrackTransition(models.Model):
+    """Вероятность перехода от трека к следующему (для режима «Радио»)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    source = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='transitions', verbose_name='Трек')
+    target = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='+', verbose_name='Следующий трек')
+    weight = models.FloatField(verbose_name='Вероятность перехода')
+
+    class Meta:
+        db_table = 'переходы_треков'
+        verbose_name = 'Переход между треками'
+        verbose_name_plural = 'Переходы между треками'
+        unique_together = ['source', 'target']
+        indexes = [
+            models.Index(fields=['source', '-weight'], name='transition_source_weight_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source.name} -> {self.target.name} ({self.weight:.2f})"
+
+
+class UserStats(models.Model):
+    """Сводная статистика пользователя (поддерживается сигналами, см. stats.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats', verbose_name='Пользователь')
+    playlists_count = models.PositiveIntegerField(default=0, verbose_name='Плейлистов')
+    tracks_count = models.PositiveIntegerField(default=0, verbose_name='Треков в плейлистах')
+    total_duration = models.PositiveBigIntegerField(default=0, verbose_name='Длительность плейлистов (в секундах)')
+    ratings_count = models.PositiveIntegerField(default=0, verbose_name='Оценок')
+    comments_count = models.PositiveIntegerField(default=0, verbose_name='Комментариев')
+    plays_count = models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')
+    last_activity = models.DateTimeField(null=True, blank=True, verbose_name='Последняя активность')
+
+    class Meta:
+        db_table = 'статистика_пользователей'
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+        indexes = [
+            models.Index(fields=['-playlists_count'], name='user_stats_playlists_idx'),
+            models.Index(fields=['-comments_count'], name='user_stats_comments_idx'),
+            models.Index(fields=['-last_activity'], name='user_stats_activity_idx'),
+        ]
+
+    def __str__(self):
+        return f"Статистика {self.user.login}"
+
+
+class PlayEvent(models.Model):
+    """Событие прослушивания в журнале базы аналитики (см. analytics.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Каталог и пользователи живут в основной базе, поэтому ссылки — просто UUID
+    user_id = models.UUIDField(null=True, blank=True, verbose_name='Пользователь')
+    track_id = models.UUIDField(verbose_name='Трек')
+    played_at = models.DateTimeField(db_index=True, verbose_name='Время прослушивания')
+
+    class Meta:
+        db_table = 'события_прослушиваний'
+        verbose_name = 'Событие прослушивания'
+        verbose_name_plural = 'События прослушиваний'
+        indexes = [
+            # Прослушивания пользователя подряд (переходы радио, radio.py)
+            models.Index(fields=['user_id', '-played_at'], name='play_event_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.track_id} - {self.played_at}"
+
+
+class PlayHistory(models.Model):
+    """История прослушиваний в базе аналитики: не больше PLAY_HISTORY_SIZE записей на пользователя (см. history.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user_id = models.UUIDField(verbose_name='Пользователь')
+    track_id = models.UUIDField(verbose_name='Трек')
+    played_at = models.DateTimeField(verbose_name='Время прослушивания')
+
+    class Meta:
+        db_table = 'история_прослушиваний'
+        verbose_name = 'Прослушивание'
+        verbose_name_plural = 'История прослушиваний'
+        indexes = [
+            # Покрывающий индекс для «последних N» прослушиваний пользователя
+            models.Index(fields=['user_id', '-played_at', 'track_id'], name='play_history_recent_idx'),
+            # Очистка записей старше PLAY_HISTORY_MAX_AGE_DAYS и поиск слушавших с прошлой очистки
+            models.Index(fields=['played_at'], name='play_history_played_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.track_id}"
+
+
+class DailyTrackPlays(models.Model):
+    """Агрегат журнала прослушиваний по дням и трекам (база аналитики)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    day = models.DateField(verbose_name='День')
+    track_id = models.UUIDField(verbose_name='Трек')
+    plays = models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')
+    listeners = models.PositiveIntegerField(default=0, verbose_name='Слушателей')
+
+    class Meta:
+        db_table = 'прослушивания_по_дням'
+        verbose_name = 'Прослушивания за день'
+        verbose_name_plural = 'Прослушивания по дням'
+        unique_together = ['day', 'track_id']
+
+    def __str__(self):
+        return f"{self.day}: {self.track_id} ({self.plays})"
+
+
+class TrackDimension(models.Model):
+    """Измерение «трек» витрины отчётов (база аналитики, см. snapshots.py)"""
+    # Ключ совпадает с идентификатором трека в каталоге
+    id = models.UUIDField(primary_key=True, editable=False, verbose_name='Трек')
+    name = models.CharField(max_length=200, verbose_name='Название трека')
+    album_id = models.UUIDField(null=True, blank=True, verbose_name='Альбом')
+    album_name = models.CharField(max_length=200, blank=True, verbose_name='Название альбома')
+    performer = models.CharField(max_length=200, blank=True, verbose_name='Исполнитель')
+    duration = models.PositiveIntegerField(null=True, blank=True, verbose_name='Продолжительность (в секундах)')
+    created_at = models.DateTimeField(verbose_name='Дата добавления')
+
+    class Meta:
+        db_table = 'измерение_треков'
+        verbose_name = 'Трек (витрина)'
+        verbose_name_plural = 'Треки (витрина)'
+
+    def __str__(self):
+        return self.name
+
+
+class AlbumDimension(models.Model):
+    """Измерение «альбом» витрины отчётов"""
+    id = models.UUIDField(primary_key=True, editable=False, verbose_name='Альбом')
+    name = models.CharField(max_length=200, verbose_name='Название альбома')
+    performer = models.CharField(max_length=200, blank=True, verbose_name='Исполнитель')
+    release_year = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Год выпуска')
+
+    class Meta:
+        db_table = 'измерение_альбомов'
+        verbose_name = 'Альбом (витрина)'
+        verbose_name_plural = 'Альбомы (витрина)'
+        indexes = [
+            models.Index(fields=['-release_year'], name='album_dim_year_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class GenreDimension(models.Model):
+    """Измерение «жанр» витрины отчётов"""
+    id = models.UUIDField(primary_key=True, editable=False, verbose_name='Жанр')
+    name = models.CharField(max_length=100, verbose_name='Название жанра')
+
+    class Meta:
+        db_table = 'измерение_жанров'
+        verbose_name = 'Жанр (витрина)'
+        verbose_name_plural = 'Жанры (витрина)'
+
+    def __str__(self):
+        return self.name
+
+
+class UserDimension(models.Model):
+    """Измерение «пользователь» витрины отчётов"""
+    id = models.UUIDField(primary_key=True, editable=False, verbose_name='Пользователь')
+    login = models.CharField(max_length=100, verbose_name='Логин')
+    role = models.CharField(max_length=20, verbose_name='Роль')
+    registration_date = models.DateTimeField(db_index=True, verbose_name='Дата регистрации')
+
+    class Meta:
+        db_table = 'измерение_пользователей'
+        verbose_name = 'Пользователь (витрина)'
+        verbose_name_plural = 'Пользователи (витрина)'
+
+    def __str__(self):
+        return self.login
+
+
+class TrackFacts(models.Model):
+    """Показатели трека на момент последнего среза витрины"""
+    track = models.OneToOneField(TrackDimension, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='facts', verbose_name='Трек')
+    play_count = models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')
+    rating_count = models.PositiveIntegerField(default=0, verbose_name='Оценок')
+    rating_avg = models.FloatField(null=True, blank=True, verbose_name='Средняя оценка')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='Комментариев')
+
+    class Meta:
+        db_table = 'факты_треков'
+        verbose_name = 'Показатели трека'
+        verbose_name_plural = 'Показатели треков'
+        indexes = [
+            models.Index(fields=['-play_count'], name='track_facts_plays_idx'),
+            models.Index(fields=['-rating_avg'], name='track_facts_rating_idx'),
+            models.Index(fields=['-comment_count'], name='track_facts_comments_idx'),
+        ]
+
+    def __str__(self):
+        return f"Показатели {self.track_id}"
+
+
+class AlbumFacts(models.Model):
+    """Показатели альбома на момент последнего среза витрины"""
+    album = models.OneToOneField(AlbumDimension, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='facts', verbose_name='Альбом')
+    track_count = models.PositiveIntegerField(default=0, verbose_name='Треков')
+    play_count = models.PositiveBigIntegerField(default=0, verbose_name='Прослушиваний треков')
+    rating_count = models.PositiveIntegerField(default=0, verbose_name='Оценок')
+    rating_avg = models.FloatField(null=True, blank=True, verbose_name='Средняя оценка')
+
+    class Meta:
+        db_table = 'факты_альбомов'
+        verbose_name = 'Показатели альбома'
+        verbose_name_plural = 'Показатели альбомов'
+        indexes = [
+            models.Index(fields=['-play_count'], name='album_facts_plays_idx'),
+            models.Index(fields=['-rating_avg'], name='album_facts_rating_idx'),
+        ]
+
+    def __str__(self):
+        return f"Показатели {self.album_id}"
+
+
+class GenreFacts(models.Model):
+    """Показатели жанра на момент последнего среза витрины"""
+    genre = models.OneToOneField(GenreDimension, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='facts', verbose_name='Жанр')
+    track_count = models.PositiveIntegerField(default=0, verbose_name='Треков')
+    rating_count = models.PositiveIntegerField(default=0, verbose_name='Оценок треков')
+    rating_avg = models.FloatField(null=True, blank=True, verbose_name='Средняя оценка треков')
+
+    class Meta:
+        db_table = 'факты_жанров'
+        verbose_name = 'Показатели жанра'
+        verbose_name_plural = 'Показатели жанров'
+
+    def __str__(self):
+        return f"Показатели {self.genre_id}"
+
+
+class UserActivityFacts(models.Model):
+    """Активность пользователя за день: созданные плейлисты, комментарии, оценки, прослушивания"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    day = models.DateField(verbose_name='День')
+    user = models.ForeignKey(UserDimension, on_delete=models.CASCADE, related_name='activity', verbose_name='Пользователь')
+    playlists = models.PositiveIntegerField(default=0, verbose_name='Плейлистов')
+    comments = models.PositiveIntegerField(default=0, verbose_name='Комментариев')
+    ratings = models.PositiveIntegerField(default=0, verbose_name='Оценок')
+    plays = models.PositiveIntegerField(default=0, verbose_name='Прослушиваний')
+
+    class Meta:
+        db_table = 'активность_пользователей_по_дням'
+        verbose_name = 'Активность пользователя за день'
+        verbose_name_plural = 'Активность пользователей по дням'
+        unique_together = ['day', 'user']
+
+    def __str__(self):
+        return f"{self.day}: {self.user_id}"
+
+
+class RevokedToken(models.Model):
+    """Отозванный токен API (см. tokens.py); хранится до истечения срока токена"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    jti = models.CharField(max_length=64, unique=True, verbose_name='Идентификатор токена')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Истекает')
+    revoked_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата отзыва')
+
+    class Meta:
+        db_table = 'отозванные_токены'
+        verbose_name = 'Отозванный токен'
+        verbose_name_plural = 'Отозванные токены'
+
+    def __str__(self):
+        return self.jti
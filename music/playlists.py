@@ -0,0 +1,110 @@
+"""Состав и порядок треков в плейлисте.
+
+Позиции хранятся с промежутками (``PlaylistTrack.POSITION_GAP``):
+перемещённый трек получает середину промежутка между новыми соседями,
+поэтому перемещение меняет одну строку. Только когда промежуток
+исчерпан, позиции плейлиста перенумеровываются заново.
+
+``Playlist.track_count`` и ``Playlist.total_duration`` пересчитываются
+одним UPDATE после каждого изменения состава (``refresh_totals``).
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Playlist, PlaylistTrack
+from .stats import refresh_playlist_totals
+
+GAP = PlaylistTrack.POSITION_GAP
+
+
+class ReorderError(Exception):
+    """Перемещение нельзя применить (трек не найден в плейлисте и т.п.)"""
+
+
+def append_tracks(playlist, track_ids):
+    """Добавляет треки в конец плейлиста одной вставкой, пропуская уже добавленные"""
+    track_ids = list(dict.fromkeys(track_ids))
+    if not track_ids:
+        return []
+    start = PlaylistTrack.next_position(playlist.pk)
+    entries = [
+        PlaylistTrack(playlist=playlist, track_id=track_id, position=start + i * GAP)
+        for i, track_id in enumerate(track_ids)
+    ]
+    created = PlaylistTrack.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+    refresh_totals([playlist.pk])
+    return created
+
+
+def refresh_totals(playlist_ids=None):
+    """Пересчитывает количество треков и длительность плейлистов одним запросом (None — всех)"""
+    entries = PlaylistTrack.objects.filter(playlist=OuterRef('pk')).order_by().values('playlist')
+    playlists = Playlist.objects.all() if playlist_ids is None else Playlist.objects.filter(pk__in=playlist_ids)
+    updated = playlists.update(
+        track_count=Coalesce(Subquery(entries.annotate(n=Count('pk')).values('n')), 0),
+        total_duration=Coalesce(Subquery(entries.annotate(s=Sum('track__duration')).values('s')), 0),
+    )
+    # Итоги плейлистов входят в статистику их владельцев
+    refresh_playlist_totals(None if playlist_ids is None else playlists.values('user_id'))
+    return updated
+
+
+def renumber(playlist):
+    """Перенумеровывает позиции плейлиста с шагом GAP, сохраняя порядок"""
+    entries = list(PlaylistTrack.objects.filter(playlist=playlist).order_by('position', 'added_date').only('id'))
+    for index, entry in enumerate(entries, start=1):
+        entry.position = index * GAP
+    PlaylistTrack.objects.bulk_update(entries, ['position'], batch_size=1000)
+
+
+def _position_after(playlist, entry, anchor):
+    """Позиция для ``entry`` сразу после ``anchor`` (None — в начало) или None, если промежутка нет"""
+    others = PlaylistTrack.objects.filter(playlist=playlist).exclude(pk=entry.pk)
+    if anchor is None:
+        first = others.order_by('position').values_list('position', flat=True).first()
+        return 0 if first is None else first - GAP
+
+    following = (
+        others.filter(position__gt=anchor.position)
+        .order_by('position')
+        .values_list('position', flat=True)
+        .first()
+    )
+    if following is None:
+        return anchor.position + GAP
+    if following - anchor.position > 1:
+        return (anchor.position + following) // 2
+    return None
+
+
+def move_after(playlist, track_id, after_id=None):
+    """Ставит трек сразу после ``after_id`` (или в начало). Обновляет одну строку."""
+    entries = PlaylistTrack.objects.filter(playlist=playlist).select_for_update()
+    entry = entries.filter(track_id=track_id).first()
+    if entry is None:
+        raise ReorderError('Трек не найден в плейлисте')
+
+    anchor = None
+    if after_id is not None:
+        if after_id == track_id:
+            raise ReorderError('Трек нельзя поставить после самого себя')
+        anchor = entries.filter(track_id=after_id).first()
+        if anchor is None:
+            raise ReorderError('Трек не найден в плейлисте')
+
+    position = _position_after(playlist, entry, anchor)
+    if position is None:
+        renumber(playlist)
+        anchor.refresh_from_db(fields=['position'])
+        position = _position_after(playlist, entry, anchor)
+
+    PlaylistTrack.objects.filter(pk=entry.pk).update(position=position)
+    return position
+
+
+def apply_moves(playlist, moves):
+    """Применяет список перемещений ``[(track_id, after_id), ...]`` в одной транзакции"""
+    with transaction.atomic():
+        for track_id, after_id in moves:
+            move_after(playlist, track_id, after_id)
@@ -0,0 +1,194 @@
+"""Режим «Радио»: бесконечная очередь треков от исходного трека или плейлиста.
+
+Таблица ``TrackTransition`` — марковская матрица переходов «трек -> следующий
+трек», посчитанная заранее по соседству треков в плейлистах и по
+последовательным прослушиваниям из истории пользователей. При генерации
+очереди вероятность перехода смешивается со сходством жанров кандидатов
+(мера Жаккара), а следующий трек выбирается случайно с этими весами.
+Очередь — генератор: каждый шаг делает несколько запросов по индексам,
+поэтому длинная сессия не держит в памяти больших списков.
+"""
+import random
+import uuid
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import PlayEvent, PlaylistTrack, Track, TrackGenre, TrackTransition
+from .recommendations import hex_columns, _track_codes
+
+# Вес перехода «назад» по плейлисту относительно перехода «вперёд»
+BACKWARD_WEIGHT = 0.5
+
+# Вес перехода между двумя прослушиваниями подряд
+PLAY_WEIGHT = 1.0
+
+# Прослушивания с большим перерывом (в секундах) считаются разными сессиями
+SESSION_GAP = 30 * 60
+
+# Сколько кандидатов рассматривается на каждом шаге
+CANDIDATES = 50
+
+# Сколько последних треков не повторяется в очереди
+HISTORY_SIZE = 100
+
+
+def _playable(prefix=''):
+    """Условие «у трека есть аудиофайл» (для связанного трека — с префиксом поля)"""
+    return Q(**{f'{prefix}file__isnull': False}) & ~Q(**{f'{prefix}file': ''})
+
+
+def _adjacent_pairs(groups, tracks):
+    """Пары соседних треков внутри групп (строки одной группы идут подряд)"""
+    same = groups[1:] == groups[:-1]
+    return tracks[:-1][same], tracks[1:][same]
+
+
+def build_transitions(per_track=None):
+    """Пересчитывает таблицу переходов целиком. Возвращает количество переходов."""
+    per_track = per_track or settings.RADIO_TRANSITIONS_PER_TRACK
+    vocabulary = np.array(sorted(t.hex for t in Track.objects.values_list('id', flat=True)))
+
+    sources, targets, weights = [], [], []
+    if vocabulary.size:
+        playlists, listed = hex_columns(
+            PlaylistTrack.objects.order_by('playlist_id', 'position'), 'playlist_id', 'track_id'
+        )
+        if listed.size:
+            codes, known = _track_codes(vocabulary, listed)
+            before, after = _adjacent_pairs(playlists[known], codes[known])
+            sources += [before, after]
+            targets += [after, before]
+            weights += [np.ones(before.size), np.full(before.size, BACKWARD_WEIGHT)]
+
+        users, played, moments = hex_columns(
+            PlayEvent.objects.filter(user_id__isnull=False).order_by('user_id', 'played_at'),
+            'user_id', 'track_id', 'played_at',
+        )
+        if played.size:
+            codes, known = _track_codes(vocabulary, played)
+            users, codes, moments = users[known], codes[known], moments[known]
+            before, after = _adjacent_pairs(users, codes)
+            # Переходом считаем только прослушивания в пределах одной сессии
+            close = np.diff(moments)[users[1:] == users[:-1]] <= SESSION_GAP
+            sources.append(before[close])
+            targets.append(after[close])
+            weights.append(np.full(int(close.sum()), PLAY_WEIGHT))
+
+    if sources:
+        sources = np.concatenate(sources).astype(np.int64)
+        targets = np.concatenate(targets).astype(np.int64)
+        weights = np.concatenate(weights)
+        loops = sources != targets
+        sources, targets, weights = sources[loops], targets[loops], weights[loops]
+    else:
+        sources = targets = np.empty(0, dtype=np.int64)
+        weights = np.empty(0)
+
+    # Суммируем повторяющиеся пары и нормируем по исходному треку
+    keys, inverse = np.unique(sources * len(vocabulary) + targets, return_inverse=True)
+    counts = np.bincount(inverse, weights=weights)
+    sources, targets = np.divmod(keys, max(len(vocabulary), 1))
+    totals = np.bincount(sources, weights=counts, minlength=len(vocabulary))
+    probabilities = counts / np.maximum(totals[sources], 1e-12)
+
+    # Оставляем per_track самых вероятных переходов для каждого трека
+    order = np.lexsort((-probabilities, sources))
+    sources, targets, probabilities = sources[order], targets[order], probabilities[order]
+    starts = np.searchsorted(sources, sources)
+    keep = np.arange(sources.size) - starts < per_track
+    sources, targets, probabilities = sources[keep], targets[keep], probabilities[keep]
+
+    rows = (
+        TrackTransition(
+            source_id=uuid.UUID(vocabulary[s]),
+            target_id=uuid.UUID(vocabulary[t]),
+            weight=float(p),
+        )
+        for s, t, p in zip(sources, targets, probabilities)
+    )
+    with transaction.atomic():
+        TrackTransition.objects.all().delete()
+        TrackTransition.objects.bulk_create(rows, batch_size=1000)
+    return int(sources.size)
+
+
+def _genre_sets(track_ids):
+    genres = {}
+    for track_id, genre_id in TrackGenre.objects.filter(track_id__in=track_ids).values_list('track_id', 'genre_id'):
+        genres.setdefault(track_id, set()).add(genre_id)
+    return genres
+
+
+def _candidates(current, recent):
+    """Кандидаты на следующий трек: {UUID трека: вероятность перехода}"""
+    return dict(
+        TrackTransition.objects
+        .filter(_playable('target__'), source_id=current)
+        .exclude(target_id__in=recent)
+        .order_by('-weight')
+        .values_list('target_id', 'weight')[:CANDIDATES]
+    )
+
+
+def _next_track(current, recent, rng):
+    transitions = _candidates(current, recent)
+    genres = _genre_sets([current]).get(current, set())
+
+    candidates = set(transitions)
+    if genres and len(candidates) < CANDIDATES:
+        # Добираем популярные треки тех же жанров
+        candidates.update(
+            TrackGenre.objects
+            .filter(genre_id__in=genres)
+            .exclude(track_id__in=recent)
+            .exclude(track_id=current)
+            .filter(_playable('track__'))
+            .order_by('-track__play_count')
+            .values_list('track_id', flat=True)[:CANDIDATES - len(candidates)]
+        )
+
+    if not candidates:
+        popular = list(
+            Track.objects.filter(_playable())
+            .exclude(pk__in=recent)
+            .exclude(pk=current)
+            .order_by('-play_count')
+            .values_list('id', flat=True)[:CANDIDATES]
+        )
+        return rng.choice(popular) if popular else None
+
+    candidates = list(candidates)
+    alpha = settings.RADIO_GENRE_WEIGHT
+    candidate_genres = _genre_sets(candidates) if genres else {}
+    scores = []
+    for track_id in candidates:
+        other = candidate_genres.get(track_id, set())
+        jaccard = len(genres & other) / len(genres | other) if other else 0.0
+        scores.append((1 - alpha) * transitions.get(track_id, 0.0) + alpha * jaccard)
+
+    if not any(scores):
+        return rng.choice(candidates)
+    return rng.choices(candidates, weights=scores)[0]
+
+
+def radio_queue(seed_ids, exclude=(), rng=None):
+    """Бесконечный генератор ID треков, начиная от последнего трека из ``seed_ids``.
+
+    Треки из ``seed_ids`` и ``exclude`` не повторяются, пока не выйдут
+    из окна последних HISTORY_SIZE треков. Генератор останавливается,
+    только если в каталоге не осталось подходящих треков.
+    """
+    rng = rng or random.Random()
+    recent = deque(list(exclude) + list(seed_ids), maxlen=HISTORY_SIZE)
+    current = seed_ids[-1]
+    while True:
+        next_id = _next_track(current, list(recent), rng)
+        if next_id is None:
+            return
+        recent.append(next_id)
+        yield next_id
+        current = next_id
@@ -0,0 +1,169 @@
+"""Рекомендации «Похожие треки» по оценкам и совместному попаданию в плейлисты.
+
+Строится разреженная матрица (пользователи + плейлисты) × треки:
+оценки центрируются относительно середины шкалы (3), так что высокие
+оценки сближают треки, а низкие — отдаляют; плейлисты дают бинарное
+совместное появление. Сходство треков — косинусная мера между столбцами,
+для каждого трека сохраняются top-K соседей в таблицу ``SimilarTrack``.
+"""
+import uuid
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import JobWatermark, PlaylistTrack, SimilarTrack, Track, TrackRating
+
+WATERMARK = 'similar_tracks'
+
+# Сколько столбцов-треков перемножается за один шаг
+BATCH_SIZE = 512
+
+RATING_MIDPOINT = 3.0
+
+
+def hex_columns(queryset, *fields):
+    """Выгружает поля queryset в массивы NumPy (UUID -> hex-строки, даты -> секунды)"""
+    rows = queryset.values_list(*fields).iterator(chunk_size=10000)
+    columns = [[] for _ in fields]
+    for row in rows:
+        for column, value in zip(columns, row):
+            if isinstance(value, uuid.UUID):
+                value = value.hex
+            elif isinstance(value, datetime):
+                value = value.timestamp()
+            column.append(value)
+    return [np.array(column) for column in columns]
+
+
+def _track_codes(vocabulary, track_hex):
+    """Номера столбцов треков и маска треков, присутствующих в словаре"""
+    codes = np.searchsorted(vocabulary, track_hex)
+    known = codes < len(vocabulary)
+    known[known] = vocabulary[codes[known]] == track_hex[known]
+    return codes, known
+
+
+def build_item_matrix(vocabulary):
+    """Матрица (пользователи + плейлисты) × треки в формате CSC"""
+    n_tracks = len(vocabulary)
+
+    users, rated, values = hex_columns(TrackRating.objects.all(), 'user_id', 'track_id', 'value')
+    if users.size:
+        codes, known = _track_codes(vocabulary, rated)
+        user_labels, user_codes = np.unique(users[known], return_inverse=True)
+        weights = (values[known].astype(np.float32) - RATING_MIDPOINT) * settings.SIMILAR_TRACKS_RATING_WEIGHT
+        ratings = sparse.csr_matrix(
+            (weights, (user_codes, codes[known])),
+            shape=(len(user_labels), n_tracks),
+        )
+    else:
+        ratings = sparse.csr_matrix((0, n_tracks), dtype=np.float32)
+
+    playlists, listed = hex_columns(PlaylistTrack.objects.all(), 'playlist_id', 'track_id')
+    if playlists.size:
+        codes, known = _track_codes(vocabulary, listed)
+        playlist_labels, playlist_codes = np.unique(playlists[known], return_inverse=True)
+        co_occurrence = sparse.csr_matrix(
+            (np.full(playlist_codes.size, settings.SIMILAR_TRACKS_PLAYLIST_WEIGHT, dtype=np.float32),
+             (playlist_codes, codes[known])),
+            shape=(len(playlist_labels), n_tracks),
+        )
+    else:
+        co_occurrence = sparse.csr_matrix((0, n_tracks), dtype=np.float32)
+
+    matrix = sparse.vstack([ratings, co_occurrence]).tocsc()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def normalize_columns(matrix):
+    """Нормирует столбцы, чтобы скалярное произведение давало косинусное сходство"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (matrix @ sparse.diags(inverse)).tocsc()
+
+
+def affected_columns(matrix, dirty):
+    """Треки, сходство которых могло измениться: сами изменённые и все их соседи по строкам"""
+    rows = np.unique(matrix[:, dirty].indices)
+    if not rows.size:
+        return np.asarray(dirty)
+    neighbours = np.unique(matrix.tocsr()[rows].indices)
+    return np.union1d(dirty, neighbours)
+
+
+def top_neighbors(normalized, transposed, columns, top_k):
+    """Для каждого столбца из ``columns`` возвращает (индексы соседей, сходства) по убыванию"""
+    similarities = (transposed @ normalized[:, columns]).tocsc()
+    for j, column in enumerate(columns):
+        start, end = similarities.indptr[j], similarities.indptr[j + 1]
+        indices = similarities.indices[start:end]
+        scores = similarities.data[start:end]
+
+        keep = (indices != column) & (scores > 0)
+        indices, scores = indices[keep], scores[keep]
+        if scores.size > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            indices, scores = indices[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        yield column, indices[order], scores[order]
+
+
+def _changed_tracks(since):
+    changed = set(
+        TrackRating.objects.filter(rating_date__gt=since).values_list('track_id', flat=True)
+    )
+    changed.update(
+        PlaylistTrack.objects.filter(added_date__gt=since).values_list('track_id', flat=True)
+    )
+    return np.array(sorted(t.hex for t in changed), dtype=str)
+
+
+def refresh_similar_tracks(full=False, top_k=None):
+    """Пересчитывает соседей треков; без ``full`` — только для затронутых с прошлого запуска.
+
+    Инкрементальный режим замечает новые оценки и добавления в плейлисты;
+    удаления и изменения оценок учитываются при полном пересчёте.
+    Возвращает количество пересчитанных треков.
+    """
+    top_k = top_k or settings.SIMILAR_TRACKS_TOP_K
+    started = timezone.now()
+    since = None if full else JobWatermark.get(WATERMARK)
+
+    vocabulary = np.array(sorted(t.hex for t in Track.objects.values_list('id', flat=True)))
+    if not vocabulary.size:
+        JobWatermark.set(WATERMARK, started)
+        return 0
+
+    matrix = build_item_matrix(vocabulary)
+    normalized = normalize_columns(matrix)
+    transposed = normalized.T.tocsr()
+
+    if since is None:
+        targets = np.arange(len(vocabulary))
+    else:
+        codes, known = _track_codes(vocabulary, _changed_tracks(since))
+        dirty = codes[known]
+        targets = affected_columns(matrix, dirty) if dirty.size else dirty
+
+    for start in range(0, len(targets), BATCH_SIZE):
+        columns = targets[start:start + BATCH_SIZE]
+        rows = []
+        for column, neighbors, scores in top_neighbors(normalized, transposed, columns, top_k):
+            track_id = uuid.UUID(vocabulary[column])
+            rows.extend(
+                SimilarTrack(track_id=track_id, neighbor_id=uuid.UUID(vocabulary[n]), score=float(s), rank=rank)
+                for rank, (n, s) in enumerate(zip(neighbors, scores), start=1)
+            )
+        with transaction.atomic():
+            SimilarTrack.objects.filter(
+                track_id__in=[uuid.UUID(vocabulary[c]) for c in columns]
+            ).delete()
+            SimilarTrack.objects.bulk_create(rows, batch_size=1000)
+
+    JobWatermark.set(WATERMARK, started)
+    return len(targets)
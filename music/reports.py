@@ -0,0 +1,475 @@
+"""Отчёт администратора: сбор данных, XLSX/PDF и фоновое построение.
+
+Отчёт строится в фоне (``ReportJob``), страница опрашивает прогресс.
+Готовый файл сохраняется в ``MEDIA_ROOT/reports/`` и привязан к отпечатку
+данных (``fingerprint``) — нескольким дешёвым агрегатам по таблицам отчёта
+и текущей дате. Пока данные не изменились, повторные запросы отдают готовый
+файл, а на один отпечаток строится не больше одного отчёта.
+Переименования объектов отпечаток не меняют: такой отчёт обновится
+не позже следующего дня.
+
+Топы, рейтинги, жанры, альбомы по годам и активность за 30 дней берутся
+из витрины (snapshots.py), поэтому в отпечаток входит и время её среза.
+
+Той же очередью строятся выгрузки таблиц в XLSX (exports.py): у такого
+задания заполнено ``export``, а файл — книга с одной таблицей.
+"""
+import hashlib
+import io
+import logging
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+
+from . import distributions, exports, snapshots
+from .analytics import top_tracks as analytics_top_tracks
+from .models import (
+    Album, AlbumDimension, AlbumFacts, AlbumRating, Artist, Comment, DailyTrackPlays, Genre, GenreFacts,
+    Group, Playlist, ReportJob, Track, TrackFacts, TrackGenre, TrackRating, User,
+)
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+# Формат: (Content-Type, имя файла при скачивании)
+FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'music_advanced_report.xlsx'),
+    'pdf': ('application/pdf', 'music_service_report.pdf'),
+}
+
+# Агрегаты, из которых складывается отпечаток данных отчёта
+SNAPSHOT = [
+    (User, {'n': Count('pk'), 'last': Max('registration_date'),
+            'admins': Count('pk', filter=Q(role='admin')), 'moderators': Count('pk', filter=Q(role='moderator'))}),
+    (Track, {'n': Count('pk'), 'plays': Sum('play_count'), 'duration': Sum('duration'), 'last': Max('created_at')}),
+    (Album, {'n': Count('pk'), 'last': Max('release_date')}),
+    (Artist, {'n': Count('pk')}),
+    (Group, {'n': Count('pk')}),
+    (Genre, {'n': Count('pk')}),
+    (TrackGenre, {'n': Count('pk')}),
+    (Playlist, {'n': Count('pk'), 'tracks': Sum('track_count'), 'last': Max('creation_date')}),
+    (Comment, {'n': Count('pk'), 'last': Max('created_at')}),
+    (TrackRating, {'n': Count('pk'), 'sum': Sum('value'), 'last': Max('rating_date')}),
+    (AlbumRating, {'n': Count('pk'), 'sum': Sum('value'), 'last': Max('rating_date')}),
+    (DailyTrackPlays, {'n': Count('pk'), 'plays': Sum('plays')}),
+]
+
+ROLE_NAMES = {'user': 'Пользователь', 'admin': 'Администратор', 'moderator': 'Модератор'}
+
+
+def fingerprint():
+    """Отпечаток текущих данных отчёта"""
+    parts = [str(timezone.localdate()), str(snapshots.snapshot_time())]
+    for model, aggregates in SNAPSHOT:
+        values = model.objects.aggregate(**aggregates)
+        parts.append(f"{model._meta.model_name}:{sorted(values.items())}")
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+def request_report(fmt, user=None, export=''):
+    """Задание отчёта (или выгрузки ``export``) для текущих данных; при необходимости запускает построение в фоне"""
+    job, _ = ReportJob.objects.get_or_create(
+        format=fmt, export=export, fingerprint=fingerprint(), defaults={'requested_by': user}
+    )
+    if job.status == 'done' and job.file and job.file.storage.exists(job.file.name):
+        return job
+
+    # Строит только тот, кто перевёл задание в «running»; зависшее задание перезапускается
+    now = timezone.now()
+    startable = Q(status__in=['pending', 'failed', 'done']) | Q(
+        status='running', started_at__lt=now - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+    )
+    claimed = ReportJob.objects.filter(startable, pk=job.pk).update(
+        status='running', progress=0, error='', started_at=now, finished_at=None
+    )
+    if claimed:
+        run_in_background(build, job.pk)
+        job.refresh_from_db()
+    return job
+
+
+def build(job_id):
+    """Строит файл отчёта для задания (выполняется в фоне)"""
+    job = ReportJob.objects.get(pk=job_id)
+
+    def progress(percent):
+        ReportJob.objects.filter(pk=job_id).update(progress=percent)
+
+    try:
+        if job.export:
+            content = File(exports.xlsx_file(job.export))
+        else:
+            content = ContentFile(RENDERERS[job.format](collect(progress)))
+    except Exception as error:
+        logger.exception('Ошибка построения отчёта %s', job_id)
+        ReportJob.objects.filter(pk=job_id).update(status='failed', error=str(error), finished_at=timezone.now())
+        return
+
+    # Хранилище копирует файл блоками — книга выгрузки не читается в память целиком
+    with content:
+        job.file.save(f'{job.export or job.format}-{job.fingerprint[:16]}.{job.format}', content, save=False)
+    ReportJob.objects.filter(pk=job_id).update(
+        status='done', progress=100, file=job.file.name, finished_at=timezone.now()
+    )
+    discard_stale(job)
+
+
+def discard_stale(job):
+    """Удаляет файлы и задания этого формата и выгрузки для прежних отпечатков"""
+    stale = ReportJob.objects.filter(
+        format=job.format, export=job.export, created_at__lt=job.created_at,
+    ).exclude(status='running')
+    for old in stale:
+        if old.file:
+            old.file.delete(save=False)
+    stale.delete()
+
+
+def attachment(job):
+    """Content-Type и имя файла готового задания при скачивании"""
+    content_type, filename = FORMATS[job.format]
+    return content_type, f'{job.export}.{job.format}' if job.export else filename
+
+
+def collect(progress=lambda percent: None):
+    """Данные отчёта; ``progress`` получает процент готовности"""
+    data = SimpleNamespace()
+    # Витрина ещё не строилась — первый отчёт строит её сам
+    if snapshots.snapshot_time() is None:
+        snapshots.refresh()
+
+    # === ОСНОВНАЯ СТАТИСТИКА ===
+    data.total_users = User.objects.count()
+    data.total_tracks = Track.objects.count()
+    data.total_albums = Album.objects.count()
+    data.total_artists = Artist.objects.count()
+    data.total_groups = Group.objects.count()
+    data.total_playlists = Playlist.objects.count()
+    data.total_comments = Comment.objects.count()
+    data.total_track_ratings = TrackRating.objects.count()
+    data.total_album_ratings = AlbumRating.objects.count()
+    data.total_genres = Genre.objects.count()
+    progress(10)
+
+    # === ПОПУЛЯРНОСТЬ (витрина) ===
+    data.top_tracks = list(TrackFacts.objects.select_related('track').order_by('-play_count')[:20])
+    # Для альбомов — сумма прослушиваний всех треков
+    data.top_albums = list(AlbumFacts.objects.select_related('album').filter(track_count__gt=0).order_by('-play_count')[:20])
+    data.top_artists_by_albums = list(Artist.objects.annotate(albums_count=Count('album')).order_by('-albums_count')[:20])
+    data.top_groups_by_albums = list(Group.objects.annotate(albums_count=Count('album')).order_by('-albums_count')[:20])
+    progress(25)
+
+    # === РЕЙТИНГИ (витрина) ===
+    rated_tracks = TrackFacts.objects.select_related('track').filter(rating_count__gt=0)
+    data.best_tracks = list(rated_tracks.order_by('-rating_avg')[:20])
+    data.worst_tracks = list(rated_tracks.order_by('rating_avg')[:20])
+    data.best_albums = list(AlbumFacts.objects.select_related('album').filter(rating_count__gt=0).order_by('-rating_avg')[:20])
+    progress(40)
+
+    # === ЖАНРОВАЯ АНАЛИТИКА (витрина) ===
+    data.genre_stats = list(GenreFacts.objects.select_related('genre').order_by('-track_count')[:15])
+
+    # === ПОЛЬЗОВАТЕЛЬСКАЯ АКТИВНОСТЬ ===
+    # Счётчики берутся из UserStats (один JOIN один-к-одному, без размножения строк)
+    data.most_active_users = list(User.objects.filter(stats__isnull=False).annotate(
+        playlists_count=F('stats__playlists_count'),
+        comments_count=F('stats__comments_count'),
+        ratings_count=F('stats__ratings_count')
+    ).order_by('-playlists_count')[:15])
+    progress(55)
+
+    # === ВРЕМЕННАЯ АНАЛИТИКА (витрина) ===
+    activity = snapshots.activity_totals(days=30)
+    data.new_users_30d = activity['users']
+    data.new_playlists_30d = activity['playlists']
+    data.new_comments_30d = activity['comments']
+
+    # === САМЫЕ ДЛИННЫЕ И КОРОТКИЕ ТРЕКИ ===
+    data.longest_tracks = list(Track.objects.select_related('album').filter(duration__isnull=False).order_by('-duration')[:10])
+    data.shortest_tracks = list(Track.objects.select_related('album').filter(duration__isnull=False).order_by('duration')[:10])
+
+    # === АЛЬБОМЫ ПО ГОДАМ (витрина) ===
+    data.albums_by_year = list(AlbumDimension.objects.filter(release_year__isnull=False).values(
+        'release_year'
+    ).annotate(count=Count('id')).order_by('-release_year')[:10])
+    progress(70)
+
+    # === САМЫЕ КОММЕНТИРУЕМЫЕ ТРЕКИ (витрина) ===
+    data.most_commented_tracks = list(TrackFacts.objects.select_related('track').filter(
+        comment_count__gt=0
+    ).order_by('-comment_count')[:15])
+
+    # === СТАТИСТИКА ПО РОЛЯМ ПОЛЬЗОВАТЕЛЕЙ ===
+    data.users_by_role = list(User.objects.values('role').annotate(count=Count('id')).order_by('-count'))
+
+    # === САМЫЕ ПОПУЛЯРНЫЕ ПЛЕЙЛИСТЫ ===
+    data.popular_playlists = list(Playlist.objects.select_related('user').order_by('-track_count')[:15])
+
+    # === ПРОСЛУШИВАНИЯ ЗА 30 ДНЕЙ (агрегаты базы аналитики) ===
+    data.recent_top_tracks = analytics_top_tracks(days=30)
+
+    # === РАСПРЕДЕЛЕНИЯ И КОГОРТЫ (NumPy) ===
+    # Отчёт строится в фоне — при пустом кэше таблицы считаются здесь же
+    data.distributions = distributions.summary() or distributions.build()
+    progress(85)
+    return data
+
+
+def _duration(seconds):
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def _album_name(track):
+    return track.album.name if track.album else 'Без альбома'
+
+
+def render_xlsx(data):
+    """Отчёт в формате Excel"""
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+
+    # === ОСНОВНАЯ СТАТИСТИКА ===
+    ws = wb.active
+    ws.title = 'Общая статистика'
+    ws.append(['Метрика', 'Значение'])
+    ws.append(['Пользователи', data.total_users])
+    ws.append(['Треки', data.total_tracks])
+    ws.append(['Альбомы', data.total_albums])
+    ws.append(['Артисты', data.total_artists])
+    ws.append(['Группы', data.total_groups])
+    ws.append(['Плейлисты', data.total_playlists])
+    ws.append(['Комментарии', data.total_comments])
+    ws.append(['Оценки треков', data.total_track_ratings])
+    ws.append(['Оценки альбомов', data.total_album_ratings])
+    ws.append(['Жанры', data.total_genres])
+    ws.append(['', ''])
+    ws.append(['=== АКТИВНОСТЬ ЗА 30 ДНЕЙ ===', ''])
+    ws.append(['Новые пользователи', data.new_users_30d])
+    ws.append(['Новые плейлисты', data.new_playlists_30d])
+    ws.append(['Новые комментарии', data.new_comments_30d])
+
+    # === ТОП ТРЕКОВ ПО ПРОСЛУШИВАНИЯМ ===
+    ws2 = wb.create_sheet('Топ треков по прослушиваниям')
+    ws2.append(['#', 'Название трека', 'Прослушивания', 'Альбом'])
+    for i, f in enumerate(data.top_tracks, start=1):
+        ws2.append([i, f.track.name, f.play_count, f.track.album_name or 'Без альбома'])
+
+    # === ТОП АЛЬБОМОВ ПО ПРОСЛУШИВАНИЯМ ===
+    ws3 = wb.create_sheet('Топ альбомов по прослушиваниям')
+    ws3.append(['#', 'Название альбома', 'Прослушивания', 'Группа/Артист'])
+    for i, f in enumerate(data.top_albums, start=1):
+        ws3.append([i, f.album.name, f.play_count, f.album.performer or 'Неизвестно'])
+
+    # === ТОП АРТИСТОВ ПО КОЛИЧЕСТВУ АЛЬБОМОВ ===
+    ws4 = wb.create_sheet('Топ артистов по альбомам')
+    ws4.append(['#', 'Имя артиста', 'Количество альбомов'])
+    for i, a in enumerate(data.top_artists_by_albums, start=1):
+        ws4.append([i, a.name, a.albums_count])
+
+    # === ТОП ГРУПП ПО КОЛИЧЕСТВУ АЛЬБОМОВ ===
+    ws5 = wb.create_sheet('Топ групп по альбомам')
+    ws5.append(['#', 'Название группы', 'Количество альбомов'])
+    for i, g in enumerate(data.top_groups_by_albums, start=1):
+        ws5.append([i, g.name, g.albums_count])
+
+    # === ЛУЧШИЕ И ХУДШИЕ ТРЕКИ, ЛУЧШИЕ АЛЬБОМЫ ПО РЕЙТИНГУ ===
+    for title, name_title, rows in [
+        ('Лучшие треки по рейтингу', 'Название трека', [(f.track, f) for f in data.best_tracks]),
+        ('Худшие треки по рейтингу', 'Название трека', [(f.track, f) for f in data.worst_tracks]),
+        ('Лучшие альбомы по рейтингу', 'Название альбома', [(f.album, f) for f in data.best_albums]),
+    ]:
+        sheet = wb.create_sheet(title)
+        sheet.append(['#', name_title, 'Средний рейтинг', 'Количество оценок'])
+        for i, (item, facts) in enumerate(rows, start=1):
+            sheet.append([i, item.name, round(facts.rating_avg, 2), facts.rating_count])
+
+    # === ЖАНРОВАЯ СТАТИСТИКА ===
+    ws9 = wb.create_sheet('Статистика по жанрам')
+    ws9.append(['#', 'Жанр', 'Количество треков', 'Средний рейтинг'])
+    for i, f in enumerate(data.genre_stats, start=1):
+        avg_rating = round(f.rating_avg, 2) if f.rating_avg else 0
+        ws9.append([i, f.genre.name, f.track_count, avg_rating])
+
+    # === САМЫЕ АКТИВНЫЕ ПОЛЬЗОВАТЕЛИ ===
+    ws10 = wb.create_sheet('Самые активные пользователи')
+    ws10.append(['#', 'Пользователь', 'Плейлисты', 'Комментарии', 'Оценки'])
+    for i, u in enumerate(data.most_active_users, start=1):
+        ws10.append([i, u.login, u.playlists_count, u.comments_count, u.ratings_count])
+
+    # === САМЫЕ ДЛИННЫЕ И КОРОТКИЕ ТРЕКИ ===
+    for title, rows in [('Самые длинные треки', data.longest_tracks), ('Самые короткие треки', data.shortest_tracks)]:
+        sheet = wb.create_sheet(title)
+        sheet.append(['#', 'Название трека', 'Длительность (мин:сек)', 'Альбом'])
+        for i, t in enumerate(rows, start=1):
+            sheet.append([i, t.name, _duration(t.duration), _album_name(t)])
+
+    # === АЛЬБОМЫ ПО ГОДАМ ===
+    ws13 = wb.create_sheet('Альбомы по годам')
+    ws13.append(['Год', 'Количество альбомов'])
+    for year_data in data.albums_by_year:
+        ws13.append([year_data['release_year'], year_data['count']])
+
+    # === САМЫЕ КОММЕНТИРУЕМЫЕ ТРЕКИ ===
+    ws14 = wb.create_sheet('Самые комментируемые треки')
+    ws14.append(['#', 'Название трека', 'Количество комментариев', 'Альбом'])
+    for i, f in enumerate(data.most_commented_tracks, start=1):
+        ws14.append([i, f.track.name, f.comment_count, f.track.album_name or 'Без альбома'])
+
+    # === СТАТИСТИКА ПО РОЛЯМ ===
+    ws15 = wb.create_sheet('Пользователи по ролям')
+    ws15.append(['Роль', 'Количество'])
+    for role_data in data.users_by_role:
+        ws15.append([ROLE_NAMES.get(role_data['role'], role_data['role']), role_data['count']])
+
+    # === ПОПУЛЯРНЫЕ ПЛЕЙЛИСТЫ ===
+    ws16 = wb.create_sheet('Популярные плейлисты')
+    ws16.append(['#', 'Название плейлиста', 'Количество треков', 'Владелец', 'Публичный'])
+    for i, p in enumerate(data.popular_playlists, start=1):
+        ws16.append([i, p.name, p.track_count, p.user.login, 'Да' if p.is_public else 'Нет'])
+
+    # === ПРОСЛУШИВАНИЯ ЗА 30 ДНЕЙ ===
+    ws17 = wb.create_sheet('Прослушивания за 30 дней')
+    ws17.append(['#', 'Название трека', 'Прослушивания', 'Слушатели (сумма по дням)', 'Альбом'])
+    for i, (t, plays, listeners) in enumerate(data.recent_top_tracks, start=1):
+        ws17.append([i, t.name, plays, listeners, _album_name(t)])
+
+    # === РАСПРЕДЕЛЕНИЯ И КОГОРТЫ ===
+    for name, (title, header, _) in distributions.TABLES.items():
+        sheet = wb.create_sheet(title)
+        sheet.append(header)
+        for row in data.distributions[name]:
+            sheet.append(list(row))
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def render_pdf(data):
+    """Отчёт в формате PDF"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    # Настройка шрифтов для поддержки кириллицы
+    try:
+        # Попробуем использовать системный шрифт Arial
+        pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
+        pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
+        font_name = 'Arial'
+        font_bold = 'Arial-Bold'
+    except Exception:
+        # Fallback на встроенные шрифты ReportLab с поддержкой Unicode
+        font_name = 'Helvetica'
+        font_bold = 'Helvetica-Bold'
+
+    # Функция для безопасного отображения текста
+    def safe_text(text):
+        if text is None:
+            return ""
+        # Заменяем проблемные символы на безопасные
+        return str(text).encode('utf-8', 'replace').decode('utf-8', 'replace')
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - 40
+
+    def section(title, lines, min_space=140):
+        nonlocal y
+        if y < min_space:
+            c.showPage()
+            y = height - 40
+        c.setFont(font_bold, 12)
+        c.drawString(40, y, title)
+        y -= 20
+        c.setFont(font_name, 10)
+        for line in lines:
+            c.drawString(40, y, line)
+            y -= 14
+            if y < 80:
+                c.showPage()
+                y = height - 40
+
+    c.setFont(font_bold, 14)
+    c.drawString(40, y, 'Music Service - Report')
+    y -= 30
+    section('Общая статистика', [f"{label}: {value}" for label, value in [
+        ('Пользователи', data.total_users),
+        ('Треки', data.total_tracks),
+        ('Альбомы', data.total_albums),
+        ('Артисты', data.total_artists),
+        ('Группы', data.total_groups),
+        ('Плейлисты', data.total_playlists),
+        ('Комментарии', data.total_comments),
+        ('Оценки треков', data.total_track_ratings),
+        ('Оценки альбомов', data.total_album_ratings),
+        ('Жанры', data.total_genres),
+    ]], min_space=0)
+    section('Активность за 30 дней', [f"{label}: {value}" for label, value in [
+        ('Новые пользователи', data.new_users_30d),
+        ('Новые плейлисты', data.new_playlists_30d),
+        ('Новые комментарии', data.new_comments_30d),
+    ]], min_space=100)
+    section('Топ треков по прослушиваниям', [
+        f"{i}. {safe_text(f.track.name)} — {f.play_count} прослушиваний"
+        for i, f in enumerate(data.top_tracks[:15], start=1)
+    ])
+    section('Лучшие треки по рейтингу', [
+        f"{i}. {safe_text(f.track.name)} — {round(f.rating_avg, 2)} ({f.rating_count} оценок)"
+        for i, f in enumerate(data.best_tracks[:15], start=1)
+    ])
+    section('Топ альбомов по прослушиваниям', [
+        f"{i}. {safe_text(f.album.name)} — {f.play_count} прослушиваний"
+        for i, f in enumerate(data.top_albums[:15], start=1)
+    ])
+    section('Статистика по жанрам', [
+        f"{i}. {safe_text(f.genre.name)} — {f.track_count} треков, рейтинг: {round(f.rating_avg, 2) if f.rating_avg else 0}"
+        for i, f in enumerate(data.genre_stats[:10], start=1)
+    ])
+    section('Самые активные пользователи', [
+        f"{i}. {safe_text(u.login)} — {u.playlists_count} плейлистов, {u.comments_count} комментариев"
+        for i, u in enumerate(data.most_active_users[:10], start=1)
+    ])
+    section('Самые длинные треки', [
+        f"{i}. {safe_text(t.name)} — {_duration(t.duration)}"
+        for i, t in enumerate(data.longest_tracks[:10], start=1)
+    ])
+    section('Самые комментируемые треки', [
+        f"{i}. {safe_text(f.track.name)} — {f.comment_count} комментариев"
+        for i, f in enumerate(data.most_commented_tracks[:10], start=1)
+    ])
+    section('Прослушивания за 30 дней', [
+        f"{i}. {safe_text(t.name)} — {plays} прослушиваний"
+        for i, (t, plays, listeners) in enumerate(data.recent_top_tracks[:10], start=1)
+    ])
+    section('Распределение оценок', [
+        f"{value}: треки — {tracks} ({tracks_share}%), альбомы — {albums} ({albums_share}%)"
+        for value, tracks, tracks_share, albums, albums_share in data.distributions['ratings']
+    ])
+    section('Прослушивания треков', [
+        f"{label}: {value}" for label, value in data.distributions['plays']
+    ])
+    section('Длительность треков', [
+        f"{label}: {count} ({share}%)" for label, count, share in data.distributions['durations']
+    ])
+    section('Удержание по неделям, %', [
+        f"{week:%d.%m.%Y} ({size}): " + ' '.join('—' if cell is None else f'{cell:g}' for cell in cells)
+        for week, size, *cells in data.distributions['retention']
+    ])
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'xlsx': render_xlsx,
+    'pdf': render_pdf,
+}
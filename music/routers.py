@@ -0,0 +1,144 @@
+"""Маршрутизация запросов между основной базой и репликами только для чтения.
+
+Записи всегда идут в ``default``, чтение — в случайную реплику
+(алиасы ``replica*`` из ``DATABASES``). Чтение остаётся на основной базе:
+
+* внутри транзакции на основной базе;
+* в запросах, которые сами пишут (POST и т.п.), и в фоновых задачах;
+* в течение ``REPLICA_STICKY_SECONDS`` после записи пользователя —
+  ``ReplicaStickinessMiddleware`` ставит cookie, чтобы пользователь
+  сразу видел свои изменения, даже если реплика отстаёт.
+
+Журнал событий, агрегаты и витрина отчётов (``ANALYTICS_MODELS``) живут
+в отдельной базе ``analytics`` — ``AnalyticsRouter`` стоит в ``DATABASE_ROUTERS``
+первым, чтобы поток прослушиваний и тяжёлые отчёты не нагружали основную базу.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'primary_until'
+
+ANALYTICS_DB = 'analytics'
+
+# Модели базы аналитики (model_name в нижнем регистре)
+ANALYTICS_MODELS = {
+    'playevent', 'playhistory', 'dailytrackplays',
+    'trackdimension', 'albumdimension', 'genredimension', 'userdimension',
+    'trackfacts', 'albumfacts', 'genrefacts', 'useractivityfacts',
+}
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока идут в основную базу"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def analytics_db():
+    """Алиас базы аналитики; без неё события пишутся в основную базу"""
+    return ANALYTICS_DB if ANALYTICS_DB in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+class AnalyticsRouter:
+    """Модели событий и агрегатов — в базу аналитики, остальные решает следующий роутер"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.model_name in ANALYTICS_MODELS:
+            return analytics_db()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Связей между базами нет: события ссылаются на каталог по UUID
+        if (obj1._meta.model_name in ANALYTICS_MODELS) != (obj2._meta.model_name in ANALYTICS_MODELS):
+            return False
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == ANALYTICS_DB:
+            return model_name in ANALYTICS_MODELS
+        if model_name in ANALYTICS_MODELS:
+            return analytics_db() == db
+        return None
+
+
+class ReplicaRouter:
+    """Чтение — в реплики, запись и миграции — в основную базу"""
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaStickinessMiddleware:
+    """Закрепляет чтение за основной базой для пишущих запросов и сразу после них"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._pin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._stick(request, response)
+
+    async def __acall__(self, request):
+        token = self._pin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._stick(request, response)
+
+    def _pin(self, request):
+        try:
+            sticky = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            sticky = False
+        return _pinned.set(_pinned.get() or sticky or request.method not in SAFE_METHODS)
+
+    def _stick(self, request, response):
+        if request.method not in SAFE_METHODS and replicas():
+            window = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, str(time.time() + window), max_age=window, httponly=True, samesite='Lax')
+        return response
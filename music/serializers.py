@@ -0,0 +1,68 @@
+"""Сериализаторы каталога для REST API ``/api/v1/`` (см. api.py)."""
+from rest_framework import serializers
+
+from .models import Album, Artist, Genre, Group, Playlist, PlaylistTrack, Track
+
+
+class CatalogSerializer(serializers.ModelSerializer):
+    """Базовый сериализатор каталога: ``fields`` — разреженный набор полей,
+    ``include`` — вложенные связанные объекты ``{имя: сериализатор}``"""
+
+    def __init__(self, *args, fields=None, include=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            keep = set(fields) | {'id'}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+        for name, field in (include or {}).items():
+            self.fields[name] = field
+
+
+class GenreSerializer(CatalogSerializer):
+    class Meta:
+        model = Genre
+        fields = ['id', 'name']
+
+
+class GroupSerializer(CatalogSerializer):
+    class Meta:
+        model = Group
+        fields = ['id', 'name', 'description', 'photo']
+
+
+class ArtistSerializer(CatalogSerializer):
+    class Meta:
+        model = Artist
+        fields = ['id', 'name', 'artist_role', 'biography', 'avatar']
+
+
+class AlbumSerializer(CatalogSerializer):
+    class Meta:
+        model = Album
+        fields = ['id', 'name', 'artist', 'group', 'release_date', 'play_count', 'photo']
+
+
+class TrackSerializer(CatalogSerializer):
+    class Meta:
+        model = Track
+        fields = ['id', 'name', 'album', 'duration', 'play_count', 'file', 'photo', 'created_at']
+
+
+class PlaylistEntrySerializer(serializers.ModelSerializer):
+    """Трек плейлиста вместе с его позицией"""
+    track = TrackSerializer(read_only=True)
+
+    class Meta:
+        model = PlaylistTrack
+        fields = ['position', 'added_date', 'track']
+
+
+class PlaylistSerializer(CatalogSerializer):
+    is_smart = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Playlist
+        fields = [
+            'id', 'name', 'description', 'user', 'is_public', 'is_smart',
+            'photo', 'creation_date', 'track_count', 'total_duration',
+        ]
@@ -0,0 +1,41 @@
+"""Фоновая очистка истёкших сессий.
+
+Хранилище сессий выбирается настройкой ``SESSION_STRATEGY`` (settings.py).
+Для хранилищ в базе (``db``, ``cached_db``) истёкшие строки ``django_session``
+удаляются в фоне после входа пользователя — не чаще раза в
+``SESSION_PURGE_INTERVAL`` секунд на все процессы (отметка в ``JobWatermark``).
+Кеш и подписанные cookie истекают сами, для них очистка ничего не делает.
+"""
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import JobWatermark
+from .tasks import run_in_background
+
+WATERMARK = 'sessions_purge'
+
+# Хранилища, которые держат сессии в базе
+DB_ENGINES = {
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+}
+
+
+def purge_expired():
+    """Удаляет истёкшие сессии текущего хранилища (аналог ``clearsessions``)"""
+    import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+
+
+def schedule_purge():
+    """Запускает очистку в фоне, если с прошлой прошло больше SESSION_PURGE_INTERVAL"""
+    if settings.SESSION_ENGINE not in DB_ENGINES:
+        return None
+    now = timezone.now()
+    last = JobWatermark.get(WATERMARK)
+    if last is not None and now - last < timedelta(seconds=settings.SESSION_PURGE_INTERVAL):
+        return None
+    JobWatermark.set(WATERMARK, now)
+    return run_in_background(purge_expired)
@@ -0,0 +1,140 @@
+"""Обработчики сигналов моделей приложения"""
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import AlbumRating, Comment, Playlist, PlaylistTrack, Track, TrackGenre, TrackRating, User, UserStats
+from .playlists import refresh_totals
+from .smart_playlists import schedule_refresh
+from . import sqlite, stats
+from .sessions import schedule_purge
+
+# Поля трека, которые не влияют на правила умных плейлистов
+SMART_IRRELEVANT_FIELDS = {'play_count'}
+
+
+def _refresh_smart_playlists(track_id, rating_only=False):
+    """Точечно обновляет умные плейлисты после фиксации транзакции"""
+    transaction.on_commit(lambda: schedule_refresh(track_id, rating_only))
+
+
+@receiver(post_save, sender=Track)
+def track_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= SMART_IRRELEVANT_FIELDS:
+        return
+    if not created:
+        # Длительность могла измениться — обновляем итоги плейлистов с этим треком
+        refresh_totals(PlaylistTrack.objects.filter(track_id=instance.pk).values('playlist_id'))
+    _refresh_smart_playlists(instance.pk)
+
+
+@receiver(pre_delete, sender=Track)
+def track_deleting(sender, instance, **kwargs):
+    # Строки плейлистов удалятся каскадом; запоминаем, чьи итоги пересчитать
+    instance._affected_playlists = list(
+        PlaylistTrack.objects.filter(track_id=instance.pk).values_list('playlist_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Track)
+def track_deleted(sender, instance, **kwargs):
+    playlist_ids = getattr(instance, '_affected_playlists', None)
+    if playlist_ids:
+        refresh_totals(playlist_ids)
+
+
+@receiver(post_save, sender=PlaylistTrack)
+def playlist_track_saved(sender, instance, created, **kwargs):
+    if created:
+        refresh_totals([instance.playlist_id])
+
+
+@receiver(m2m_changed, sender=Playlist.tracks.through)
+def playlist_tracks_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_totals([instance.pk])
+    elif pk_set:
+        refresh_totals(pk_set)
+
+
+@receiver(post_save, sender=TrackGenre)
+@receiver(post_delete, sender=TrackGenre)
+def track_genre_changed(sender, instance, **kwargs):
+    _refresh_smart_playlists(instance.track_id)
+
+
+@receiver(post_save, sender=TrackRating)
+@receiver(post_delete, sender=TrackRating)
+def track_rating_changed(sender, instance, **kwargs):
+    _refresh_smart_playlists(instance.track_id, rating_only=True)
+
+
+@receiver(m2m_changed, sender=Track.genres.through)
+def track_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _refresh_smart_playlists(instance.pk)
+    else:
+        for track_id in pk_set or ():
+            _refresh_smart_playlists(track_id)
+
+
+# Статистика пользователей
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Playlist)
+def playlist_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.user_id, playlists_count=1)
+
+
+@receiver(post_delete, sender=Playlist)
+def playlist_deleted(sender, instance, **kwargs):
+    stats.bump(instance.user_id, touch=False, playlists_count=-1)
+    stats.refresh_playlist_totals([instance.user_id])
+
+
+@receiver(post_save, sender=TrackRating)
+@receiver(post_save, sender=AlbumRating)
+def rating_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.user_id, ratings_count=1)
+    else:
+        stats.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=TrackRating)
+@receiver(post_delete, sender=AlbumRating)
+def rating_deleted(sender, instance, **kwargs):
+    stats.bump(instance.user_id, touch=False, ratings_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.user_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    stats.bump(instance.user_id, touch=False, comments_count=-1)
+
+
+@receiver(user_logged_in)
+def logged_in(sender, request, user, **kwargs):
+    # Вход создаёт новую сессию — заодно изредка убираем истёкшие
+    schedule_purge()
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    sqlite.configure(connection)
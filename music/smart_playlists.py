@@ -0,0 +1,170 @@
+"""Умные плейлисты: треки подбираются по правилам.
+
+Правила хранятся в ``Playlist.rules`` (JSON), жанры — в ``Playlist.genres``.
+Правила компилируются в один запрос к трекам, результат материализуется
+в ``PlaylistTrack`` — ту же таблицу, что и у обычных плейлистов, поэтому
+открытие умного плейлиста стоит столько же, сколько открытие обычного.
+Снимок обновляется точечно при изменении трека, его жанров или оценок
+и полностью — командой ``refresh_smart_playlists``.
+
+Точечные изменения копятся в наборе «грязных» треков: один фоновый поток
+раз в ``SMART_PLAYLIST_REFRESH_DELAY`` секунд забирает весь набор и проверяет
+только плейлисты, чьи правила могут касаться этих треков (по жанрам, правилу
+оценки и текущему составу) — одним запросом на плейлист, а не на событие.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Playlist, PlaylistTrack, Track, TrackGenre
+from .playlists import append_tracks, refresh_totals
+from .tasks import run_in_background
+
+# Допустимые правила и их типы
+RULES = {
+    'min_rating': float,
+    'min_duration': int,
+    'max_duration': int,
+    'added_within_days': int,
+}
+
+READ_ONLY_ERROR = 'Треки умного плейлиста подбираются автоматически по правилам'
+
+# Треки, ожидающие проверки: {UUID трека: изменились только оценки}
+_dirty = {}
+_dirty_lock = threading.Lock()
+_worker_running = False
+
+
+def clean_rules(data):
+    """Проверяет правила из формы/JSON; пустые значения отбрасываются. Бросает ValueError."""
+    rules = {}
+    for name, value in (data or {}).items():
+        if name not in RULES:
+            raise ValueError(f'Неизвестное правило: {name}')
+        if value in (None, ''):
+            continue
+        value = RULES[name](value)
+        if value < 0:
+            raise ValueError(f'Неверное значение правила: {name}')
+        rules[name] = value
+    return rules
+
+
+def track_queryset(playlist):
+    """Треки, подходящие под правила плейлиста (один SQL-запрос)"""
+    rules = playlist.rules or {}
+    tracks = Track.objects.all()
+
+    genre_ids = [genre.pk for genre in playlist.genres.all()]
+    if genre_ids:
+        tracks = tracks.filter(
+            Exists(TrackGenre.objects.filter(track=OuterRef('pk'), genre_id__in=genre_ids))
+        )
+    if 'min_duration' in rules:
+        tracks = tracks.filter(duration__gte=rules['min_duration'])
+    if 'max_duration' in rules:
+        tracks = tracks.filter(duration__lt=rules['max_duration'])
+    if 'added_within_days' in rules:
+        tracks = tracks.filter(created_at__gte=timezone.now() - timedelta(days=rules['added_within_days']))
+    if 'min_rating' in rules:
+        tracks = tracks.annotate(rating_avg=Avg('ratings__value')).filter(rating_avg__gte=rules['min_rating'])
+
+    return tracks.order_by('-play_count', '-created_at')
+
+
+def refresh_playlist(playlist):
+    """Пересобирает снимок треков умного плейлиста. Возвращает (добавлено, удалено)."""
+    if not playlist.is_smart:
+        return 0, 0
+
+    wanted = list(
+        track_queryset(playlist).values_list('pk', flat=True)[:settings.SMART_PLAYLIST_MAX_TRACKS]
+    )
+    current = set(playlist.playlist_tracks.values_list('track_id', flat=True))
+    added = [track_id for track_id in wanted if track_id not in current]
+    removed = current.difference(wanted)
+
+    with transaction.atomic():
+        if removed:
+            PlaylistTrack.objects.filter(playlist=playlist, track_id__in=removed).delete()
+        # Новые треки встают в конец в порядке правила
+        append_tracks(playlist, added)
+        if removed:
+            refresh_totals([playlist.pk])
+    return len(added), len(removed)
+
+
+def schedule_refresh(track_id, rating_only=False):
+    """Помечает трек для проверки и запускает фоновый поток, если он ещё не работает"""
+    global _worker_running
+    with _dirty_lock:
+        _dirty[track_id] = _dirty.get(track_id, True) and rating_only
+        if _worker_running:
+            return None
+        _worker_running = True
+    return run_in_background(_drain)
+
+
+def _drain():
+    global _worker_running
+    while True:
+        # Пауза собирает всплеск событий (например, серию оценок) в один проход
+        time.sleep(settings.SMART_PLAYLIST_REFRESH_DELAY)
+        with _dirty_lock:
+            batch = dict(_dirty)
+            _dirty.clear()
+            if not batch:
+                _worker_running = False
+                return
+        try:
+            rated = {track_id for track_id, rating_only in batch.items() if rating_only}
+            if rated:
+                refresh_for_tracks(rated, rating_only=True)
+            if len(rated) < len(batch):
+                refresh_for_tracks(set(batch) - rated)
+        except Exception:
+            # Ошибку запишет run_in_background; следующее изменение запустит новый поток
+            with _dirty_lock:
+                _worker_running = False
+            raise
+
+
+def refresh_for_tracks(track_ids, rating_only=False):
+    """Обновляет членство треков в умных плейлистах, на которые они могут влиять"""
+    track_ids = set(track_ids)
+    candidates = Q(genres__isnull=True) | Q(genres__in=TrackGenre.objects.filter(track_id__in=track_ids).values('genre_id'))
+    if rating_only:
+        # Оценка влияет только на правило min_rating, а жанры при этом не меняются
+        candidates = Q(rules__has_key='min_rating') & (candidates | Q(playlist_tracks__track_id__in=track_ids))
+    else:
+        # Трек мог перестать подходить — проверяем и плейлисты, где он уже есть
+        candidates |= Q(playlist_tracks__track_id__in=track_ids)
+    playlists = Playlist.objects.filter(candidates, rules__isnull=False).distinct().prefetch_related('genres')
+
+    for playlist in playlists:
+        matches = set(track_queryset(playlist).filter(pk__in=track_ids).values_list('pk', flat=True))
+        present = set(
+            PlaylistTrack.objects.filter(playlist=playlist, track_id__in=track_ids).values_list('track_id', flat=True)
+        )
+        if present - matches:
+            PlaylistTrack.objects.filter(playlist=playlist, track_id__in=present - matches).delete()
+            refresh_totals([playlist.pk])
+        added = [track_id for track_id in track_ids if track_id in matches and track_id not in present]
+        room = settings.SMART_PLAYLIST_MAX_TRACKS - playlist.playlist_tracks.count()
+        if added and room > 0:
+            append_tracks(playlist, added[:room])
+
+
+def refresh_all():
+    """Полностью пересобирает все умные плейлисты. Возвращает их количество."""
+    count = 0
+    for playlist in Playlist.objects.filter(rules__isnull=False).prefetch_related('genres'):
+        refresh_playlist(playlist)
+        count += 1
+    return count
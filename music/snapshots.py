@@ -0,0 +1,303 @@
+"""Витрина отчётов: измерения и факты в базе аналитики (схема «звезда»).
+
+Измерения (``TrackDimension``, ``AlbumDimension``, ``GenreDimension``,
+``UserDimension``) хранят названия и атрибуты для группировки, факты —
+показатели на момент среза (``TrackFacts``, ``AlbumFacts``, ``GenreFacts``)
+и дневную активность пользователей (``UserActivityFacts``); дневные
+прослушивания треков — ``DailyTrackPlays`` из analytics.py. Отчёты и панель
+администратора читают только витрину, без агрегатов по рабочим таблицам.
+
+``refresh`` обрабатывает только изменившееся после прошлого среза (отметка
+в ``JobWatermark``): треки, альбомы и оценки с более поздним ``updated_at``,
+новые комментарии, плейлисты и прослушивания — и пересчитывает затронутые
+ими альбомы и жанры. ``Track.play_count`` меняется UPDATE без ``save()``
+(просмотр трека, ``analytics.flush_counters``), поэтому такие UPDATE сами
+сдвигают ``updated_at`` трека. Удаления, переименования жанров и пользователей
+и смена ролей учитываются при полном пересчёте (``full=True``).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Avg, Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import analytics
+from .models import (
+    Album, AlbumDimension, AlbumFacts, AlbumRating, Comment, Genre, GenreDimension, GenreFacts,
+    JobWatermark, PlayEvent, Playlist, Track, TrackDimension, TrackFacts, TrackGenre, TrackRating,
+    User, UserActivityFacts, UserDimension,
+)
+from .routers import analytics_db, use_primary
+
+WATERMARK = 'star_snapshot'
+
+# Сколько объектов пересчитывается одним набором запросов
+BATCH_SIZE = 1000
+
+# Поле факта активности: (модель, поле времени события)
+ACTIVITY = {
+    'playlists': (Playlist, 'creation_date'),
+    'comments': (Comment, 'created_at'),
+    'ratings': (TrackRating, 'rating_date'),
+    'plays': (PlayEvent, 'played_at'),
+}
+
+
+def refresh(full=False):
+    """Обновляет витрину с прошлого среза (или целиком).
+
+    Возвращает число обновлённых треков, альбомов, жанров и пользователей.
+    """
+    started = timezone.now()
+    since = None if full else JobWatermark.get(WATERMARK)
+
+    with use_primary():
+        analytics.rollup()
+        if since is None:
+            track_ids = list(Track.objects.values_list('pk', flat=True))
+            album_ids = set(Album.objects.values_list('pk', flat=True))
+            genre_ids = set(Genre.objects.values_list('pk', flat=True))
+            user_ids = set(User.objects.values_list('pk', flat=True))
+            for model, ids in [(TrackDimension, track_ids), (AlbumDimension, album_ids),
+                               (GenreDimension, genre_ids), (UserDimension, user_ids)]:
+                _prune(model, ids)
+        else:
+            track_ids = _changed_tracks(since)
+            album_ids = set(Album.objects.filter(updated_at__gt=since).values_list('pk', flat=True))
+            album_ids.update(AlbumRating.objects.filter(updated_at__gt=since).values_list('album_id', flat=True))
+            genre_ids = set()
+            user_ids = set(User.objects.filter(registration_date__gt=since).values_list('pk', flat=True))
+
+        for batch in _batches(track_ids):
+            albums, genres = _refresh_tracks(batch)
+            album_ids.update(albums)
+            genre_ids.update(genres)
+        album_ids.discard(None)
+        for batch in _batches(album_ids):
+            _refresh_albums(batch)
+        for batch in _batches(genre_ids):
+            _refresh_genres(batch)
+
+        day = _first_day(since)
+        activity = _collect_activity(day)
+        user_ids.update(user_id for row_day, user_id in activity)
+        known = set()
+        for batch in _batches(user_ids):
+            known.update(_refresh_users(batch))
+        _store_activity(day, activity, known)
+
+    JobWatermark.set(WATERMARK, started)
+    return len(track_ids), len(album_ids), len(genre_ids), len(user_ids)
+
+
+def snapshot_time():
+    """Время последнего среза витрины или None"""
+    return JobWatermark.get(WATERMARK)
+
+
+def activity_totals(days=30):
+    """Суммарная активность пользователей за последние дни и число новых пользователей"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = UserActivityFacts.objects.filter(day__gte=since).aggregate(
+        playlists=Sum('playlists'), comments=Sum('comments'), ratings=Sum('ratings'), plays=Sum('plays'),
+    )
+    totals = {name: value or 0 for name, value in totals.items()}
+    totals['users'] = UserDimension.objects.filter(
+        registration_date__gte=timezone.make_aware(datetime.combine(since, time.min))
+    ).count()
+    return totals
+
+
+def _batches(ids):
+    iterator = iter(ids)
+    while batch := list(islice(iterator, BATCH_SIZE)):
+        yield batch
+
+
+def _changed_tracks(since):
+    """Треки, у которых после ``since`` изменились данные, оценки, комментарии или прослушивания"""
+    changed = set(Track.objects.filter(updated_at__gt=since).values_list('pk', flat=True))
+    changed.update(TrackRating.objects.filter(updated_at__gt=since).values_list('track_id', flat=True))
+    changed.update(Comment.objects.filter(created_at__gt=since).values_list('track_id', flat=True))
+    changed.update(PlayEvent.objects.filter(played_at__gt=since).values_list('track_id', flat=True).distinct())
+    return changed
+
+
+def _prune(model, ids):
+    """Удаляет из измерения (и, каскадом, из фактов) объекты, которых больше нет в каталоге"""
+    stale = set(model.objects.values_list('pk', flat=True)).difference(ids)
+    for batch in _batches(stale):
+        model.objects.filter(pk__in=batch).delete()
+
+
+def _upsert(model, objects):
+    key = model._meta.pk
+    model.objects.bulk_create(
+        objects, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=[key.name],
+        update_fields=[field.name for field in model._meta.concrete_fields if field is not key],
+    )
+
+
+def _average(value):
+    return float(value) if value is not None else None
+
+
+def _refresh_tracks(batch):
+    """Измерение и факты треков; возвращает затронутые альбомы (прежние и новые) и жанры"""
+    rows = Track.objects.filter(pk__in=batch).values_list(
+        'pk', 'name', 'album_id', 'album__name', 'album__group__name', 'album__artist__name',
+        'duration', 'created_at', 'play_count',
+    )
+    ratings = {
+        track_id: (count, avg) for track_id, count, avg in
+        TrackRating.objects.filter(track_id__in=batch).values_list('track_id').annotate(Count('id'), Avg('value')).order_by()
+    }
+    comments = dict(Comment.objects.filter(track_id__in=batch).values_list('track_id').annotate(Count('id')).order_by())
+    albums = set(TrackDimension.objects.filter(pk__in=batch).values_list('album_id', flat=True))
+    genres = set(TrackGenre.objects.filter(track_id__in=batch).values_list('genre_id', flat=True).distinct())
+
+    dimensions, facts = [], []
+    for pk, name, album_id, album_name, group, artist, duration, created_at, play_count in rows:
+        albums.add(album_id)
+        rating_count, rating_avg = ratings.get(pk, (0, None))
+        dimensions.append(TrackDimension(
+            id=pk, name=name, album_id=album_id, album_name=album_name or '',
+            performer=group or artist or '', duration=duration, created_at=created_at,
+        ))
+        facts.append(TrackFacts(
+            track_id=pk, play_count=play_count, rating_count=rating_count,
+            rating_avg=_average(rating_avg), comment_count=comments.get(pk, 0),
+        ))
+
+    with transaction.atomic(using=analytics_db()):
+        # Трек мог быть удалён после события, которое его затронуло
+        found = {dimension.id for dimension in dimensions}
+        TrackDimension.objects.filter(pk__in=[pk for pk in batch if pk not in found]).delete()
+        _upsert(TrackDimension, dimensions)
+        _upsert(TrackFacts, facts)
+    return albums, genres
+
+
+def _refresh_albums(batch):
+    rows = Album.objects.filter(pk__in=batch).values_list('pk', 'name', 'group__name', 'artist__name', 'release_date')
+    tracks = {
+        album_id: (count, plays) for album_id, count, plays in
+        Track.objects.filter(album_id__in=batch).values_list('album_id').annotate(Count('id'), Sum('play_count')).order_by()
+    }
+    ratings = {
+        album_id: (count, avg) for album_id, count, avg in
+        AlbumRating.objects.filter(album_id__in=batch).values_list('album_id').annotate(Count('id'), Avg('value')).order_by()
+    }
+
+    dimensions, facts = [], []
+    for pk, name, group, artist, release_date in rows:
+        track_count, play_count = tracks.get(pk, (0, 0))
+        rating_count, rating_avg = ratings.get(pk, (0, None))
+        dimensions.append(AlbumDimension(
+            id=pk, name=name, performer=group or artist or '',
+            release_year=release_date.year if release_date else None,
+        ))
+        facts.append(AlbumFacts(
+            album_id=pk, track_count=track_count, play_count=play_count or 0,
+            rating_count=rating_count, rating_avg=_average(rating_avg),
+        ))
+
+    with transaction.atomic(using=analytics_db()):
+        found = {dimension.id for dimension in dimensions}
+        AlbumDimension.objects.filter(pk__in=[pk for pk in batch if pk not in found]).delete()
+        _upsert(AlbumDimension, dimensions)
+        _upsert(AlbumFacts, facts)
+
+
+def _refresh_genres(batch):
+    rows = Genre.objects.filter(pk__in=batch).values_list('pk', 'name')
+    tracks = dict(
+        TrackGenre.objects.filter(genre_id__in=batch).values_list('genre_id')
+        .annotate(Count('track_id', distinct=True)).order_by()
+    )
+    ratings = {
+        genre_id: (count, avg) for genre_id, count, avg in
+        TrackRating.objects.filter(track__genres__in=batch).values_list('track__genres')
+        .annotate(Count('id'), Avg('value')).order_by()
+    }
+
+    dimensions, facts = [], []
+    for pk, name in rows:
+        rating_count, rating_avg = ratings.get(pk, (0, None))
+        dimensions.append(GenreDimension(id=pk, name=name))
+        facts.append(GenreFacts(
+            genre_id=pk, track_count=tracks.get(pk, 0), rating_count=rating_count, rating_avg=_average(rating_avg),
+        ))
+
+    with transaction.atomic(using=analytics_db()):
+        found = {dimension.id for dimension in dimensions}
+        GenreDimension.objects.filter(pk__in=[pk for pk in batch if pk not in found]).delete()
+        _upsert(GenreDimension, dimensions)
+        _upsert(GenreFacts, facts)
+
+
+def _refresh_users(batch):
+    """Измерение пользователей; возвращает пользователей, которые есть в каталоге"""
+    dimensions = [
+        UserDimension(id=pk, login=login, role=role, registration_date=registration_date)
+        for pk, login, role, registration_date in
+        User.objects.filter(pk__in=batch).values_list('pk', 'login', 'role', 'registration_date')
+    ]
+    _upsert(UserDimension, dimensions)
+    return {dimension.id for dimension in dimensions}
+
+
+def _first_day(since):
+    """День, с которого пересчитывается активность: день прошлого среза или первого события"""
+    if since is not None:
+        return timezone.localdate(since)
+    first = [
+        model.objects.aggregate(first=Min(field))['first']
+        for model, field in ACTIVITY.values()
+    ]
+    first = [value for value in first if value is not None]
+    return timezone.localdate(min(first)) if first else None
+
+
+def _collect_activity(day):
+    """Активность по (день, пользователь) начиная с ``day``"""
+    activity = defaultdict(dict)
+    if day is None:
+        return activity
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    for name, (model, field) in ACTIVITY.items():
+        rows = (
+            model.objects.filter(**{f'{field}__gte': start, 'user_id__isnull': False})
+            .annotate(day=TruncDate(field))
+            .values_list('day', 'user_id')
+            .annotate(Count('id'))
+            .order_by()
+        )
+        for row_day, user_id, count in rows:
+            activity[row_day, user_id][name] = count
+
+    # Дни, уже удалённые из журнала прослушиваний, сохраняют прежнее число прослушиваний
+    journal = PlayEvent.objects.aggregate(first=Min('played_at'))['first']
+    journal_day = timezone.localdate(journal) if journal else timezone.localdate() + timedelta(days=1)
+    kept = UserActivityFacts.objects.filter(day__gte=day, day__lt=journal_day, plays__gt=0)
+    for row_day, user_id, plays in kept.values_list('day', 'user_id', 'plays'):
+        activity[row_day, user_id]['plays'] = plays
+    return activity
+
+
+def _store_activity(day, activity, known):
+    """Заменяет факты активности начиная с ``day``; ``known`` — пользователи из измерения"""
+    if day is None:
+        return
+    rows = [
+        UserActivityFacts(day=row_day, user_id=user_id, **counts)
+        for (row_day, user_id), counts in activity.items()
+        # Прослушивания удалённых пользователей остаются только в журнале
+        if user_id in known
+    ]
+    with transaction.atomic(using=analytics_db()):
+        UserActivityFacts.objects.filter(day__gte=day).delete()
+        UserActivityFacts.objects.bulk_create(rows, batch_size=BATCH_SIZE)
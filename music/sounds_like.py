@@ -0,0 +1,226 @@
+"""Индекс «Звучит похоже» по аудио-эмбеддингам.
+
+Эмбеддинги всех треков стандартизуются, нормируются и записываются одной
+непрерывной матрицей float32 (``embeddings.npy``), которая открывается
+через memory map. Для приближённого поиска используется инвертированный
+индекс (IVF): строки матрицы упорядочены по кластерам k-means, поэтому
+запрос читает только несколько непрерывных срезов — кластеры, ближайшие
+к вектору запроса.
+
+Каждая сборка пишется в свой каталог ``index-<версия>`` (матрица и
+``index.npz``), а текущая версия указана в файле ``current``. Сборка
+подменяет указатель одним ``os.replace``, поэтому читатель всегда видит
+матрицу и метаданные одной версии.
+"""
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+from django.conf import settings
+
+from .audio_features import EMBEDDING_SIZE
+
+EMBEDDINGS_FILE = 'embeddings.npy'
+INDEX_FILE = 'index.npz'
+CURRENT_FILE = 'current'
+VERSION_PREFIX = 'index-'
+
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE_SIZE = 20000
+MAX_CLUSTERS = 4096
+
+
+def _path(*names):
+    return os.path.join(settings.AUDIO_FEATURES_DIR, *names)
+
+
+def current_version():
+    """Каталог текущей сборки индекса или None, если индекса нет"""
+    try:
+        with open(_path(CURRENT_FILE), encoding='ascii') as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+def _switch(version):
+    """Атомарно делает ``version`` текущей сборкой (None — удаляет индекс)"""
+    if version is None:
+        if os.path.exists(_path(CURRENT_FILE)):
+            os.remove(_path(CURRENT_FILE))
+        return
+    tmp = _path(CURRENT_FILE + '.tmp')
+    with open(tmp, 'w', encoding='ascii') as file:
+        file.write(version)
+    os.replace(tmp, _path(CURRENT_FILE))
+
+
+def _remove_stale(*keep):
+    """Удаляет старые сборки, кроме ``keep``"""
+    for name in os.listdir(settings.AUDIO_FEATURES_DIR):
+        if name.startswith(VERSION_PREFIX) and name not in keep:
+            # Под Windows сборку, открытую через memory map, удалить нельзя — уберёт следующая
+            shutil.rmtree(_path(name), ignore_errors=True)
+    # Файлы индекса прежнего формата, лежавшие прямо в каталоге
+    for name in (EMBEDDINGS_FILE, INDEX_FILE):
+        if os.path.exists(_path(name)):
+            os.remove(_path(name))
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _assign(vectors, centroids, batch_size=8192):
+    """Номер ближайшего (по косинусу) центроида для каждой строки"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        labels[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors, n_clusters, seed=0):
+    """Сферический k-means на подвыборке строк"""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > KMEANS_SAMPLE_SIZE:
+        sample = vectors[rng.choice(len(vectors), KMEANS_SAMPLE_SIZE, replace=False)]
+
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=n_clusters) == 0
+        # Пустые кластеры переинициализируем случайными точками
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+def build_index(rows):
+    """Строит индекс по парам (UUID трека, вектор float32). Возвращает число треков."""
+    ids, vectors = [], []
+    for track_id, vector in rows:
+        ids.append(track_id.hex)
+        vectors.append(np.frombuffer(vector, dtype=np.float32))
+
+    os.makedirs(settings.AUDIO_FEATURES_DIR, exist_ok=True)
+    previous = current_version()
+    if not ids:
+        _switch(None)
+        _remove_stale()
+        return 0
+
+    matrix = np.vstack(vectors)
+    mean = matrix.mean(axis=0)
+    std = matrix.std(axis=0)
+    std[std == 0] = 1.0
+    matrix = _normalize_rows((matrix - mean) / std).astype(np.float32)
+
+    n_clusters = int(min(MAX_CLUSTERS, max(1, np.sqrt(len(matrix)))))
+    centroids = train_centroids(matrix, n_clusters)
+    labels = _assign(matrix, centroids)
+
+    order = np.argsort(labels, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_clusters))]).astype(np.int64)
+    ordered_ids = np.array(ids)[order]
+
+    # Новая сборка не видна читателям, пока на неё не переключится указатель
+    version = VERSION_PREFIX + uuid.uuid4().hex
+    os.makedirs(_path(version))
+    out = np.lib.format.open_memmap(_path(version, EMBEDDINGS_FILE), mode='w+', dtype=np.float32, shape=matrix.shape)
+    out[:] = matrix[order]
+    out.flush()
+    del out
+
+    lookup = np.argsort(ordered_ids)
+    np.savez(
+        _path(version, INDEX_FILE),
+        ids=ordered_ids,
+        sorted_ids=ordered_ids[lookup],
+        sorted_rows=lookup.astype(np.int64),
+        centroids=centroids,
+        offsets=offsets,
+        mean=mean.astype(np.float32),
+        std=std.astype(np.float32),
+    )
+    _switch(version)
+    # Предыдущую сборку оставляем: её мог только что выбрать читатель в другом процессе
+    _remove_stale(version, previous)
+    return len(ordered_ids)
+
+
+class SoundsLikeIndex:
+    """Загруженный индекс: матрица через memory map и метаданные IVF"""
+
+    def __init__(self, version):
+        with np.load(_path(version, INDEX_FILE)) as data:
+            self.ids = data['ids']
+            self.sorted_ids = data['sorted_ids']
+            self.sorted_rows = data['sorted_rows']
+            self.centroids = data['centroids']
+            self.offsets = data['offsets']
+        self.embeddings = np.load(_path(version, EMBEDDINGS_FILE), mmap_mode='r')
+        if self.embeddings.shape[1] != EMBEDDING_SIZE:
+            raise ValueError('Размерность индекса не совпадает с размером эмбеддинга')
+
+    def row_of(self, track_id):
+        key = track_id.hex
+        pos = np.searchsorted(self.sorted_ids, key)
+        if pos < len(self.sorted_ids) and self.sorted_ids[pos] == key:
+            return int(self.sorted_rows[pos])
+        return None
+
+    def search(self, track_id, limit=10, nprobe=None):
+        """Список (UUID трека, сходство) для треков, звучащих похоже на ``track_id``"""
+        row = self.row_of(track_id)
+        if row is None:
+            return []
+
+        query = np.asarray(self.embeddings[row])
+        nprobe = min(nprobe or settings.SOUNDS_LIKE_NPROBE, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        # Строки кластера лежат подряд; сортировка сохраняет последовательное чтение с диска
+        candidates = np.sort(np.concatenate([
+            np.arange(self.offsets[c], self.offsets[c + 1]) for c in clusters
+        ]))
+        scores = np.asarray(self.embeddings[candidates]) @ query
+
+        keep = candidates != row
+        candidates, scores = candidates[keep], scores[keep]
+        if scores.size > limit:
+            best = np.argpartition(-scores, limit)[:limit]
+            candidates, scores = candidates[best], scores[best]
+        order = np.argsort(-scores)
+        return [(uuid.UUID(self.ids[c]), float(s)) for c, s in zip(candidates[order], scores[order])]
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Индекс текущего процесса; перечитывается, если индекс был перестроен"""
+    global _index, _index_version
+    version = current_version()
+    if version is None:
+        return None
+
+    with _index_lock:
+        if _index is None or version != _index_version:
+            _index = SoundsLikeIndex(version)
+            _index_version = version
+        return _index
+
+
+def sounds_like(track_id, limit=10):
+    index = get_index()
+    if index is None:
+        return []
+    return index.search(track_id, limit=limit)
@@ -0,0 +1,21 @@
+"""Настройка соединений SQLite для параллельной записи.
+
+При каждом новом соединении с базой SQLite выполняются PRAGMA из ключа
+``PRAGMAS`` её настроек (``SQLITE_PRAGMAS`` в settings.py):
+
+* ``busy_timeout`` — сколько ждать чужую блокировку вместо ошибки;
+* ``journal_mode=wal`` — чтение не блокируется записью и наоборот;
+* ``synchronous=normal`` — в режиме WAL fsync только при контрольной точке;
+* ``mmap_size`` и ``cache_size`` — чтение через отображение файла и кеш страниц.
+
+``BEGIN IMMEDIATE`` для транзакций задаётся штатной опцией
+``OPTIONS['transaction_mode']`` (``SQLITE_OPTIONS``).
+"""
+
+
+def configure(connection):
+    """Применяет PRAGMA из настроек базы к только что открытому соединению"""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in (connection.settings_dict.get('PRAGMAS') or {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,83 @@
+"""Сводная статистика пользователей (``UserStats``).
+
+Счётчики обновляются сигналами на месте — одним UPDATE строки
+пользователя с F-выражением. Треки и длительность плейлистов берутся
+из уже поддерживаемых колонок ``Playlist.track_count``/``total_duration``.
+``rebuild`` пересчитывает всё с нуля отдельными подзапросами на каждую
+колонку, поэтому счётчики не размножаются, как при нескольких JOIN.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AlbumRating, Comment, Playlist, TrackRating, User, UserStats
+
+# Счётчики, которые ``rebuild`` восстанавливает из исходных таблиц
+REBUILT_FIELDS = {'playlists_count', 'tracks_count', 'total_duration', 'ratings_count', 'comments_count'}
+
+
+def _count(model):
+    rows = model.objects.filter(user=OuterRef('user_id')).order_by().values('user')
+    return Coalesce(Subquery(rows.annotate(n=Count('pk')).values('n')), 0)
+
+
+def _playlist_totals():
+    playlists = Playlist.objects.filter(user=OuterRef('user_id')).order_by().values('user')
+    return {
+        'tracks_count': Coalesce(Subquery(playlists.annotate(n=Sum('track_count')).values('n')), 0),
+        'total_duration': Coalesce(Subquery(playlists.annotate(n=Sum('total_duration')).values('n')), 0),
+    }
+
+
+def bump(user_id, touch=True, **deltas):
+    """Изменяет счётчики пользователя на ``deltas``; ``touch`` обновляет время активности"""
+    values = {
+        field: F(field) + delta if delta >= 0 else Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items()
+    }
+    if touch:
+        values['last_activity'] = timezone.now()
+    if UserStats.objects.filter(user_id=user_id).update(**values) or not touch:
+        return
+    # Строки ещё нет (пользователь старше таблицы статистики) — считаем с нуля
+    UserStats.objects.get_or_create(user_id=user_id)
+    rebuild([user_id])
+    UserStats.objects.filter(user_id=user_id).update(
+        last_activity=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items() if field not in REBUILT_FIELDS}
+    )
+
+
+def refresh_playlist_totals(user_ids=None):
+    """Обновляет треки и длительность плейлистов в статистике пользователей (None — всех)"""
+    stats = UserStats.objects.all() if user_ids is None else UserStats.objects.filter(user_id__in=user_ids)
+    return stats.update(**_playlist_totals())
+
+
+def rebuild(user_ids=None):
+    """Пересчитывает статистику с нуля (None — всех пользователей). Прослушивания сохраняются."""
+    users = User.objects.filter(stats__isnull=True)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in users.values_list('pk', flat=True)],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+    stats = UserStats.objects.all() if user_ids is None else UserStats.objects.filter(user_id__in=user_ids)
+    return stats.update(
+        playlists_count=_count(Playlist),
+        ratings_count=_count(TrackRating) + _count(AlbumRating),
+        comments_count=_count(Comment),
+        **_playlist_totals(),
+    )
+
+
+def get_stats(user):
+    """Строка статистики пользователя; создаётся при первом обращении"""
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is None:
+        rebuild([user.pk])
+        stats = UserStats.objects.get(user=user)
+    return stats
@@ -0,0 +1,63 @@
+"""Потоковые ответы с постоянным расходом памяти и под WSGI, и под ASGI.
+
+Под ASGI Django читает синхронный итератор ``StreamingHttpResponse`` (и файл
+``FileResponse``) целиком через ``sync_to_async(list)`` и только потом
+отправляет первый байт. ``content`` в этом режиме оборачивает итератор
+в асинхронный, который забирает по ``chunk_size`` элементов за вызов
+``sync_to_async``. Вызовы идут в том же потоке, что и синхронное представление,
+поэтому курсор ``QuerySet.iterator()`` остаётся на своём соединении.
+Под WSGI итератор отдаётся как есть.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+# Блок чтения файла, как у ASGIHandler.chunk_size
+FILE_BLOCK_SIZE = 2 ** 16
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+def content(request, iterator, chunk_size):
+    """Содержимое ``StreamingHttpResponse`` для сервера, принявшего ``request``"""
+    if not is_asgi(request):
+        return iterator
+    return _async_chunks(iter(iterator), chunk_size)
+
+
+async def _async_chunks(iterator, chunk_size):
+    take = sync_to_async(lambda: list(islice(iterator, chunk_size)))
+    try:
+        while chunk := await take():
+            for part in chunk:
+                yield part
+    finally:
+        # Клиент отключился — генератор закрывается, а с ним курсор или файл
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def file_response(request, file, filename, content_type, size):
+    """Скачивание файла блоками; файл закрывается по окончании"""
+    if not is_asgi(request):
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=content_type)
+
+    response = StreamingHttpResponse(content(request, file_blocks(file), 1), content_type=content_type)
+    response['Content-Length'] = size
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def file_blocks(file):
+    """Блоки файла для ``content``; файл закрывается по окончании"""
+    try:
+        while block := file.read(FILE_BLOCK_SIZE):
+            yield block
+    finally:
+        file.close()
@@ -0,0 +1,56 @@
+"""Фоновые задачи, запускаемые из представлений.
+
+Задачи выполняются в отдельном потоке внутри процесса веб-сервера,
+чтобы не задерживать ответ пользователю.
+"""
+import logging
+import threading
+
+from django.db import close_old_connections
+
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+
+def run_in_background(func, *args, **kwargs):
+    """Запускает ``func`` в фоновом потоке"""
+    def runner():
+        close_old_connections()
+        try:
+            # Задача обрабатывает только что записанные данные — реплика может отставать
+            with use_primary():
+                func(*args, **kwargs)
+        except Exception:
+            logger.exception('Ошибка фоновой задачи %s', func.__name__)
+        finally:
+            close_old_connections()
+
+    thread = threading.Thread(target=runner, name=f'task-{func.__name__}', daemon=True)
+    thread.start()
+    return thread
+
+
+def process_track_file(track_id):
+    """Постобработка загруженного файла трека"""
+    from .audio import AudioDecodeError
+    from .audio_features import extract_features
+    from .models import PlaylistTrack, Track
+    from .playlists import refresh_totals
+    from .waveform import build_waveform
+
+    track = Track.objects.filter(pk=track_id).first()
+    if track is None or not track.file:
+        return
+
+    duration = track.calculate_duration()
+    if duration and duration != track.duration:
+        Track.objects.filter(pk=track_id).update(duration=duration)
+        refresh_totals(PlaylistTrack.objects.filter(track_id=track_id).values('playlist_id'))
+
+    try:
+        build_waveform(track)
+        # Эмбеддинг попадёт в индекс «Звучит похоже» при следующей перестройке
+        extract_features(track)
+    except AudioDecodeError as e:
+        logger.warning('Не удалось декодировать файл трека %s: %s', track_id, e)
@@ -1,3 +1,865 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import DatabaseError, OperationalError, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import URLResolver, reverse
+from django.utils import timezone
+
+from . import (
+    analytics, distributions, exports, history, mailing, playlists, reports, routers, snapshots, stats, uploads,
+)
+from . import urls as music_urls
+from .models import (
+    Album, AlbumDimension, AlbumFacts, AlbumRating, Artist, Comment, EmailOutbox, Genre, GenreDimension, GenreFacts,
+    Group, Playlist, PlaylistTrack, PlayEvent, PlayHistory, ReportJob, Track, TrackDimension, TrackFacts, TrackGenre,
+    TrackRating, TrackUpload, User, UserActivityFacts, UserDimension, UserStats,
+)
+
+
+def no_background_tasks(test):
+    """Фоновые задачи не запускаются: их поток пишет своим соединением, мимо транзакции теста"""
+    for module in ('analytics', 'distributions', 'history', 'mailing', 'reports', 'sessions', 'smart_playlists',
+                   'uploads', 'views'):
+        patcher = mock.patch(f'music.{module}.run_in_background')
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+def temp_media(test):
+    """Файлы теста — во временном каталоге"""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    override = test.settings(
+        MEDIA_ROOT=media,
+        TRACK_UPLOAD_DIR=os.path.join(media, 'uploads'),
+        AUDIO_FEATURES_DIR=os.path.join(media, 'audio_features'),
+    )
+    override.enable()
+    test.addCleanup(override.disable)
+    return media
+
+
+class FlakyBackend(EmailBackend):
+    """Бэкенд в памяти, который отвергает адреса из ``errors`` и считает открытые соединения"""
+    errors = {}
+    opened = 0
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            for address in message.to:
+                if address in self.errors:
+                    raise self.errors[address]
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='music.tests.FlakyBackend',
+    EMAIL_OUTBOX_BATCH_SIZE=2,
+    EMAIL_OUTBOX_RATE=0,
+    EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+    EMAIL_OUTBOX_RETRY_DELAY=60,
+)
+class MailingTests(TestCase):
+    def setUp(self):
+        FlakyBackend.errors = {}
+        FlakyBackend.opened = 0
+        # Отправку в тестах запускаем сами, без фонового потока
+        patcher = mock.patch('music.mailing.run_in_background')
+        self.run_in_background = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enqueue(self, *recipients):
+        with self.captureOnCommitCallbacks(execute=True):
+            return mailing.enqueue('Тема', 'Текст', recipients)
+
+    def test_enqueue_and_deliver(self):
+        campaign = self.enqueue('a@example.com', 'b@example.com', 'a@example.com', 'c@example.com')
+        self.run_in_background.assert_called_once_with(mailing.deliver)
+
+        self.assertEqual(mailing.deliver(), 3)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['a@example.com', 'b@example.com', 'c@example.com'])
+        # Две порции, но одно соединение на весь проход
+        self.assertEqual(FlakyBackend.opened, 1)
+        self.assertEqual(mailing.progress(campaign.pk), {'total': 3, 'sent': 3, 'failed': 0, 'pending': 0, 'status': 'done'})
+        campaign.refresh_from_db()
+        self.assertIsNotNone(campaign.finished_at)
+
+    def test_claim_is_exclusive_until_lease_expires(self):
+        self.enqueue('a@example.com', 'b@example.com', 'c@example.com')
+        first, second = uuid.uuid4(), uuid.uuid4()
+
+        claimed = mailing._claim(first)
+        self.assertEqual(len(claimed), 2)
+        rest = mailing._claim(second)
+        self.assertEqual(len(rest), 1)
+        self.assertFalse({e.pk for e in claimed} & {e.pk for e in rest})
+        self.assertEqual(mailing._claim(uuid.uuid4()), [])
+
+        # Обработчик упал: по истечении аренды письма снова доступны
+        EmailOutbox.objects.filter(lock_token=first).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual({e.pk for e in mailing._claim(uuid.uuid4())}, {e.pk for e in claimed})
+
+    def test_lease_covers_paced_batch(self):
+        self.assertEqual(mailing.lease(), mailing.LEASE)
+        with self.settings(EMAIL_OUTBOX_BATCH_SIZE=1000, EMAIL_OUTBOX_RATE=1):
+            self.assertEqual(mailing.lease(), timedelta(seconds=2000))
+
+    def test_retry_backoff_and_max_attempts(self):
+        FlakyBackend.errors = {'a@example.com': smtplib.SMTPDataError(451, 'Попробуйте позже')}
+        self.enqueue('a@example.com')
+
+        delays = []
+        for attempt in range(1, 4):
+            started = timezone.now()
+            with self.assertLogs('music.mailing', 'WARNING'):
+                self.assertEqual(mailing.deliver(wait=False), 0)
+            email = EmailOutbox.objects.get()
+            self.assertEqual(email.attempts, attempt)
+            self.assertIsNone(email.lock_token)
+            delays.append(round((email.next_attempt_at - started).total_seconds()))
+            # Не ждём паузу, а сдвигаем срок следующей попытки
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+
+        self.assertEqual(delays[:2], [60, 120])
+        self.assertEqual(email.status, 'failed')
+        self.assertIn('Попробуйте позже', email.last_error)
+        self.assertEqual(mailing.deliver(wait=False), 0)
+        self.assertEqual(EmailOutbox.objects.get().attempts, 3)
+
+    def test_refused_recipient_fails_immediately(self):
+        FlakyBackend.errors = {'a@example.com': smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No such user')})}
+        campaign = self.enqueue('a@example.com', 'b@example.com')
+
+        with self.assertLogs('music.mailing', 'WARNING'):
+            self.assertEqual(mailing.deliver(), 1)
+        refused = EmailOutbox.objects.get(to_email='a@example.com')
+        self.assertEqual((refused.status, refused.attempts), ('failed', 1))
+        self.assertEqual([m.to for m in mail.outbox], [['b@example.com']])
+        self.assertEqual(mailing.progress(campaign.pk)['status'], 'done')
+
+
+@override_settings(REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    # Без обёртки TestCase в транзакцию: иначе чтение всегда закреплено за основной базой
+    databases = {'default'}
+
+    def setUp(self):
+        patcher = mock.patch('music.routers.replicas', return_value=['replica1'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def middleware(self, request):
+        """Пропускает запрос через middleware и возвращает (базу чтения внутри запроса, ответ)"""
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Track))
+            return HttpResponse()
+
+        response = routers.ReplicaStickinessMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(router.db_for_read(Track), 'replica1')
+        self.assertEqual(router.db_for_write(Track), 'default')
+        self.assertEqual(router.db_for_read(PlayEvent), routers.analytics_db())
+
+    def test_reads_pinned_to_primary(self):
+        with routers.use_primary():
+            self.assertEqual(router.db_for_read(Track), 'default')
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Track), 'default')
+        self.assertEqual(router.db_for_read(Track), 'replica1')
+
+    def test_no_replicas(self):
+        with mock.patch('music.routers.replicas', return_value=[]):
+            self.assertEqual(router.db_for_read(Track), 'default')
+            _, response = self.middleware(self.factory.post('/'))
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_write_sticks_reads_to_primary(self):
+        db, response = self.middleware(self.factory.post('/'))
+        self.assertEqual(db, 'default')
+        cookie = response.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        self.assertAlmostEqual(float(cookie.value), time.time() + 10, delta=1)
+
+        # Следующее чтение в окне видит свою запись
+        request = self.factory.get('/')
+        request.COOKIES[routers.STICKY_COOKIE] = cookie.value
+        db, response = self.middleware(request)
+        self.assertEqual(db, 'default')
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+        # Закрепление не выходит за пределы запроса
+        self.assertEqual(router.db_for_read(Track), 'replica1')
+
+    def test_expired_or_invalid_cookie_reads_replica(self):
+        for value in (str(time.time() - 1), 'garbage'):
+            request = self.factory.get('/')
+            request.COOKIES[routers.STICKY_COOKIE] = value
+            self.assertEqual(self.middleware(request)[0], 'replica1')
+
+    def test_async_middleware(self):
+        seen = []
+
+        async def view(request):
+            seen.append(router.db_for_read(Track))
+            return HttpResponse()
+
+        middleware = routers.ReplicaStickinessMiddleware(view)
+        response = async_to_sync(middleware)(self.factory.post('/'))
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[routers.STICKY_COOKIE] = response.cookies[routers.STICKY_COOKIE].value
+        async_to_sync(middleware)(request)
+        async_to_sync(middleware)(self.factory.get('/'))
+        self.assertEqual(seen, ['default', 'default', 'replica1'])
+
+
+def _api_routes(patterns, prefix=''):
+    """Пары (маршрут, имя URL) приложения"""
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern).lstrip('^').rstrip('$')
+        if isinstance(pattern, URLResolver):
+            yield from _api_routes(pattern.url_patterns, route)
+        elif pattern.name:
+            yield route, pattern.name
+
+
+class TokenApiTests(TestCase):
+    """Каждый эндпоинт API с токеном вместо сессии — по обоим префиксам"""
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        no_background_tasks(self)
+        temp_media(self)
+        self.user = User.objects.create_user('admin', 'admin@example.com', 'secret', role='admin')
+        self.genre = Genre.objects.create(name='Рок')
+        self.artist = Artist.objects.create(name='Артист')
+        self.group = Group.objects.create(name='Группа')
+        self.album = Album.objects.create(name='Альбом', artist=self.artist)
+        self.tracks = [
+            Track.objects.create(name=f'Трек {i}', album=self.album, file=f'tracks/{i}.mp3', duration=60)
+            for i in range(3)
+        ]
+        TrackGenre.objects.create(track=self.tracks[0], genre=self.genre)
+        self.called = set()
+        self.access = None
+
+    def call(self, prefix, name, method='POST', data=None, status=200, query=None, headers=None, **kwargs):
+        self.called.add(name)
+        url = prefix + reverse(f'music:{name}', kwargs=kwargs or None)
+        if query:
+            url += '?' + '&'.join(f'{key}={value}' for key, value in query.items())
+        body, content_type = (data, 'application/octet-stream') if isinstance(data, bytes) else (json.dumps(data or {}), 'application/json')
+        if self.access:
+            headers = {'authorization': f'Bearer {self.access}', **(headers or {})}
+        response = self.client.generic(method, url, body, content_type=content_type, headers=headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, status, f'{method} {url}: {content[:300]!r}')
+        return json.loads(content) if response.get('Content-Type', '').startswith('application/json') else content
+
+    def test_every_endpoint_with_token(self):
+        for prefix in ('', '/music'):
+            with self.subTest(prefix=prefix):
+                self.run_endpoints(prefix)
+
+        api_names = {name for route, name in _api_routes(music_urls.urlpatterns) if route.startswith('api/')}
+        self.assertEqual(api_names - self.called, set())
+
+    def run_endpoints(self, prefix):
+        track, other, third = (t.pk for t in self.tracks)
+        self.access = None
+        tokens = self.call(prefix, 'api_token_obtain', data={'login': 'admin', 'password': 'secret'})
+        self.access = self.call(prefix, 'api_token_refresh', data={'refresh': tokens['refresh']})['access']
+        playlist = Playlist.objects.create(user=self.user, name='Плейлист')
+
+        self.call(prefix, 'api_rate_track', data={'rating': 5}, track_id=track)
+        self.call(prefix, 'api_rate_album', data={'rating': 4}, album_id=self.album.pk)
+        comment = self.call(prefix, 'api_add_comment', data={'text': 'Текст'}, track_id=track)['comment']
+        self.call(prefix, 'api_delete_comment', comment_id=comment['id'])
+
+        playlists = self.call(prefix, 'api_get_playlists', 'GET')['playlists']
+        self.assertIn(str(playlist.pk), [str(p['id']) for p in playlists])
+        self.call(prefix, 'api_add_track_to_playlist', data={'track_id': str(track)}, playlist_id=playlist.pk)
+        self.call(prefix, 'api_remove_track_from_playlist', data={'track_id': str(track)}, playlist_id=playlist.pk)
+        self.call(prefix, 'api_add_tracks_to_playlist', data={'track_ids': [str(track), str(other)]}, playlist_id=playlist.pk)
+        self.call(prefix, 'api_add_album_to_playlist', data={'album_id': str(self.album.pk)}, playlist_id=playlist.pk)
+        self.call(prefix, 'api_add_artist_to_playlist', data={'artist_id': str(self.artist.pk)}, playlist_id=playlist.pk)
+        self.call(prefix, 'api_add_group_to_playlist', data={'group_id': str(self.group.pk)}, playlist_id=playlist.pk)
+        self.call(prefix, 'api_reorder_playlist', data={'moves': [{'track_id': str(third), 'after': None}]}, playlist_id=playlist.pk)
+        self.call(prefix, 'api_remove_tracks_from_playlist', data={'track_ids': [str(other)]}, playlist_id=playlist.pk)
+        self.assertEqual(list(playlist.playlist_tracks.order_by('position').values_list('track_id', flat=True)), [third, track])
+
+        self.call(prefix, 'api_play_track', 'GET', track_id=track)
+        history = self.call(prefix, 'api_play_history', 'GET')['items']
+        self.assertEqual(history[0]['track_id'], str(track))
+        self.call(prefix, 'api_track_waveform', 'GET', status=404, track_id=track)
+        self.call(prefix, 'api_similar_tracks', 'GET', track_id=track)
+        self.call(prefix, 'api_sounds_like', 'GET', track_id=track)
+        self.call(prefix, 'api_radio', 'GET', query={'seed_track': track, 'count': 2})
+
+        upload = self.call(prefix, 'api_upload_init', data={'filename': 'new.mp3', 'size': 4})['upload_id']
+        self.call(prefix, 'api_upload_chunk', 'PUT', data=b'ID3\x00', headers={'upload-offset': '0'}, upload_id=upload)
+        self.assertEqual(self.call(prefix, 'api_upload_status', 'GET', upload_id=upload)['offset'], 4)
+        self.call(prefix, 'api_upload_finalize', data={'track_id': str(track)}, upload_id=upload)
+        self.assertEqual(TrackUpload.objects.get(pk=upload).status, 'complete')
+
+        self.call(prefix, 'api-root', 'GET')
+        for basename, obj in (('track', track), ('album', self.album.pk), ('artist', self.artist.pk),
+                              ('group', self.group.pk), ('genre', self.genre.pk), ('playlist', playlist.pk)):
+            self.call(prefix, f'api-{basename}-list', 'GET')
+            self.call(prefix, f'api-{basename}-detail', 'GET', pk=obj)
+
+        self.call(prefix, 'api_token_revoke', data={'refresh': tokens['refresh']}, status=204)
+        self.call(prefix, 'api_get_playlists', 'GET', status=401)
+
+
+@override_settings(PLAY_HISTORY_SIZE=3, PLAY_HISTORY_MAX_AGE_DAYS=30)
+class PlayHistoryTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        no_background_tasks(self)
+        self.user = User.objects.create_user('listener', 'listener@example.com', 'secret')
+        self.other = User.objects.create_user('other', 'other@example.com', 'secret')
+        self.tracks = [Track.objects.create(name=f'Трек {i}') for i in range(5)]
+
+    def test_play_writes_only_analytics(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        # Очистка в этом процессе ещё не запускалась
+        history._trimmed_at = None
+        with self.assertNumQueries(0, using='default'):
+            history.record_play(self.user, self.tracks[0])
+            history.record_play(AnonymousUser(), self.tracks[1])
+        self.assertEqual(PlayEvent.objects.count(), 2)
+        self.assertEqual(list(PlayHistory.objects.values_list('user_id', 'track_id')), [(self.user.pk, self.tracks[0].pk)])
+        history.run_in_background.assert_called_once_with(history.trim)
+
+    def test_trim_keeps_last_entries_per_user(self):
+        now = timezone.now()
+        for i, track in enumerate(self.tracks):
+            PlayHistory.objects.create(user_id=self.user.pk, track_id=track.pk, played_at=now - timedelta(minutes=10 - i))
+        PlayHistory.objects.create(user_id=self.other.pk, track_id=self.tracks[0].pk, played_at=now - timedelta(days=40))
+        PlayHistory.objects.create(user_id=self.other.pk, track_id=self.tracks[1].pk, played_at=now)
+
+        self.assertEqual(history.trim(), 3)
+        self.assertEqual([p.track_id for p in history.recent(self.user)], [t.pk for t in self.tracks[:1:-1]])
+        self.assertEqual([p.track_id for p in history.recent(self.other)], [self.tracks[1].pk])
+
+        # Следующая очистка смотрит только на тех, кто слушал после неё
+        PlayHistory.objects.create(user_id=self.user.pk, track_id=self.tracks[0].pk, played_at=now - timedelta(hours=1))
+        self.assertEqual(history.trim(), 0)
+        self.assertEqual(history.trim([self.user.pk]), 1)
+
+    def test_recent_attaches_tracks(self):
+        history.record_play(self.user, self.tracks[0])
+        history.record_play(self.user, self.tracks[1])
+        self.tracks[0].delete()
+        self.assertEqual([p.track for p in history.with_tracks(history.recent(self.user))], [self.tracks[1]])
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        no_background_tasks(self)
+        temp_media(self)
+        self.user = User.objects.create_user('admin', 'admin@example.com', 'secret', role='admin')
+        self.upload = TrackUpload.objects.create(user=self.user, filename='song.mp3', size=10)
+
+    def write(self, offset, data, length=None):
+        return uploads.write_chunk(self.upload, io.BytesIO(data), offset, len(data) if length is None else length)
+
+    def assertUploadError(self, status, *args):
+        with self.assertRaises(uploads.UploadError) as raised:
+            self.write(*args)
+        self.assertEqual(raised.exception.status, status)
+
+    def test_chunks_in_order(self):
+        self.assertEqual(self.write(0, b'abcd'), 4)
+        self.assertEqual(self.write(4, b'efghij'), 10)
+        self.assertEqual(uploads.current_offset(self.upload), 10)
+        with open(uploads.temp_path(self.upload), 'rb') as fh:
+            self.assertEqual(fh.read(), b'abcdefghij')
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.received, 10)
+
+    def test_out_of_order_and_overlapping_chunks(self):
+        self.write(0, b'abcd')
+        # Блок из будущего, повтор уже принятого и блок внахлёст
+        self.assertUploadError(409, 6, b'ghij')
+        self.assertUploadError(409, 0, b'abcd')
+        self.assertUploadError(409, 2, b'cdef')
+        self.assertUploadError(416, 4, b'efghijk')
+        self.assertEqual(uploads.current_offset(self.upload), 4)
+        self.assertEqual(self.write(4, b'efghij'), 10)
+
+    def test_reserve_is_exclusive(self):
+        self.assertTrue(uploads._reserve(self.upload, 0, 4))
+        # Параллельный запрос с тем же смещением диапазон не получит
+        self.assertFalse(uploads._reserve(self.upload, 0, 4))
+        self.assertUploadError(409, 0, b'abcd')
+
+        # Запрос, занявший диапазон, упал: после TRACK_UPLOAD_CHUNK_TIMEOUT диапазон свободен
+        TrackUpload.objects.filter(pk=self.upload.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.write(0, b'abcd'), 4)
+
+    def test_interrupted_chunk_is_discarded(self):
+        self.write(0, b'abcd')
+        # Клиент обещал 6 байт, а соединение оборвалось после 3
+        self.assertUploadError(400, 4, b'efg', 6)
+        self.assertEqual(uploads.current_offset(self.upload), 4)
+        self.assertEqual(TrackUpload.objects.get(pk=self.upload.pk).received, 4)
+        self.assertEqual(self.write(4, b'efghij'), 10)
+
+    def test_finalize_with_missing_ranges(self):
+        track = Track.objects.create(name='Трек')
+        self.write(0, b'abcd')
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.attach_to_track(self.upload, track)
+        self.assertEqual(raised.exception.status, 409)
+
+        self.client.force_login(self.user)
+        url = reverse('music:api_upload_finalize', args=[self.upload.pk])
+        response = self.client.post(url, json.dumps({'track_id': str(track.pk)}), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Track.objects.get(pk=track.pk).file)
+
+        self.write(4, b'efghij')
+        response = self.client.post(url, json.dumps({'track_id': str(track.pk)}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(uploads.temp_path(self.upload)))
+        with Track.objects.get(pk=track.pk).file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'abcdefghij')
+
+    @override_settings(TRACK_UPLOAD_EXPIRE_HOURS=24)
+    def test_purge_expired(self):
+        self.write(0, b'abcd')
+        fresh = TrackUpload.objects.create(user=self.user, filename='fresh.mp3', size=10)
+        uploads.write_chunk(fresh, io.BytesIO(b'ab'), 0, 2)
+        done = TrackUpload.objects.create(user=self.user, filename='done.mp3', size=10, status='complete')
+        TrackUpload.objects.filter(pk__in=[self.upload.pk, done.pk]).update(updated_at=timezone.now() - timedelta(hours=25))
+        orphan = os.path.join(settings.TRACK_UPLOAD_DIR, f'{uuid.uuid4()}.part')
+        other = os.path.join(settings.TRACK_UPLOAD_DIR, 'notes.txt')
+        for path in (orphan, other):
+            with open(path, 'wb') as fh:
+                fh.write(b'x')
+
+        self.assertEqual(uploads.purge_expired(), 1)
+        self.assertEqual(set(TrackUpload.objects.values_list('pk', flat=True)), {fresh.pk, done.pk})
+        self.assertFalse(os.path.exists(uploads.temp_path(self.upload)))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(uploads.temp_path(fresh)))
+        self.assertTrue(os.path.exists(other))
+
+
+class PlaylistOrderTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'secret')
+        self.playlist = Playlist.objects.create(user=user, name='Плейлист')
+        self.tracks = [Track.objects.create(name=f'Трек {i}').pk for i in range(5)]
+        playlists.append_tracks(self.playlist, self.tracks)
+        self.expected = list(self.tracks)
+
+    def order(self):
+        return list(self.playlist.playlist_tracks.order_by('position').values_list('track_id', flat=True))
+
+    def move(self, track_id, after_id):
+        """Перемещение в базе и в ожидаемом списке"""
+        playlists.move_after(self.playlist, track_id, after_id)
+        self.simulate([(track_id, after_id)])
+
+    def simulate(self, moves):
+        for track_id, after_id in moves:
+            self.expected.remove(track_id)
+            self.expected.insert(0 if after_id is None else self.expected.index(after_id) + 1, track_id)
+
+    def test_move_to_head_and_tail(self):
+        a, b, c, d, e = self.tracks
+        self.move(d, None)
+        self.assertEqual(self.order(), self.expected)
+        self.move(a, e)
+        self.move(d, a)
+        self.assertEqual(self.order(), [b, c, e, a, d])
+
+    def test_exhausted_gap_renumbers(self):
+        a, b, c = self.tracks[:3]
+        renumber = mock.patch.object(playlists, 'renumber', wraps=playlists.renumber)
+        with renumber as renumbered:
+            # Каждое перемещение делит промежуток после «a» пополам
+            for i in range(15):
+                self.move(b if i % 2 else c, a)
+                self.assertEqual(self.order(), self.expected)
+        self.assertTrue(renumbered.called)
+        positions = list(self.playlist.playlist_tracks.order_by('position').values_list('position', flat=True))
+        self.assertEqual(len(set(positions)), len(positions))
+
+    def test_apply_moves(self):
+        a, b, c, d, e = self.tracks
+        moves = [(e, None), (a, b), (c, e), (b, d), (d, None)]
+        playlists.apply_moves(self.playlist, moves)
+        self.simulate(moves)
+        self.assertEqual(self.order(), self.expected)
+
+        # Ошибка в любом перемещении откатывает всю пачку
+        with self.assertRaises(playlists.ReorderError):
+            playlists.apply_moves(self.playlist, [(a, None), (b, b)])
+        with self.assertRaises(playlists.ReorderError):
+            playlists.apply_moves(self.playlist, [(a, None), (uuid.uuid4(), None)])
+        self.assertEqual(self.order(), self.expected)
+
+
+class PlaylistTotalsTests(TestCase):
+    def setUp(self):
+        no_background_tasks(self)
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'secret')
+        self.playlist = Playlist.objects.create(user=self.user, name='Плейлист')
+        self.other = Playlist.objects.create(user=self.user, name='Другой')
+        self.tracks = [Track.objects.create(name=f'Трек {i}', duration=(i + 1) * 100) for i in range(4)]
+
+    def assertTotals(self, playlist, tracks):
+        """Итоги плейлиста и статистики владельца совпадают с составом ``tracks``"""
+        playlist.refresh_from_db()
+        durations = [track.duration for track in tracks]
+        self.assertEqual((playlist.track_count, playlist.total_duration), (len(tracks), sum(durations)))
+        totals = PlaylistTrack.objects.filter(playlist__user=self.user).values_list('track__duration', flat=True)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.tracks_count, stats.total_duration), (len(totals), sum(totals)))
+
+    def test_adding_and_removing_tracks(self):
+        a, b, c, d = self.tracks
+        playlists.append_tracks(self.playlist, [a.pk, b.pk])
+        self.assertTotals(self.playlist, [a, b])
+        PlaylistTrack.objects.create(playlist=self.playlist, track=c)
+        self.assertTotals(self.playlist, [a, b, c])
+        self.playlist.tracks.add(d)
+        self.assertTotals(self.playlist, [a, b, c, d])
+
+        self.playlist.tracks.remove(a)
+        self.assertTotals(self.playlist, [b, c, d])
+        PlaylistTrack.objects.get(playlist=self.playlist, track=b).delete()
+        self.assertTotals(self.playlist, [c, d])
+
+        # Обратная сторона связи: трек добавляется сразу в несколько плейлистов
+        a.playlist_set.add(self.playlist, self.other)
+        self.assertTotals(self.playlist, [c, d, a])
+        self.assertTotals(self.other, [a])
+        a.playlist_set.remove(self.other)
+        self.assertTotals(self.other, [])
+
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('music:api_remove_tracks_from_playlist', args=[self.playlist.pk]),
+            json.dumps({'track_ids': [str(c.pk), str(d.pk)]}), content_type='application/json',
+        )
+        self.assertEqual(response.json(), {'success': True, 'removed': 2})
+        self.assertTotals(self.playlist, [a])
+
+    def test_track_changes_cascade(self):
+        a, b, c, _ = self.tracks
+        playlists.append_tracks(self.playlist, [a.pk, b.pk, c.pk])
+        playlists.append_tracks(self.other, [b.pk])
+
+        b.duration = 1000
+        b.save()
+        self.assertTotals(self.playlist, [a, b, c])
+        self.assertTotals(self.other, [b])
+
+        # Счётчик прослушиваний на длительность не влияет — итоги не пересчитываются
+        with self.assertNumQueries(1):
+            b.play_count = 5
+            b.save(update_fields=['play_count'])
+
+        b.delete()
+        self.assertTotals(self.playlist, [a, c])
+        self.assertTotals(self.other, [])
+
+    def test_refresh_all(self):
+        a, b = self.tracks[:2]
+        playlists.append_tracks(self.playlist, [a.pk, b.pk])
+        Playlist.objects.update(track_count=0, total_duration=0)
+        self.assertEqual(playlists.refresh_totals(), 2)
+        self.assertTotals(self.playlist, [a, b])
+        self.assertTotals(self.other, [])
+
+
+class SnapshotRefreshTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        no_background_tasks(self)
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'secret')
+        album = Album.objects.create(name='Альбом', artist=Artist.objects.create(name='Артист'))
+        genre = Genre.objects.create(name='Жанр')
+        self.tracks = [Track.objects.create(name=f'Трек {i}', album=album, duration=100) for i in range(3)]
+        for track in self.tracks[:2]:
+            TrackGenre.objects.create(track=track, genre=genre)
+
+    def state(self):
+        """Содержимое витрины без суррогатных ключей"""
+        state = {}
+        for model in (TrackDimension, TrackFacts, AlbumDimension, AlbumFacts, GenreDimension, GenreFacts,
+                      UserDimension, UserActivityFacts):
+            fields = [field.attname for field in model._meta.concrete_fields if field.attname != 'id' or not field.default]
+            state[model.__name__] = sorted(model.objects.values_list(*fields), key=repr)
+        return state
+
+    def test_incremental_matches_full(self):
+        a, b, c = self.tracks
+        # Прослушивание моложе COUNTERS_LAG: в счётчик трека оно попадёт уже после первого среза
+        analytics.record_play(self.alice.pk, a.pk)
+        TrackRating.objects.create(user=self.alice, track=a, value=5)
+        Comment.objects.create(user=self.bob, track=b, text='Первый')
+        Playlist.objects.create(user=self.alice, name='Плейлист')
+        snapshots.refresh(full=True)
+
+        TrackRating.objects.create(user=self.bob, track=b, value=2)
+        AlbumRating.objects.create(user=self.bob, album=b.album, value=4)
+        Comment.objects.create(user=self.alice, track=c, text='Второй')
+        carol = User.objects.create_user('carol', 'carol@example.com', 'secret')
+        Playlist.objects.create(user=carol, name='Новый')
+        b.name = 'Переименованный трек'
+        b.save()
+        analytics.record_play(carol.pk, b.pk)
+        self.client.force_login(carol)
+        self.assertEqual(self.client.get(reverse('music:track_detail', args=[c.pk])).status_code, 200)
+
+        with mock.patch.object(analytics, 'COUNTERS_LAG', timedelta(0)):
+            snapshots.refresh()
+            incremental = self.state()
+            snapshots.refresh(full=True)
+        self.assertEqual(incremental, self.state())
+        self.assertEqual(
+            dict(TrackFacts.objects.values_list('track_id', 'play_count')), {a.pk: 1, b.pk: 1, c.pk: 1},
+        )
+
+
+class DistributionsTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        no_background_tasks(self)
+        cache.delete(distributions.CACHE_KEY)
+        distributions._builder = None
+
+    def user(self, login, day):
+        registered = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=12)))
+        return UserDimension.objects.create(id=uuid.uuid4(), login=login, role='user', registration_date=registered)
+
+    def active(self, user, *days):
+        for day in days:
+            UserActivityFacts.objects.create(user=user, day=day, plays=1)
+
+    def test_retention_cohorts(self):
+        today = timezone.localdate()
+        week2 = today - timedelta(days=today.weekday())
+        week1, week0 = week2 - timedelta(weeks=1), week2 - timedelta(weeks=2)
+        first, second = self.user('first', week0), self.user('second', week0 + timedelta(days=1))
+        # Несколько активных дней одной недели считаются один раз
+        self.active(first, week0, week1, week1 + timedelta(days=1))
+        self.active(second, week2)
+        self.active(self.user('third', week1), week1)
+        # Зарегистрировался раньше первой когорты
+        self.active(self.user('old', week0 - timedelta(days=1)), week2)
+
+        self.assertEqual(distributions.retention_cohorts(weeks=3), [
+            (week0, 2, 50.0, 50.0, 50.0),
+            (week1, 1, 100.0, 0.0, None),
+            (week2, 0, None, None, None),
+        ])
+
+    def test_summary_is_built_in_background(self):
+        admin = User.objects.create_user('admin', 'admin@example.com', 'secret', role='admin')
+        self.client.force_login(admin)
+        self.assertIsNone(distributions.summary())
+        distributions.run_in_background.assert_called_once_with(distributions.build)
+        # Пока расчёт идёт, второй не запускается
+        self.assertContains(self.client.get(reverse('music:admin_reports')), 'ещё считаются')
+        distributions.run_in_background.assert_called_once()
+        response = self.client.get(reverse('music:admin_export', args=['stats_ratings']), {'format': 'csv'})
+        self.assertRedirects(response, reverse('music:admin_reports'), fetch_redirect_response=False)
+
+        tables = distributions.build()
+        self.assertEqual(distributions.summary(), tables)
+        self.assertNotContains(self.client.get(reverse('music:admin_reports')), 'ещё считаются')
+
+
+class ExportTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        no_background_tasks(self)
+        temp_media(self)
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'secret', role='admin')
+        album = Album.objects.create(name='Альбом', artist=Artist.objects.create(name='Артист'))
+        self.tracks = [Track.objects.create(name=f'Трек "{i}", часть', album=album, duration=60 * i) for i in range(3)]
+        self.client.force_login(self.admin)
+
+    def url(self, name):
+        return reverse('music:admin_export', args=[name])
+
+    def assertTracksCsv(self, response, content):
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tracks.csv"')
+        self.assertTrue(content.startswith('\ufeff'))
+        lines = list(csv.reader(io.StringIO(content[1:])))
+        self.assertEqual(lines[0], exports.EXPORTS['tracks'][1])
+        tracks = sorted(self.tracks, key=lambda track: track.pk)
+        self.assertEqual([line[:6] for line in lines[1:]], [
+            [str(track.pk), track.name, 'Альбом', 'Артист', '', str(track.duration)] for track in tracks
+        ])
+
+    def test_csv_streams(self):
+        response = self.client.get(self.url('tracks'), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertTracksCsv(response, b''.join(response.streaming_content).decode())
+
+    async def test_csv_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(self.url('tracks'), {'format': 'csv'})
+        self.assertTrue(response.is_async)
+        self.assertTracksCsv(response, b''.join([part async for part in response.streaming_content]).decode())
+
+    def test_stats_csv(self):
+        TrackRating.objects.create(user=self.admin, track=self.tracks[0], value=4)
+        distributions.build()
+        response = self.client.get(self.url('stats_ratings'), {'format': 'csv'})
+        lines = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode()[1:])))
+        self.assertEqual(lines[0], distributions.TABLES['ratings'][1])
+        self.assertEqual(lines[4], ['4', '1', '100.0', '0', '0.0'])
+
+    def test_xlsx_is_built_by_report_job(self):
+        import openpyxl
+
+        response = self.client.get(self.url('tracks'), {'format': 'xlsx'})
+        job = ReportJob.objects.get(export='tracks')
+        self.assertRedirects(
+            response, f"{reverse('music:admin_reports')}?job={job.pk}", fetch_redirect_response=False,
+        )
+        reports.run_in_background.assert_called_once_with(reports.build, job.pk)
+
+        reports.build(job.pk)
+        response = self.client.get(self.url('tracks'), {'format': 'xlsx'})
+        download = reverse('music:admin_report_download', args=[job.pk])
+        self.assertRedirects(response, download, fetch_redirect_response=False)
+        response = self.client.get(download)
+        self.assertIn('filename="tracks.xlsx"', response['Content-Disposition'])
+        sheet = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), exports.EXPORTS['tracks'][1])
+        self.assertEqual(sorted(row[1] for row in rows[1:]), sorted(track.name for track in self.tracks))
+        # Сводный отчёт того же формата — отдельное задание
+        self.assertFalse(ReportJob.objects.filter(format='xlsx', export='').exists())
+
+
+class AsyncApiErrorTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        no_background_tasks(self)
+        self.user = User.objects.create_user('listener', 'listener@example.com', 'secret')
+        self.track = Track.objects.create(name='Трек')
+        self.client.force_login(self.user)
+
+    def test_play_unknown_track(self):
+        response = self.client.get(reverse('music:api_play_track', args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_play_database_error(self):
+        url = reverse('music:api_play_track', args=[self.track.pk])
+        for error, status in [(OperationalError('database is locked'), 503), (DatabaseError('disk I/O error'), 500)]:
+            with mock.patch('music.views.record_play', side_effect=error), self.assertLogs('music.views', 'ERROR') as logs:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status)
+            # Текст исключения пишется в журнал, а не отдаётся клиенту
+            self.assertNotIn(str(error), response.json()['error'])
+            self.assertIn(str(error), logs.output[0])
+            self.assertIn(str(self.track.pk), logs.output[0])
+
+    def test_playlists_database_error(self):
+        with mock.patch('music.views.Playlist.objects') as objects, self.assertLogs('music.views', 'ERROR'):
+            objects.filter.return_value.values.return_value.__aiter__.side_effect = DatabaseError('no such table')
+            response = self.client.get(reverse('music:api_get_playlists'))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'error': 'Не удалось получить плейлисты'})
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        no_background_tasks(self)
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'secret')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'secret')
+        self.album = Album.objects.create(name='Альбом', artist=Artist.objects.create(name='Артист'))
+        self.tracks = [Track.objects.create(name=f'Трек {i}', album=self.album, duration=100) for i in range(3)]
+
+    def counters(self):
+        return {
+            row.user_id: {field: getattr(row, field) for field in stats.REBUILT_FIELDS}
+            for row in UserStats.objects.all()
+        }
+
+    def assertMatchesRebuild(self):
+        """Счётчики, накопленные сигналами, совпадают с пересчётом с нуля"""
+        counters = self.counters()
+        stats.rebuild()
+        self.assertEqual(self.counters(), counters)
+
+    def test_bumps_match_rebuild(self):
+        a, b, c = self.tracks
+        mix = Playlist.objects.create(user=self.alice, name='Микс')
+        playlists.append_tracks(mix, [a.pk, b.pk])
+        Playlist.objects.create(user=self.bob, name='Пустой')
+        TrackRating.objects.create(user=self.alice, track=a, value=5)
+        TrackRating.objects.create(user=self.bob, track=a, value=3)
+        AlbumRating.objects.create(user=self.alice, album=self.album, value=4)
+        Comment.objects.create(user=self.alice, track=b, text='Первый')
+        Comment.objects.create(user=self.bob, track=c, text='Второй')
+        self.assertEqual(self.counters()[self.alice.pk], {
+            'playlists_count': 1, 'tracks_count': 2, 'total_duration': 200, 'ratings_count': 2, 'comments_count': 1,
+        })
+        self.assertMatchesRebuild()
+
+        # Изменение оценки не создаёт новую
+        rating = TrackRating.objects.get(user=self.bob)
+        rating.value = 1
+        rating.save()
+        self.client.force_login(self.alice)
+        for name, track, data in [('api_rate_track', c, {'rating': 2}), ('api_add_comment', a, {'text': 'Из API'})]:
+            response = self.client.post(
+                reverse(f'music:{name}', args=[track.pk]), json.dumps(data), content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertMatchesRebuild()
+
+        # Удаления: по одной, пачкой и каскадом вместе с треком и плейлистом
+        AlbumRating.objects.get(user=self.alice).delete()
+        Comment.objects.filter(user=self.bob).delete()
+        a.delete()
+        self.assertMatchesRebuild()
+        mix.delete()
+        self.assertEqual(self.counters()[self.alice.pk], {
+            'playlists_count': 0, 'tracks_count': 0, 'total_duration': 0, 'ratings_count': 1, 'comments_count': 1,
+        })
+        self.assertMatchesRebuild()
@@ -0,0 +1,126 @@
+"""Токены API (JWT): пара access/refresh, идентификатор и роль — в подписанных claims.
+
+Запрос с заголовком ``Authorization: Bearer <access>`` аутентифицируется
+без обращения к базе: ни сессия, ни строка пользователя не читаются,
+``request.user`` — это ``TokenUser`` с данными из токена (см. middleware.py).
+Роль перечитывается из базы только при обновлении пары, поэтому смена роли
+вступает в силу не позже чем через ``ACCESS_TOKEN_LIFETIME``.
+
+Отозванные токены хранятся в ``RevokedToken`` до истечения их срока;
+каждый процесс держит идентификаторы в памяти и перечитывает список
+не чаще раза в ``TOKEN_REVOCATION_REFRESH`` секунд.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser as BaseTokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken, User
+
+
+class TokenUser(BaseTokenUser):
+    """Пользователь из claims токена; ``id`` — UUID, как у модели User"""
+
+    @cached_property
+    def id(self):
+        return uuid.UUID(str(self.token[api_settings.USER_ID_CLAIM]))
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    def __getattr__(self, attr):
+        # Базовый класс отвечает None на любой атрибут, и ORM принимает такой объект
+        # за выражение (resolve_expression); здесь доступны только claims токена
+        if attr == 'token':
+            raise AttributeError(attr)
+        try:
+            return self.token[attr]
+        except KeyError:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {attr!r}') from None
+
+
+class RevocationList:
+    """Идентификаторы отозванных токенов в памяти процесса"""
+
+    def __init__(self):
+        self._jtis = frozenset()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > settings.TOKEN_REVOCATION_REFRESH:
+            self.reload()
+        return jti in self._jtis
+
+    def reload(self):
+        jtis = frozenset(RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True))
+        with self._lock:
+            self._jtis = jtis
+            self._loaded_at = time.monotonic()
+
+    def add(self, jti):
+        with self._lock:
+            self._jtis = self._jtis | {jti}
+
+
+revoked = RevocationList()
+
+
+def revoke(token):
+    """Отзывает токен до конца срока его действия"""
+    jti = token[api_settings.JTI_CLAIM]
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+    # Истёкшие токены и так не пройдут проверку — список не растёт
+    RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    revoked.add(jti)
+
+
+def _add_claims(token, user):
+    token['login'] = user.login
+    token['role'] = user.role
+    return token
+
+
+class StatelessTokenAuthentication(JWTStatelessUserAuthentication):
+    """Аутентификация по access-токену без запросов к базе (кроме периодической сверки отзывов)"""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if token.get(api_settings.JTI_CLAIM) in revoked:
+            raise InvalidToken('Токен отозван')
+        return token
+
+
+class ObtainSerializer(TokenObtainPairSerializer):
+    """Выдача пары токенов по логину и паролю"""
+
+    @classmethod
+    def get_token(cls, user):
+        return _add_claims(super().get_token(user), user)
+
+
+class RefreshSerializer(TokenRefreshSerializer):
+    """Новый access-токен: отозванный refresh не принимается, роль берётся из базы"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if refresh[api_settings.JTI_CLAIM] in revoked:
+            raise InvalidToken('Токен отозван')
+
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed('Пользователь не найден или заблокирован')
+        return {'access': str(_add_claims(refresh, user).access_token)}
@@ -0,0 +1,170 @@
+"""Поблочная (возобновляемая) загрузка аудиофайлов.
+
+Протокол: init -> chunk (с указанием смещения) -> finalize.
+Блоки пишутся напрямую во временный файл небольшими порциями,
+тело запроса целиком в память не читается. Смещение блока занимается
+условным UPDATE ``received``, поэтому два параллельных блока с одним
+смещением не допишут файл дважды. Незавершённые загрузки, которые не
+обновлялись ``TRACK_UPLOAD_EXPIRE_HOURS`` часов, удаляются вместе с файлами
+(``purge_expired``: в фоне при начале новой загрузки или командой ``purge_uploads``).
+"""
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobWatermark, TrackUpload
+from .tasks import run_in_background
+
+# Размер порции, которой копируется тело запроса на диск
+COPY_BUFFER_SIZE = 64 * 1024
+
+WATERMARK = 'uploads_purge'
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def temp_path(upload):
+    """Путь к временному файлу загрузки"""
+    return os.path.join(settings.TRACK_UPLOAD_DIR, f'{upload.pk}.part')
+
+
+def current_offset(upload):
+    """Фактическое количество байт, уже записанных на диск"""
+    try:
+        return os.path.getsize(temp_path(upload))
+    except OSError:
+        return 0
+
+
+def write_chunk(upload, stream, offset, length):
+    """Дописывает блок из потока ``stream`` в файл загрузки, начиная с ``offset``.
+
+    Возвращает новое смещение (количество полученных байт).
+    """
+    if upload.status != 'uploading':
+        raise UploadError('Загрузка уже завершена', status=409)
+    if length <= 0:
+        raise UploadError('Пустой блок')
+    if length > settings.TRACK_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError('Слишком большой блок', status=413)
+
+    received = current_offset(upload)
+    if offset != received:
+        raise UploadError(f'Неверное смещение, ожидается {received}', status=409)
+    if offset + length > upload.size:
+        raise UploadError('Блок выходит за пределы файла', status=416)
+    if not _reserve(upload, offset, length):
+        raise UploadError('Блок с этим смещением уже загружается', status=409)
+
+    os.makedirs(settings.TRACK_UPLOAD_DIR, exist_ok=True)
+    written = 0
+    try:
+        with open(temp_path(upload), 'ab') as fh:
+            while written < length:
+                data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                if not data:
+                    break
+                fh.write(data)
+                written += len(data)
+    finally:
+        if written != length:
+            # Обрыв соединения: отбрасываем недописанный хвост, чтобы клиент повторил блок
+            with open(temp_path(upload), 'r+b') as fh:
+                fh.truncate(offset)
+            TrackUpload.objects.filter(pk=upload.pk, received=offset + length).update(received=offset)
+    if written != length:
+        raise UploadError('Блок получен не полностью')
+
+    upload.received = offset + written
+    return upload.received
+
+
+def _reserve(upload, offset, length):
+    """Занимает диапазон блока; False, если его уже пишет другой запрос"""
+    now = timezone.now()
+    # Занятый диапазон, не дописанный за TRACK_UPLOAD_CHUNK_TIMEOUT, остался от упавшего процесса
+    stale = now - timedelta(seconds=settings.TRACK_UPLOAD_CHUNK_TIMEOUT)
+    return bool(
+        TrackUpload.objects.filter(pk=upload.pk, status='uploading')
+        .filter(Q(received=offset) | Q(updated_at__lt=stale))
+        .update(received=offset + length, updated_at=now)
+    )
+
+
+def attach_to_track(upload, track):
+    """Переносит собранный файл в хранилище и прикрепляет его к треку"""
+    if current_offset(upload) != upload.size:
+        raise UploadError('Файл загружен не полностью', status=409)
+
+    name = default_storage.get_available_name(
+        os.path.join(track.file.field.upload_to, os.path.basename(upload.filename))
+    )
+    destination = default_storage.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(temp_path(upload), destination)
+
+    track.file.name = name
+    return name
+
+
+def discard(upload):
+    """Удаляет временный файл загрузки"""
+    try:
+        os.remove(temp_path(upload))
+    except OSError:
+        pass
+
+
+def purge_expired():
+    """Удаляет заброшенные загрузки и временные файлы без загрузки. Возвращает число удалённых загрузок."""
+    expired = TrackUpload.objects.filter(
+        status='uploading', updated_at__lt=timezone.now() - timedelta(hours=settings.TRACK_UPLOAD_EXPIRE_HOURS),
+    )
+    count = 0
+    for upload in expired.iterator():
+        discard(upload)
+        count += TrackUpload.objects.filter(pk=upload.pk, updated_at=upload.updated_at).delete()[0]
+
+    # Файлы, чья загрузка уже удалена (например, вместе с пользователем)
+    try:
+        names = os.listdir(settings.TRACK_UPLOAD_DIR)
+    except OSError:
+        return count
+    parts = {}
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext != '.part':
+            continue
+        try:
+            parts[uuid.UUID(stem)] = name
+        except ValueError:
+            continue
+    live = set(TrackUpload.objects.filter(pk__in=parts, status='uploading').values_list('pk', flat=True))
+    for upload_id, name in parts.items():
+        if upload_id not in live:
+            try:
+                os.remove(os.path.join(settings.TRACK_UPLOAD_DIR, name))
+            except OSError:
+                pass
+    return count
+
+
+def schedule_purge():
+    """Запускает очистку в фоне, если с прошлой прошло больше TRACK_UPLOAD_PURGE_INTERVAL"""
+    now = timezone.now()
+    last = JobWatermark.get(WATERMARK)
+    if last is not None and now - last < timedelta(seconds=settings.TRACK_UPLOAD_PURGE_INTERVAL):
+        return None
+    JobWatermark.set(WATERMARK, now)
+    return run_in_background(purge_expired)
@@ -1,8 +1,20 @@
-from django.urls import path
-from . import views
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from . import api, views
 
 app_name = 'music'
 
+# REST API каталога
+router = DefaultRouter()
+router.register('tracks', api.TrackViewSet, basename='api-track')
+router.register('albums', api.AlbumViewSet, basename='api-album')
+router.register('artists', api.ArtistViewSet, basename='api-artist')
+router.register('groups', api.GroupViewSet, basename='api-group')
+router.register('genres', api.GenreViewSet, basename='api-genre')
+router.register('playlists', api.PlaylistViewSet, basename='api-playlist')
+
 urlpatterns = [
     # Главная страница
     path('', views.home, name='home'),
@@ -53,13 +65,36 @@ urlpatterns = [
     path('api/playlists/', views.api_get_playlists, name='api_get_playlists'),
     path('api/playlists/<uuid:playlist_id>/add-track/', views.api_add_track_to_playlist, name='api_add_track_to_playlist'),
     path('api/playlists/<uuid:playlist_id>/remove-track/', views.api_remove_track_from_playlist, name='api_remove_track_from_playlist'),
+    path('api/playlists/<uuid:playlist_id>/add-tracks/', views.api_add_tracks_to_playlist, name='api_add_tracks_to_playlist'),
+    path('api/playlists/<uuid:playlist_id>/add-album/', views.api_add_tracks_to_playlist, name='api_add_album_to_playlist'),
+    path('api/playlists/<uuid:playlist_id>/add-artist/', views.api_add_tracks_to_playlist, name='api_add_artist_to_playlist'),
+    path('api/playlists/<uuid:playlist_id>/add-group/', views.api_add_tracks_to_playlist, name='api_add_group_to_playlist'),
+    path('api/playlists/<uuid:playlist_id>/remove-tracks/', views.api_remove_tracks_from_playlist, name='api_remove_tracks_from_playlist'),
+    path('api/playlists/<uuid:playlist_id>/reorder/', views.api_reorder_playlist, name='api_reorder_playlist'),
     path('api/track/<uuid:track_id>/play/', views.api_play_track, name='api_play_track'),
+    path('api/track/<uuid:track_id>/waveform/', views.api_track_waveform, name='api_track_waveform'),
+    path('api/track/<uuid:track_id>/similar/', views.api_similar_tracks, name='api_similar_tracks'),
+    path('api/track/<uuid:track_id>/sounds-like/', views.api_sounds_like, name='api_sounds_like'),
+    path('api/radio/', views.api_radio, name='api_radio'),
+    path('api/v1/token/', TokenObtainPairView.as_view(), name='api_token_obtain'),
+    path('api/v1/token/refresh/', TokenRefreshView.as_view(), name='api_token_refresh'),
+    path('api/v1/token/revoke/', api.TokenRevokeView.as_view(), name='api_token_revoke'),
+    path('api/v1/', include(router.urls)),
+    path('api/history/', views.api_play_history, name='api_play_history'),
+    path('api/uploads/', views.api_upload_init, name='api_upload_init'),
+    path('api/uploads/<uuid:upload_id>/', views.api_upload_status, name='api_upload_status'),
+    path('api/uploads/<uuid:upload_id>/chunk/', views.api_upload_chunk, name='api_upload_chunk'),
+    path('api/uploads/<uuid:upload_id>/finalize/', views.api_upload_finalize, name='api_upload_finalize'),
     
     # Админ панель
     path('admin-panel/', views.admin_panel, name='admin_panel'),
     path('admin-panel/send-email/', views.admin_send_email, name='admin_send_email'),
+    path('admin-panel/send-email/<uuid:campaign_id>/status/', views.admin_email_campaign_status, name='admin_email_campaign_status'),
     path('admin-panel/reports/', views.admin_reports, name='admin_reports'),
     path('admin-panel/reports/generate/', views.admin_generate_report, name='admin_generate_report'),
+    path('admin-panel/reports/<uuid:job_id>/status/', views.admin_report_status, name='admin_report_status'),
+    path('admin-panel/reports/<uuid:job_id>/download/', views.admin_report_download, name='admin_report_download'),
+    path('admin-panel/export/<str:name>/', views.admin_export, name='admin_export'),
     path('admin-panel/create-track/', views.admin_create_track, name='admin_create_track'),
     path('admin-panel/tracks/', views.admin_tracks, name='admin_tracks'),
     path('admin-panel/track/<uuid:pk>/edit/', views.admin_edit_track, name='admin_edit_track'),
@@ -1,28 +1,46 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q, Avg
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_GET, require_http_methods
 from django.utils import timezone
+from django.conf import settings
 from .models import (
     Track, Album, Playlist, Genre, TrackRating, AlbumRating, Comment, 
-    User, Group, Artist, ArtistGroup, TrackGenre, PlaylistTrack
+    User, Group, Artist, ArtistGroup, TrackGenre, PlaylistTrack, TrackUpload,
+    TrackWaveform, SimilarTrack, ReportJob, TrackFacts, GenreFacts, EmailCampaign
 )
 from .forms import UserRegistrationForm, UserLoginForm, PlaylistForm, CommentForm, TrackCreateForm
+from . import distributions, exports, mailing, reports, snapshots, streaming, uploads
+from .tasks import run_in_background, process_track_file
+from .sounds_like import sounds_like
+from .radio import radio_queue
+from .playlists import ReorderError, append_tracks, apply_moves, refresh_totals
+from .stats import get_stats as get_user_stats
+from .history import record_play, recent as recent_plays, with_tracks
+from .smart_playlists import RULES as SMART_RULES, READ_ONLY_ERROR as SMART_PLAYLIST_ERROR, clean_rules, refresh_playlist
+from django.urls import reverse
+from itertools import islice
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
+import uuid
 import json
-from django.core.mail import send_mass_mail, EmailMessage
+import hashlib
+import logging
 from django.http import HttpResponse
-import io
-from django.db.models import Count, Sum
+from django.db.models import Count, Sum, F
+from django.db import DatabaseError, OperationalError
+
+logger = logging.getLogger(__name__)
 
 
 def home(request):
     """Главная страница"""
-    latest_tracks = Track.objects.select_related('album', 'album__artist', 'album__group').order_by('-id')[:8]
+    latest_tracks = Track.objects.select_related('album', 'album__artist', 'album__group').order_by('-created_at')[:8]
     popular_albums = Album.objects.select_related('artist', 'group').order_by('-play_count')[:4]
     genres = Genre.objects.all()[:6]
     
@@ -78,6 +96,24 @@ def track_list(request):
     return render(request, 'music/track_list.html', context)
 
 
+def _similar_tracks(track_id):
+    """Предрассчитанные соседи трека в порядке убывания сходства"""
+    return (
+        SimilarTrack.objects.filter(track_id=track_id)
+        .select_related('neighbor', 'neighbor__album', 'neighbor__album__artist', 'neighbor__album__group')
+        .order_by('rank')
+    )
+
+
+def _sounds_like_tracks(track_id, limit):
+    """Треки, близкие по аудио-эмбеддингу, в порядке убывания сходства"""
+    neighbors = sounds_like(track_id, limit=limit)
+    tracks = Track.objects.select_related('album', 'album__artist', 'album__group').in_bulk(
+        [neighbor_id for neighbor_id, score in neighbors]
+    )
+    return [(tracks[neighbor_id], score) for neighbor_id, score in neighbors if neighbor_id in tracks]
+
+
 def track_detail(request, pk):
     """Детальная страница трека"""
     track = get_object_or_404(Track.objects.select_related('album', 'album__artist', 'album__group').prefetch_related('genres'), pk=pk)
@@ -94,9 +130,18 @@ def track_detail(request, pk):
     if request.user.is_authenticated:
         user_rating = ratings.filter(user=request.user).first()
     
-    # Увеличиваем счетчик прослушиваний
-    track.play_count += 1
-    track.save()
+    # Похожие треки: один запрос по индексу (track, rank)
+    similar_tracks = list(_similar_tracks(track.pk)[:8])
+    
+    # Трек без оценок и плейлистов рекомендуем по звучанию
+    sounds_like_tracks = []
+    if not similar_tracks:
+        sounds_like_tracks = [t for t, score in _sounds_like_tracks(track.pk, 8)]
+    
+    # Увеличиваем счетчик одним UPDATE без гонки между запросами; история и статистика
+    # прослушиваний пишутся только при воспроизведении (api_play_track), не при просмотре;
+    # updated_at — чтобы новый счётчик попал в следующий срез витрины
+    Track.objects.filter(pk=track.pk).update(play_count=F('play_count') + 1, updated_at=timezone.now())
     
     context = {
         'track': track,
@@ -105,6 +150,8 @@ def track_detail(request, pk):
         'avg_rating': round(avg_rating, 1),
         'user_rating': user_rating,
         'comment_form': CommentForm(),
+        'similar_tracks': similar_tracks,
+        'sounds_like_tracks': sounds_like_tracks,
     }
     return render(request, 'music/track_detail.html', context)
 
@@ -262,7 +309,7 @@ def playlist_list(request):
     """Список публичных плейлистов"""
     query = request.GET.get('q', '')
     
-    playlists = Playlist.objects.filter(is_public=True).select_related('user').prefetch_related('tracks')
+    playlists = Playlist.objects.filter(is_public=True).select_related('user').order_by('-creation_date', 'id')
     
     if query:
         playlists = playlists.filter(
@@ -293,8 +340,8 @@ def playlist_detail(request, pk):
         messages.error(request, 'Этот плейлист приватный')
         return redirect('music:playlist_list')
     
-    # Получаем треки через промежуточную таблицу для правильного порядка
-    tracks = [pt.track for pt in playlist.playlist_tracks.all().order_by('added_date')]
+    # Получаем треки через промежуточную таблицу (уже загружена prefetch'ем в порядке позиций)
+    tracks = [pt.track for pt in playlist.playlist_tracks.all()]
     
     context = {
         'playlist': playlist,
@@ -306,10 +353,11 @@ def playlist_detail(request, pk):
 @login_required
 def my_playlists(request):
     """Мои плейлисты"""
-    playlists = Playlist.objects.filter(user=request.user).prefetch_related('tracks')
+    playlists = Playlist.objects.filter(user=request.user)
     
     context = {
         'playlists': playlists,
+        **_playlist_totals(playlists),
     }
     return render(request, 'music/my_playlists.html', context)
 
@@ -329,13 +377,19 @@ def create_playlist(request):
         
         if name:
             try:
+                rules = None
+                if request.POST.get('is_smart'):
+                    rules = clean_rules({field: request.POST.get(field) for field in SMART_RULES})
                 playlist = Playlist.objects.create(
                     user=request.user,
                     name=name,
                     description=description,
                     is_public=not is_private,
                     photo=photo,
+                    rules=rules,
                 )
+                playlist.genres.set(Genre.objects.filter(pk__in=request.POST.getlist('genres')))
+                refresh_playlist(playlist)
                 messages.success(request, f'Плейлист "{name}" создан успешно!')
                 return redirect('music:playlist_detail', pk=playlist.pk)
             except Exception as e:
@@ -362,6 +416,7 @@ def edit_playlist(request, pk):
         if form.is_valid():
             playlist = form.save()
             # genres уже сохраняются ModelForm'ой через m2m, фото берётся из FILES
+            refresh_playlist(playlist)
             messages.success(request, 'Плейлист обновлен!')
             return redirect('music:playlist_detail', pk=playlist.pk)
     else:
@@ -370,6 +425,7 @@ def edit_playlist(request, pk):
     context = {
         'form': form,
         'playlist': playlist,
+        'rule_fields': [form[field] for field in SMART_RULES],
     }
     return render(request, 'music/edit_playlist.html', context)
 
@@ -399,7 +455,10 @@ def add_to_playlist(request, track_id):
     
     if playlist_id:
         playlist = get_object_or_404(Playlist, pk=playlist_id, user=request.user)
-        playlist.tracks.add(track)
+        if playlist.is_smart:
+            messages.error(request, SMART_PLAYLIST_ERROR)
+            return redirect('music:track_detail', pk=track_id)
+        append_tracks(playlist, [track.pk])
         messages.success(request, f'Трек "{track.name}" добавлен в плейлист "{playlist.name}"!')
     else:
         messages.error(request, 'Выберите плейлист!')
@@ -414,6 +473,10 @@ def remove_from_playlist(request, playlist_id, track_id):
     playlist = get_object_or_404(Playlist, pk=playlist_id, user=request.user)
     track = get_object_or_404(Track, pk=track_id)
     
+    if playlist.is_smart:
+        messages.error(request, SMART_PLAYLIST_ERROR)
+        return redirect('music:playlist_detail', pk=playlist_id)
+    
     playlist.tracks.remove(track)
     messages.success(request, f'Трек "{track.name}" удален из плейлиста!')
     
@@ -540,47 +603,59 @@ def user_logout(request):
     return redirect('music:home')
 
 
+def _playlist_totals(playlists):
+    """Сводка по набору плейлистов: два агрегатных запроса вместо обхода треков"""
+    totals = playlists.aggregate(
+        playlists_count=Count('pk'),
+        total_tracks=Sum('track_count'),
+        total_duration=Sum('total_duration'),
+    )
+    totals['total_play_count'] = PlaylistTrack.objects.filter(
+        playlist__in=playlists
+    ).aggregate(total=Sum('track__play_count'))['total'] or 0
+    totals['total_tracks'] = totals['total_tracks'] or 0
+    totals['total_duration'] = totals['total_duration'] or 0
+    return totals
+
+
 @login_required
 def profile(request):
     """Профиль пользователя"""
-    from django.db.models import Count, Sum
-
     # Плейлисты пользователя
-    user_playlists = Playlist.objects.filter(user=request.user).prefetch_related('tracks')
+    user_playlists = Playlist.objects.filter(user=request.user)
     recent_playlists = user_playlists.order_by('-creation_date')[:6]
 
-    # Статистика
-    playlists_count = user_playlists.count()
-    total_tracks = sum(playlist.tracks.count() for playlist in user_playlists)
-    total_duration = sum(
-        sum(track.duration or 0 for track in playlist.tracks.all())
-        for playlist in user_playlists
-    )
-    total_play_count = sum(
-        sum(track.play_count for track in playlist.tracks.all())
-        for playlist in user_playlists
-    )
+    # Статистика: одна строка UserStats
+    stats = get_user_stats(request.user)
 
-    # Оценки пользователя
-    user_ratings = TrackRating.objects.filter(user=request.user).select_related('track', 'track__album')
+    # Недавно прослушанные треки (история прослушиваний)
+    history = with_tracks(recent_plays(request.user)[:10])
 
-    # Недавняя активность (оценки)
+    # Недавняя активность (последние прослушивания и оценки)
+    recent_ratings = TrackRating.objects.filter(user=request.user).select_related('track').order_by('-rating_date')[:5]
     recent_activity = []
-    for rating in user_ratings.order_by('-rating_date')[:5]:
+    for play in history[:5]:
+        recent_activity.append({
+            'description': f'Прослушал трек "{play.track.name}"',
+            'timestamp': play.played_at
+        })
+    for rating in recent_ratings:
         recent_activity.append({
             'description': f'Оценил трек "{rating.track.name}" на {rating.value} звезд',
             'timestamp': rating.rating_date
         })
+    recent_activity = sorted(recent_activity, key=lambda activity: activity['timestamp'], reverse=True)[:5]
 
     context = {
         'user_playlists': user_playlists,
         'recent_playlists': recent_playlists,
-        'user_ratings': user_ratings,
-        'playlists_count': playlists_count,
-        'total_tracks': total_tracks,
-        'total_duration': total_duration,
-        'total_play_count': total_play_count,
+        'stats': stats,
+        'playlists_count': stats.playlists_count,
+        'total_tracks': stats.tracks_count,
+        'total_duration': stats.total_duration,
+        'total_play_count': stats.plays_count,
         'recent_activity': recent_activity,
+        'recent_plays': history,
     }
     return render(request, 'music/profile.html', context)
 
@@ -621,9 +696,10 @@ def toggle_admin_role(request):
 # API представления для AJAX
 @csrf_exempt
 @require_POST
-def api_rate_track(request, track_id):
-    """API для оценки трека"""
-    if not request.user.is_authenticated:
+async def api_rate_track(request, track_id):
+    """API для оценки трека (асинхронное)"""
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({'error': 'Не авторизован'}, status=401)
     
     try:
@@ -633,17 +709,13 @@ def api_rate_track(request, track_id):
         if not (1 <= rating_value <= 5):
             return JsonResponse({'error': 'Оценка должна быть от 1 до 5'}, status=400)
         
-        track = get_object_or_404(Track, pk=track_id)
-        rating, created = TrackRating.objects.get_or_create(
-                user=request.user,
+        track = await aget_object_or_404(Track, pk=track_id)
+        await TrackRating.objects.aupdate_or_create(
+            user_id=user.pk,
             track=track,
             defaults={'value': rating_value}
         )
         
-        if not created:
-            rating.value = rating_value
-            rating.save()
-        
         return JsonResponse({'success': True, 'rating': rating_value})
     
     except (ValueError, json.JSONDecodeError):
@@ -666,7 +738,7 @@ def api_rate_album(request, album_id):
         
         album = get_object_or_404(Album, pk=album_id)
         rating, created = AlbumRating.objects.get_or_create(
-            user=request.user,
+            user_id=request.user.pk,
             album=album,
             defaults={'value': rating_value}
         )
@@ -683,9 +755,10 @@ def api_rate_album(request, album_id):
 
 @csrf_exempt
 @require_POST
-def api_add_comment(request, track_id):
-    """API для добавления комментария"""
-    if not request.user.is_authenticated:
+async def api_add_comment(request, track_id):
+    """API для добавления комментария (асинхронное)"""
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({'error': 'Не авторизован'}, status=401)
     
     try:
@@ -695,9 +768,9 @@ def api_add_comment(request, track_id):
         if not text:
             return JsonResponse({'error': 'Текст комментария не может быть пустым'}, status=400)
         
-        track = get_object_or_404(Track, pk=track_id)
-        comment = Comment.objects.create(
-                user=request.user,
+        track = await aget_object_or_404(Track, pk=track_id)
+        comment = await Comment.objects.acreate(
+            user_id=user.pk,
             track=track,
             text=text
         )
@@ -707,7 +780,7 @@ def api_add_comment(request, track_id):
             'comment': {
                 'id': comment.id,
                 'text': comment.text,
-                'user': comment.user.login,
+                'user': user.login,
                 'created_at': comment.created_at.isoformat()
             }
         })
@@ -724,7 +797,7 @@ def api_delete_comment(request, comment_id):
         return JsonResponse({'error': 'Не авторизован'}, status=401)
     
     try:
-        comment = get_object_or_404(Comment, pk=comment_id, user=request.user)
+        comment = get_object_or_404(Comment, pk=comment_id, user_id=request.user.pk)
         comment.delete()
         
         return JsonResponse({'success': True})
@@ -733,47 +806,210 @@ def api_delete_comment(request, comment_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-def api_get_playlists(request):
-    """API для получения плейлистов пользователя"""
-    if not request.user.is_authenticated:
+async def api_get_playlists(request):
+    """API для получения плейлистов пользователя (асинхронное)"""
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({'error': 'Не авторизован'}, status=401)
     
+    playlists = Playlist.objects.filter(user_id=user.pk, rules__isnull=True).values('id', 'name')
     try:
-        playlists = Playlist.objects.filter(user=request.user).values('id', 'name')
-        return JsonResponse({'playlists': list(playlists)})
-    
-    except Exception as e:
-        print(f"Error in api_get_playlists: {str(e)}")
-        return JsonResponse({'error': str(e)}, status=500)
+        return JsonResponse({'playlists': [playlist async for playlist in playlists]})
+    except DatabaseError:
+        logger.exception('Ошибка получения плейлистов пользователя %s', user.pk)
+        return JsonResponse({'error': 'Не удалось получить плейлисты'}, status=500)
 
 
-def api_play_track(request, track_id):
-    """API для воспроизведения трека"""
+async def api_play_track(request, track_id):
+    """API для воспроизведения трека (асинхронное)"""
+    track = await aget_object_or_404(Track, pk=track_id)
+    
+    # Только событие в журнале аналитики: счётчик трека догонит его пачкой (analytics.py)
     try:
-        track = get_object_or_404(Track, pk=track_id)
-        
-        # Увеличиваем счетчик прослушиваний
-        track.play_count += 1
-        track.save()
-        
-        # Возвращаем URL файла для воспроизведения
-        if track.file:
-            return JsonResponse({
-                'success': True,
-                'file_url': track.file.url,
-                'track_name': track.name
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': 'Файл трека недоступен'
-            })
+        await sync_to_async(record_play)(await request.auser(), track)
+    except DatabaseError as e:
+        logger.exception('Ошибка учёта прослушивания трека %s', track.pk)
+        # OperationalError (в том числе «database is locked») — временная, запрос можно повторить
+        return JsonResponse({
+            'success': False,
+            'error': 'Не удалось учесть прослушивание, повторите попытку'
+        }, status=503 if isinstance(e, OperationalError) else 500)
     
-    except Exception as e:
+    # Возвращаем URL файла для воспроизведения
+    if track.file:
+        return JsonResponse({
+            'success': True,
+            'file_url': track.file.url,
+            'track_name': track.name
+        })
+    else:
         return JsonResponse({
             'success': False,
-            'error': str(e)
-        }, status=500)
+            'error': 'Файл трека недоступен'
+        })
+
+
+@require_GET
+def api_play_history(request):
+    """API истории прослушиваний пользователя (постранично, начиная с последних)"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Не авторизован'}, status=401)
+
+    try:
+        page_size = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+
+    page_obj = Paginator(recent_plays(request.user), page_size).get_page(request.GET.get('page'))
+
+    items = []
+    for play in with_tracks(page_obj):
+        album = play.track.album
+        performer = (album.artist or album.group) if album else None
+        items.append({
+            'track_id': str(play.track_id),
+            'track_name': play.track.name,
+            'artist': performer.name if performer else 'Не указан',
+            'played_at': play.played_at.isoformat(),
+        })
+
+    return JsonResponse({
+        'items': items,
+        'page': page_obj.number,
+        'pages': page_obj.paginator.num_pages,
+        'has_next': page_obj.has_next(),
+    })
+
+
+@require_GET
+def api_track_waveform(request, track_id):
+    """API для получения пиков волновой формы трека (сырые байты int8)"""
+    waveform = (
+        TrackWaveform.objects.filter(track_id=track_id)
+        .values('peaks', 'peaks_per_second', 'source')
+        .first()
+    )
+    version = request.GET.get('v')
+    # Файл уже заменён, а пики ещё считаются в фоне: старые нельзя отдать по новому адресу
+    if waveform is None or (version is not None and version != waveform['source']):
+        response = JsonResponse({'error': 'Волновая форма ещё не рассчитана'}, status=404)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    # Пики меняются только вместе с файлом, поэтому имя файла — надёжный ETag
+    etag = '"%s"' % hashlib.md5(waveform['source'].encode('utf-8')).hexdigest()
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(bytes(waveform['peaks']), content_type='application/octet-stream')
+        response['X-Peaks-Per-Second'] = waveform['peaks_per_second']
+    response['ETag'] = etag
+    # Навсегда кэшируется только адрес с версией файла; без неё — проверка по ETag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable' if version is not None else 'no-cache'
+    return response
+
+
+@require_GET
+def api_similar_tracks(request, track_id):
+    """API для получения похожих треков"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), settings.SIMILAR_TRACKS_TOP_K)
+    except ValueError:
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+
+    similar = []
+    for item in _similar_tracks(track_id)[:limit]:
+        neighbor = item.neighbor
+        album = neighbor.album
+        performer = (album.artist or album.group) if album else None
+        similar.append({
+            'id': neighbor.id,
+            'name': neighbor.name,
+            'artist': performer.name if performer else None,
+            'album': album.name if album else None,
+            'score': round(item.score, 4),
+        })
+
+    return JsonResponse({'tracks': similar})
+
+
+@require_GET
+def api_sounds_like(request, track_id):
+    """API для поиска треков, звучащих похоже (по аудио-признакам)"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+
+    result = []
+    for track, score in _sounds_like_tracks(track_id, limit):
+        album = track.album
+        performer = (album.artist or album.group) if album else None
+        result.append({
+            'id': track.id,
+            'name': track.name,
+            'artist': performer.name if performer else None,
+            'album': album.name if album else None,
+            'score': round(score, 4),
+        })
+
+    return JsonResponse({'tracks': result})
+
+
+def _radio_track(track):
+    """Описание трека для плеера в режиме «Радио»"""
+    album = track.album
+    performer = (album.artist or album.group) if album else None
+    return {
+        'id': str(track.id),
+        'name': track.name,
+        'file': track.file.url,
+        'waveform': f"{reverse('music:api_track_waveform', args=[track.id])}?{urlencode({'v': track.file.name})}",
+        'artist': performer.name if performer else 'Не указан',
+        'album': album.name if album else 'Без альбома',
+        'duration': track.duration or 0,
+    }
+
+
+@require_GET
+def api_radio(request):
+    """API режима «Радио»: поток следующих треков для трека или плейлиста (NDJSON)"""
+    try:
+        count = min(int(request.GET.get('count', 10)), settings.RADIO_MAX_BATCH)
+        exclude = [uuid.UUID(value) for value in request.GET.get('exclude', '').split(',') if value]
+        seed_track = request.GET.get('seed_track')
+        seed_playlist = request.GET.get('seed_playlist')
+        if seed_track:
+            seeds = [get_object_or_404(Track, pk=uuid.UUID(seed_track)).pk]
+        elif seed_playlist:
+            playlist = get_object_or_404(Playlist, pk=uuid.UUID(seed_playlist))
+            if not playlist.is_public and playlist.user_id != request.user.pk:
+                return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+            seeds = list(
+                playlist.playlist_tracks.order_by('position').values_list('track_id', flat=True)
+            )
+        else:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+
+    if not seeds:
+        return JsonResponse({'error': 'Плейлист пуст'}, status=400)
+
+    def stream():
+        # Очередь генерируется лениво; треки подгружаются небольшими пачками
+        queue = islice(radio_queue(seeds, exclude=exclude), max(count, 0))
+        while True:
+            batch = list(islice(queue, 10))
+            if not batch:
+                return
+            tracks = Track.objects.select_related('album', 'album__artist', 'album__group').in_bulk(batch)
+            for track_id in batch:
+                if track_id not in tracks:
+                    continue
+                yield json.dumps(_radio_track(tracks[track_id]), ensure_ascii=False) + '\n'
+
+    return StreamingHttpResponse(streaming.content(request, stream(), 10), content_type='application/x-ndjson; charset=utf-8')
 
 
 @csrf_exempt
@@ -790,8 +1026,10 @@ def api_add_track_to_playlist(request, playlist_id):
         if not track_id:
             return JsonResponse({'error': 'ID трека не указан'}, status=400)
         
-        playlist = get_object_or_404(Playlist, pk=playlist_id, user=request.user)
+        playlist = get_object_or_404(Playlist, pk=playlist_id, user_id=request.user.pk)
         track = get_object_or_404(Track, pk=track_id)
+        if playlist.is_smart:
+            return JsonResponse({'error': SMART_PLAYLIST_ERROR}, status=400)
         
         # Проверяем, не добавлен ли уже трек
         if PlaylistTrack.objects.filter(playlist=playlist, track=track).exists():
@@ -818,8 +1056,10 @@ def api_remove_track_from_playlist(request, playlist_id):
         track_id = data.get('track_id')
         if not track_id:
             return JsonResponse({'error': 'ID трека не указан'}, status=400)
-        playlist = get_object_or_404(Playlist, pk=playlist_id, user=request.user)
+        playlist = get_object_or_404(Playlist, pk=playlist_id, user_id=request.user.pk)
         track = get_object_or_404(Track, pk=track_id)
+        if playlist.is_smart:
+            return JsonResponse({'error': SMART_PLAYLIST_ERROR}, status=400)
         if not playlist.tracks.filter(pk=track.pk).exists():
             return JsonResponse({'error': 'Трек не найден в плейлисте'}, status=404)
         playlist.tracks.remove(track)
@@ -828,6 +1068,223 @@ def api_remove_track_from_playlist(request, playlist_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _batch_track_ids(data):
+    """ID треков для пакетного добавления: явный список, альбом, артист или группа"""
+    if 'track_ids' in data:
+        track_ids = [uuid.UUID(str(track_id)) for track_id in data['track_ids']]
+        # Проверяем все ID одним запросом IN
+        found = set(Track.objects.filter(pk__in=track_ids).values_list('pk', flat=True))
+        missing = [str(track_id) for track_id in track_ids if track_id not in found]
+        return track_ids, missing
+    if data.get('album_id'):
+        tracks = Track.objects.filter(album_id=uuid.UUID(str(data['album_id']))).order_by('id')
+    elif data.get('artist_id'):
+        tracks = Track.objects.filter(album__artist_id=uuid.UUID(str(data['artist_id']))).order_by('album__release_date', 'album_id', 'id')
+    elif data.get('group_id'):
+        tracks = Track.objects.filter(album__group_id=uuid.UUID(str(data['group_id']))).order_by('album__release_date', 'album_id', 'id')
+    else:
+        raise ValueError('Не указаны треки')
+    return list(tracks.values_list('pk', flat=True)), []
+
+
+@csrf_exempt
+@require_POST
+def api_add_tracks_to_playlist(request, playlist_id):
+    """API для пакетного добавления треков в плейлист (список, альбом, артист или группа)"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Не авторизован'}, status=401)
+    
+    playlist = get_object_or_404(Playlist, pk=playlist_id, user_id=request.user.pk)
+    if playlist.is_smart:
+        return JsonResponse({'error': SMART_PLAYLIST_ERROR}, status=400)
+    
+    try:
+        track_ids, missing = _batch_track_ids(json.loads(request.body))
+    except (ValueError, TypeError, AttributeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+    if missing:
+        return JsonResponse({'error': 'Треки не найдены', 'missing': missing}, status=404)
+    
+    existing = set(
+        PlaylistTrack.objects.filter(playlist=playlist, track_id__in=track_ids).values_list('track_id', flat=True)
+    )
+    new_ids = [track_id for track_id in dict.fromkeys(track_ids) if track_id not in existing]
+    append_tracks(playlist, new_ids)
+    
+    return JsonResponse({'success': True, 'added': len(new_ids), 'skipped': len(track_ids) - len(new_ids)})
+
+
+@csrf_exempt
+@require_POST
+def api_remove_tracks_from_playlist(request, playlist_id):
+    """API для пакетного удаления треков из плейлиста"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Не авторизован'}, status=401)
+    
+    playlist = get_object_or_404(Playlist, pk=playlist_id, user_id=request.user.pk)
+    if playlist.is_smart:
+        return JsonResponse({'error': SMART_PLAYLIST_ERROR}, status=400)
+    
+    try:
+        data = json.loads(request.body)
+        track_ids = [uuid.UUID(str(track_id)) for track_id in data['track_ids']]
+    except (ValueError, KeyError, TypeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+    
+    removed, _ = PlaylistTrack.objects.filter(playlist=playlist, track_id__in=track_ids).delete()
+    refresh_totals([playlist.pk])
+    return JsonResponse({'success': True, 'removed': removed})
+
+
+@csrf_exempt
+@require_POST
+def api_reorder_playlist(request, playlist_id):
+    """API для изменения порядка треков: список перемещений применяется в одной транзакции"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Не авторизован'}, status=401)
+    
+    playlist = get_object_or_404(Playlist, pk=playlist_id, user_id=request.user.pk)
+    if playlist.is_smart:
+        return JsonResponse({'error': SMART_PLAYLIST_ERROR}, status=400)
+    
+    try:
+        data = json.loads(request.body)
+        moves = [
+            (uuid.UUID(str(move['track_id'])), uuid.UUID(str(move['after'])) if move.get('after') else None)
+            for move in data['moves']
+        ]
+    except (ValueError, KeyError, TypeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+    
+    try:
+        apply_moves(playlist, moves)
+    except ReorderError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, 'moved': len(moves)})
+
+
+# API поблочной загрузки аудиофайлов
+def _attach_upload(request, upload_id, track):
+    """Прикрепляет завершённую поблочную загрузку к треку"""
+    upload = TrackUpload.objects.filter(pk=upload_id, user_id=request.user.pk, status='uploading').first()
+    if upload is None:
+        raise uploads.UploadError('Загрузка не найдена', status=404)
+
+    uploads.attach_to_track(upload, track)
+    upload.track = track
+    upload.received = upload.size
+    upload.status = 'complete'
+    upload.save(update_fields=['track', 'received', 'status', 'updated_at'])
+    return upload
+
+
+@csrf_exempt
+@require_POST
+def api_upload_init(request):
+    """API для начала поблочной загрузки аудиофайла"""
+    if not request.user.is_authenticated or request.user.role != 'admin':
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        filename = (data.get('filename') or '').strip()
+        size = int(data.get('size', 0))
+
+        if not filename:
+            return JsonResponse({'error': 'Имя файла не указано'}, status=400)
+        if not (0 < size <= settings.TRACK_UPLOAD_MAX_SIZE):
+            return JsonResponse({'error': 'Недопустимый размер файла'}, status=400)
+
+        upload = TrackUpload.objects.create(user_id=request.user.pk, filename=filename, size=size)
+        # Заодно изредка убираем заброшенные загрузки
+        uploads.schedule_purge()
+
+        return JsonResponse({
+            'success': True,
+            'upload_id': str(upload.pk),
+            'offset': 0,
+            'chunk_size': settings.TRACK_UPLOAD_CHUNK_SIZE,
+        })
+
+    except (ValueError, TypeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+
+
+@csrf_exempt
+@require_http_methods(['PUT', 'POST'])
+def api_upload_chunk(request, upload_id):
+    """API для загрузки очередного блока файла (смещение в заголовке Upload-Offset)"""
+    if not request.user.is_authenticated or request.user.role != 'admin':
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+
+    upload = get_object_or_404(TrackUpload, pk=upload_id, user_id=request.user.pk)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Неверное смещение или длина блока'}, status=400)
+
+    try:
+        # Тело читается потоком из request, а не через request.body
+        received = uploads.write_chunk(upload, request, offset, length)
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e), 'offset': uploads.current_offset(upload)}, status=e.status)
+
+    return JsonResponse({
+        'success': True,
+        'offset': received,
+        'complete': upload.is_complete,
+    })
+
+
+@require_GET
+def api_upload_status(request, upload_id):
+    """API для получения смещения, с которого нужно продолжить загрузку"""
+    if not request.user.is_authenticated or request.user.role != 'admin':
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+
+    upload = get_object_or_404(TrackUpload, pk=upload_id, user_id=request.user.pk)
+    offset = upload.size if upload.status == 'complete' else uploads.current_offset(upload)
+
+    return JsonResponse({
+        'upload_id': str(upload.pk),
+        'offset': offset,
+        'size': upload.size,
+        'status': upload.status,
+    })
+
+
+@csrf_exempt
+@require_POST
+def api_upload_finalize(request, upload_id):
+    """API для завершения загрузки и прикрепления файла к треку"""
+    if not request.user.is_authenticated or request.user.role != 'admin':
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        track_id = data.get('track_id')
+
+        if not track_id:
+            return JsonResponse({'error': 'ID трека не указан'}, status=400)
+
+        track = get_object_or_404(Track, pk=track_id)
+        _attach_upload(request, upload_id, track)
+
+        # Длительность нового файла пересчитывается при постобработке
+        Track.objects.filter(pk=track.pk).update(file=track.file.name, duration=None)
+        run_in_background(process_track_file, track.pk)
+
+        return JsonResponse({'success': True, 'file_url': track.file.url})
+
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    except (ValueError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Неверные данные'}, status=400)
+
+
 # Админ панель представления
 @login_required
 def admin_panel(request):
@@ -848,6 +1305,15 @@ def admin_panel(request):
         'total_artists': total_artists,
         'total_groups': total_groups,
     }
+    # Аналитика — из витрины последнего среза (build_snapshots)
+    snapshot_at = snapshots.snapshot_time()
+    if snapshot_at:
+        context.update({
+            'snapshot_at': snapshot_at,
+            'activity': snapshots.activity_totals(days=30),
+            'top_track_facts': TrackFacts.objects.select_related('track').order_by('-play_count')[:5],
+            'top_genre_facts': GenreFacts.objects.select_related('genre').order_by('-track_count')[:5],
+        })
     return render(request, 'music/admin/admin_panel.html', context)
 
 
@@ -871,505 +1337,161 @@ def admin_send_email(request):
 
         recipients = []
         if target == 'all':
-            recipients = [u['email'] for u in users if u['email']]
+            recipients = list(User.objects.exclude(email='').values_list('email', flat=True))
         elif target.startswith('user:'):
             uid = target.split(':', 1)[1]
             user = User.objects.filter(pk=uid).first()
             if user and user.email:
                 recipients = [user.email]
 
-        # Отправляем письма через EmailMessage
-        try:
-            sent_count = 0
-            failed_emails = []
-            
-            for email in recipients:
-                try:
-                    msg = EmailMessage(
-                        subject=subject, 
-                        body=message, 
-                        from_email='yakov.goryachev@mail.ru',
-                        to=[email]
-                    )
-                    msg.send(fail_silently=False)
-                    sent_count += 1
-                    print(f"Email sent successfully to: {email}")
-                except Exception as email_error:
-                    print(f"Failed to send email to {email}: {str(email_error)}")
-                    failed_emails.append(email)
-                    continue
-
-            if sent_count > 0:
-                success_msg = f'Успешно отправлено {sent_count} писем'
-                if failed_emails:
-                    success_msg += f'. Не удалось отправить {len(failed_emails)} писем'
-                messages.success(request, success_msg)
-            else:
-                messages.error(request, 'Не удалось отправить ни одного письма')
-                
-            return redirect('music:admin_panel')
-            
-        except Exception as e:
-            print(f"Email sending error: {str(e)}")
-            messages.error(request, f'Ошибка отправки: {str(e)}')
+        if not recipients:
+            messages.error(request, 'Нет получателей с указанным email')
             return redirect('music:admin_send_email')
 
+        # Письма уходят фоновым обработчиком очереди (mailing.py), прогресс — на этой странице
+        campaign = mailing.enqueue(subject, message, recipients, user=request.user)
+        messages.success(request, f'Рассылка поставлена в очередь: {campaign.emails.count()} писем')
+        return redirect('music:admin_send_email')
+
+    campaigns = list(EmailCampaign.objects.select_related('created_by').order_by('-created_at')[:10])
+    for campaign in campaigns:
+        campaign.progress = mailing.progress(campaign.pk)
+
     context = {
         'users': users,
+        'campaigns': campaigns,
     }
     return render(request, 'music/admin/admin_send_email.html', context)
 
 
+@login_required
+@require_GET
+def admin_email_campaign_status(request, campaign_id):
+    """Прогресс рассылки (JSON для опроса со страницы рассылок)"""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+
+    campaign = get_object_or_404(EmailCampaign, pk=campaign_id)
+    return JsonResponse(mailing.progress(campaign.pk))
+
+
 @login_required
 def admin_reports(request):
     if not request.user.role == 'admin':
         messages.error(request, 'Доступ запрещен. Требуются права администратора.')
         return redirect('music:admin_panel')
 
-    return render(request, 'music/admin/admin_reports.html')
+    job = None
+    job_id = request.GET.get('job')
+    if job_id:
+        try:
+            job = ReportJob.objects.filter(pk=uuid.UUID(job_id)).first()
+        except ValueError:
+            pass
+    exports_list = [
+        (name, title) for name, (title, _, _) in exports.EXPORTS.items()
+        if not name.startswith(exports.STATS_PREFIX)
+    ]
+    # Пока таблицы считаются в фоне, страница показывает «ещё не готово»
+    stats = distributions.summary()
+    stats_tables = None if stats is None else [
+        (exports.STATS_PREFIX + name, title, header, stats[name])
+        for name, (title, header, _) in distributions.TABLES.items()
+    ]
+    return render(request, 'music/admin/admin_reports.html', {
+        'job': job, 'exports': exports_list, 'stats_tables': stats_tables,
+    })
 
 
 @login_required
 def admin_generate_report(request):
-    """Генерация расширенных отчетов с аналитикой"""
+    """Запуск построения отчета в фоне; готовый отчет для тех же данных отдается сразу"""
     if not request.user.role == 'admin':
         messages.error(request, 'Доступ запрещен. Требуются права администратора.')
         return redirect('music:admin_panel')
 
     fmt = request.GET.get('format', 'xlsx')
-    
-    # Импорты для генерации отчетов
-    try:
-        import openpyxl
-        from openpyxl.utils import get_column_letter
-    except ImportError:
-        messages.error(request, 'Требуется пакет openpyxl для генерации Excel. Установите его: pip install openpyxl')
+    if fmt not in reports.FORMATS:
+        messages.error(request, 'Неподдерживаемый формат')
         return redirect('music:admin_reports')
-    
+
+    # Проверяем библиотеки заранее, чтобы не ставить заведомо невыполнимое задание
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        from reportlab.lib.fonts import addMapping
+        if fmt == 'xlsx':
+            import openpyxl  # noqa: F401
+        else:
+            import reportlab  # noqa: F401
     except ImportError:
-        messages.error(request, 'Требуется пакет reportlab для генерации PDF. Установите его: pip install reportlab')
+        package = 'openpyxl' if fmt == 'xlsx' else 'reportlab'
+        messages.error(request, f'Требуется пакет {package} для генерации отчета. Установите его: pip install {package}')
         return redirect('music:admin_reports')
 
-    # === ОСНОВНАЯ СТАТИСТИКА ===
-    total_users = User.objects.count()
-    total_tracks = Track.objects.count()
-    total_albums = Album.objects.count()
-    total_artists = Artist.objects.count()
-    total_groups = Group.objects.count()
-    total_playlists = Playlist.objects.count()
-    total_comments = Comment.objects.count()
-    total_track_ratings = TrackRating.objects.count()
-    total_album_ratings = AlbumRating.objects.count()
-    total_genres = Genre.objects.count()
-
-    # === ПОПУЛЯРНОСТЬ ===
-    top_tracks = Track.objects.annotate(cnt=Sum('play_count')).order_by('-cnt')[:20]
-    # Для альбомов считаем сумму прослушиваний всех треков
-    top_albums = Album.objects.annotate(
-        total_plays=Sum('track__play_count')
-    ).filter(total_plays__isnull=False).order_by('-total_plays')[:20]
-    top_artists_by_albums = Artist.objects.annotate(albums_count=Count('album')).order_by('-albums_count')[:20]
-    top_groups_by_albums = Group.objects.annotate(albums_count=Count('album')).order_by('-albums_count')[:20]
-
-    # === РЕЙТИНГИ ===
-    best_tracks = Track.objects.annotate(avg=Avg('ratings__value')).filter(avg__isnull=False).order_by('-avg')[:20]
-    worst_tracks = Track.objects.annotate(avg=Avg('ratings__value')).filter(avg__isnull=False).order_by('avg')[:20]
-    best_albums = Album.objects.annotate(avg=Avg('ratings__value')).filter(avg__isnull=False).order_by('-avg')[:20]
-
-    # === ЖАНРОВАЯ АНАЛИТИКА ===
-    genre_stats = Genre.objects.annotate(
-        tracks_count=Count('track'),
-        avg_rating=Avg('track__ratings__value')
-    ).order_by('-tracks_count')[:15]
-
-    # === ПОЛЬЗОВАТЕЛЬСКАЯ АКТИВНОСТЬ ===
-    most_active_users = User.objects.annotate(
-        playlists_count=Count('playlists'),
-        comments_count=Count('comment'),
-        ratings_count=Count('trackrating') + Count('albumrating')
-    ).order_by('-playlists_count')[:15]
-
-    # === ВРЕМЕННАЯ АНАЛИТИКА ===
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    # Новые пользователи за последние 30 дней
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    new_users_30d = User.objects.filter(registration_date__gte=thirty_days_ago).count()
-    
-    # Новые плейлисты за последние 30 дней
-    new_playlists_30d = Playlist.objects.filter(creation_date__gte=thirty_days_ago).count()
-    
-    # Новые комментарии за последние 30 дней
-    new_comments_30d = Comment.objects.filter(created_at__gte=thirty_days_ago).count()
-
-    # === САМЫЕ ДЛИННЫЕ И КОРОТКИЕ ТРЕКИ ===
-    longest_tracks = Track.objects.filter(duration__isnull=False).order_by('-duration')[:10]
-    shortest_tracks = Track.objects.filter(duration__isnull=False).order_by('duration')[:10]
-
-    # === АЛЬБОМЫ ПО ГОДАМ ===
-    # Для SQLite используем strftime вместо EXTRACT
-    albums_by_year = Album.objects.filter(release_date__isnull=False).extra(
-        select={'year': "strftime('%Y', release_date)"}
-    ).values('year').annotate(count=Count('id')).order_by('-year')[:10]
-
-    # === САМЫЕ КОММЕНТИРУЕМЫЕ ТРЕКИ ===
-    most_commented_tracks = Track.objects.annotate(
-        comments_count=Count('comment')
-    ).filter(comments_count__gt=0).order_by('-comments_count')[:15]
-
-    # === СТАТИСТИКА ПО РОЛЯМ ПОЛЬЗОВАТЕЛЕЙ ===
-    users_by_role = User.objects.values('role').annotate(count=Count('id')).order_by('-count')
-
-    # === САМЫЕ ПОПУЛЯРНЫЕ ПЛЕЙЛИСТЫ ===
-    popular_playlists = Playlist.objects.annotate(
-        tracks_count=Count('tracks')
-    ).order_by('-tracks_count')[:15]
+    job = reports.request_report(fmt, request.user)
+    if job.status == 'done':
+        return redirect('music:admin_report_download', job_id=job.pk)
+    return redirect(f"{reverse('music:admin_reports')}?{urlencode({'job': job.pk})}")
 
-    if fmt == 'xlsx':
 
-        wb = openpyxl.Workbook()
-        
-        # === ОСНОВНАЯ СТАТИСТИКА ===
-        ws = wb.active
-        ws.title = 'Общая статистика'
-        ws.append(['Метрика', 'Значение'])
-        ws.append(['Пользователи', total_users])
-        ws.append(['Треки', total_tracks])
-        ws.append(['Альбомы', total_albums])
-        ws.append(['Артисты', total_artists])
-        ws.append(['Группы', total_groups])
-        ws.append(['Плейлисты', total_playlists])
-        ws.append(['Комментарии', total_comments])
-        ws.append(['Оценки треков', total_track_ratings])
-        ws.append(['Оценки альбомов', total_album_ratings])
-        ws.append(['Жанры', total_genres])
-        ws.append(['', ''])
-        ws.append(['=== АКТИВНОСТЬ ЗА 30 ДНЕЙ ===', ''])
-        ws.append(['Новые пользователи', new_users_30d])
-        ws.append(['Новые плейлисты', new_playlists_30d])
-        ws.append(['Новые комментарии', new_comments_30d])
-
-        # === ТОП ТРЕКОВ ПО ПРОСЛУШИВАНИЯМ ===
-        ws2 = wb.create_sheet('Топ треков по прослушиваниям')
-        ws2.append(['#', 'Название трека', 'Прослушивания', 'Альбом'])
-        for i, t in enumerate(top_tracks, start=1):
-            album_name = t.album.name if t.album else 'Без альбома'
-            ws2.append([i, t.name, t.play_count or 0, album_name])
-
-        # === ТОП АЛЬБОМОВ ПО ПРОСЛУШИВАНИЯМ ===
-        ws3 = wb.create_sheet('Топ альбомов по прослушиваниям')
-        ws3.append(['#', 'Название альбома', 'Прослушивания', 'Группа/Артист'])
-        for i, a in enumerate(top_albums, start=1):
-            artist_name = a.group.name if a.group else (a.artist.name if a.artist else 'Неизвестно')
-            ws3.append([i, a.name, a.total_plays or 0, artist_name])
-
-        # === ТОП АРТИСТОВ ПО КОЛИЧЕСТВУ АЛЬБОМОВ ===
-        ws4 = wb.create_sheet('Топ артистов по альбомам')
-        ws4.append(['#', 'Имя артиста', 'Количество альбомов'])
-        for i, a in enumerate(top_artists_by_albums, start=1):
-            ws4.append([i, a.name, a.albums_count])
-
-        # === ТОП ГРУПП ПО КОЛИЧЕСТВУ АЛЬБОМОВ ===
-        ws5 = wb.create_sheet('Топ групп по альбомам')
-        ws5.append(['#', 'Название группы', 'Количество альбомов'])
-        for i, g in enumerate(top_groups_by_albums, start=1):
-            ws5.append([i, g.name, g.albums_count])
-
-        # === ЛУЧШИЕ ТРЕКИ ПО РЕЙТИНГУ ===
-        ws6 = wb.create_sheet('Лучшие треки по рейтингу')
-        ws6.append(['#', 'Название трека', 'Средний рейтинг', 'Количество оценок'])
-        for i, t in enumerate(best_tracks, start=1):
-            rating_count = t.ratings.count()
-            ws6.append([i, t.name, round(t.avg, 2), rating_count])
-
-        # === ХУДШИЕ ТРЕКИ ПО РЕЙТИНГУ ===
-        ws7 = wb.create_sheet('Худшие треки по рейтингу')
-        ws7.append(['#', 'Название трека', 'Средний рейтинг', 'Количество оценок'])
-        for i, t in enumerate(worst_tracks, start=1):
-            rating_count = t.ratings.count()
-            ws7.append([i, t.name, round(t.avg, 2), rating_count])
-
-        # === ЛУЧШИЕ АЛЬБОМЫ ПО РЕЙТИНГУ ===
-        ws8 = wb.create_sheet('Лучшие альбомы по рейтингу')
-        ws8.append(['#', 'Название альбома', 'Средний рейтинг', 'Количество оценок'])
-        for i, a in enumerate(best_albums, start=1):
-            rating_count = a.ratings.count()
-            ws8.append([i, a.name, round(a.avg, 2), rating_count])
-
-        # === ЖАНРОВАЯ СТАТИСТИКА ===
-        ws9 = wb.create_sheet('Статистика по жанрам')
-        ws9.append(['#', 'Жанр', 'Количество треков', 'Средний рейтинг'])
-        for i, g in enumerate(genre_stats, start=1):
-            avg_rating = round(g.avg_rating, 2) if g.avg_rating else 0
-            ws9.append([i, g.name, g.tracks_count, avg_rating])
-
-        # === САМЫЕ АКТИВНЫЕ ПОЛЬЗОВАТЕЛИ ===
-        ws10 = wb.create_sheet('Самые активные пользователи')
-        ws10.append(['#', 'Пользователь', 'Плейлисты', 'Комментарии', 'Оценки'])
-        for i, u in enumerate(most_active_users, start=1):
-            ws10.append([i, u.login, u.playlists_count, u.comments_count, u.ratings_count])
-
-        # === САМЫЕ ДЛИННЫЕ ТРЕКИ ===
-        ws11 = wb.create_sheet('Самые длинные треки')
-        ws11.append(['#', 'Название трека', 'Длительность (мин:сек)', 'Альбом'])
-        for i, t in enumerate(longest_tracks, start=1):
-            duration_min = t.duration // 60
-            duration_sec = t.duration % 60
-            duration_str = f"{duration_min}:{duration_sec:02d}"
-            album_name = t.album.name if t.album else 'Без альбома'
-            ws11.append([i, t.name, duration_str, album_name])
-
-        # === САМЫЕ КОРОТКИЕ ТРЕКИ ===
-        ws12 = wb.create_sheet('Самые короткие треки')
-        ws12.append(['#', 'Название трека', 'Длительность (мин:сек)', 'Альбом'])
-        for i, t in enumerate(shortest_tracks, start=1):
-            duration_min = t.duration // 60
-            duration_sec = t.duration % 60
-            duration_str = f"{duration_min}:{duration_sec:02d}"
-            album_name = t.album.name if t.album else 'Без альбома'
-            ws12.append([i, t.name, duration_str, album_name])
-
-        # === АЛЬБОМЫ ПО ГОДАМ ===
-        ws13 = wb.create_sheet('Альбомы по годам')
-        ws13.append(['Год', 'Количество альбомов'])
-        for year_data in albums_by_year:
-            ws13.append([int(year_data['year']), year_data['count']])
-
-        # === САМЫЕ КОММЕНТИРУЕМЫЕ ТРЕКИ ===
-        ws14 = wb.create_sheet('Самые комментируемые треки')
-        ws14.append(['#', 'Название трека', 'Количество комментариев', 'Альбом'])
-        for i, t in enumerate(most_commented_tracks, start=1):
-            album_name = t.album.name if t.album else 'Без альбома'
-            ws14.append([i, t.name, t.comments_count, album_name])
-
-        # === СТАТИСТИКА ПО РОЛЯМ ===
-        ws15 = wb.create_sheet('Пользователи по ролям')
-        ws15.append(['Роль', 'Количество'])
-        for role_data in users_by_role:
-            role_name = {'user': 'Пользователь', 'admin': 'Администратор', 'moderator': 'Модератор'}.get(role_data['role'], role_data['role'])
-            ws15.append([role_name, role_data['count']])
-
-        # === ПОПУЛЯРНЫЕ ПЛЕЙЛИСТЫ ===
-        ws16 = wb.create_sheet('Популярные плейлисты')
-        ws16.append(['#', 'Название плейлиста', 'Количество треков', 'Владелец', 'Публичный'])
-        for i, p in enumerate(popular_playlists, start=1):
-            is_public = 'Да' if p.is_public else 'Нет'
-            ws16.append([i, p.name, p.tracks_count, p.user.login, is_public])
-
-        out = io.BytesIO()
-        wb.save(out)
-        out.seek(0)
-
-        response = HttpResponse(out.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename="music_advanced_report.xlsx"'
-        return response
+@login_required
+@require_GET
+def admin_report_status(request, job_id):
+    """Прогресс фонового построения отчета (JSON для опроса со страницы отчетов)"""
+    if request.user.role != 'admin':
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
 
-    elif fmt == 'pdf':
+    job = get_object_or_404(ReportJob, pk=job_id)
+    data = {'status': job.status, 'progress': job.progress, 'format': job.format}
+    if job.status == 'done':
+        data['download_url'] = reverse('music:admin_report_download', args=[job.pk])
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return JsonResponse(data)
 
-        # Настройка шрифтов для поддержки кириллицы
-        try:
-            # Попробуем использовать системный шрифт Arial
-            pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
-            pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
-            font_name = 'Arial'
-            font_bold = 'Arial-Bold'
-        except:
-            # Fallback на встроенные шрифты ReportLab с поддержкой Unicode
-            font_name = 'Helvetica'
-            font_bold = 'Helvetica-Bold'
-        
-        # Функция для безопасного отображения текста
-        def safe_text(text):
-            if text is None:
-                return ""
-            # Заменяем проблемные символы на безопасные
-            return str(text).encode('utf-8', 'replace').decode('utf-8', 'replace')
-
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        y = height - 40
-        c.setFont(font_bold, 14)
-        c.drawString(40, y, 'Music Service - Report')
-        y -= 30
-        # Summary
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Общая статистика')
-        y -= 20
-        c.setFont(font_name, 10)
-        for label, value in [
-            ('Пользователи', total_users),
-            ('Треки', total_tracks),
-            ('Альбомы', total_albums),
-            ('Артисты', total_artists),
-            ('Группы', total_groups),
-            ('Плейлисты', total_playlists),
-            ('Комментарии', total_comments),
-            ('Оценки треков', total_track_ratings),
-            ('Оценки альбомов', total_album_ratings),
-            ('Жанры', total_genres),
-        ]:
-            c.drawString(40, y, f"{label}: {value}")
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Активность за 30 дней
-        if y < 100:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Активность за 30 дней')
-        y -= 20
-        c.setFont(font_name, 10)
-        for label, value in [
-            ('Новые пользователи', new_users_30d),
-            ('Новые плейлисты', new_playlists_30d),
-            ('Новые комментарии', new_comments_30d),
-        ]:
-            c.drawString(40, y, f"{label}: {value}")
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Top Tracks by plays
-        if y < 140:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Топ треков по прослушиваниям')
-        y -= 20
-        c.setFont(font_name, 10)
-        for i, t in enumerate(top_tracks[:15], start=1):
-            line = f"{i}. {safe_text(t.name)} — {t.play_count or 0} прослушиваний"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Best Tracks by rating
-        if y < 140:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Лучшие треки по рейтингу')
-        y -= 20
-        c.setFont(font_name, 10)
-        for i, t in enumerate(best_tracks[:15], start=1):
-            rating_count = t.ratings.count()
-            line = f"{i}. {safe_text(t.name)} — {round(t.avg, 2)} ({rating_count} оценок)"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Top Albums by plays
-        if y < 140:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Топ альбомов по прослушиваниям')
-        y -= 20
-        c.setFont(font_name, 10)
-        for i, a in enumerate(top_albums[:15], start=1):
-            line = f"{i}. {safe_text(a.name)} — {a.total_plays or 0} прослушиваний"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Genre Statistics
-        if y < 140:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Статистика по жанрам')
-        y -= 20
-        c.setFont(font_name, 10)
-        for i, g in enumerate(genre_stats[:10], start=1):
-            avg_rating = round(g.avg_rating, 2) if g.avg_rating else 0
-            line = f"{i}. {safe_text(g.name)} — {g.tracks_count} треков, рейтинг: {avg_rating}"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Most Active Users
-        if y < 140:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Самые активные пользователи')
-        y -= 20
-        c.setFont(font_name, 10)
-        for i, u in enumerate(most_active_users[:10], start=1):
-            line = f"{i}. {safe_text(u.login)} — {u.playlists_count} плейлистов, {u.comments_count} комментариев"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Longest Tracks
-        if y < 140:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Самые длинные треки')
-        y -= 20
-        c.setFont(font_name, 10)
-        for i, t in enumerate(longest_tracks[:10], start=1):
-            duration_min = t.duration // 60
-            duration_sec = t.duration % 60
-            duration_str = f"{duration_min}:{duration_sec:02d}"
-            line = f"{i}. {safe_text(t.name)} — {duration_str}"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        # Most Commented Tracks
-        if y < 140:
-            c.showPage()
-            y = height - 40
-        c.setFont(font_bold, 12)
-        c.drawString(40, y, 'Самые комментируемые треки')
-        y -= 20
-        c.setFont(font_name, 10)
-        for i, t in enumerate(most_commented_tracks[:10], start=1):
-            line = f"{i}. {safe_text(t.name)} — {t.comments_count} комментариев"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 80:
-                c.showPage()
-                y = height - 40
-
-        c.showPage()
-        c.save()
-        buffer.seek(0)
-        
-        # Создаем HttpResponse с правильными заголовками для скачивания
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="music_service_report.pdf"'
-        return response
 
-    else:
-        messages.error(request, 'Неподдерживаемый формат')
+@login_required
+def admin_report_download(request, job_id):
+    """Скачивание готового отчета"""
+    if request.user.role != 'admin':
+        messages.error(request, 'Доступ запрещен. Требуются права администратора.')
+        return redirect('music:admin_panel')
+
+    job = get_object_or_404(ReportJob, pk=job_id)
+    if job.status != 'done' or not job.file:
+        messages.error(request, 'Отчет еще не готов')
+        return redirect(f"{reverse('music:admin_reports')}?{urlencode({'job': job.pk})}")
+
+    content_type, filename = reports.attachment(job)
+    return streaming.file_response(request, job.file.open('rb'), filename, content_type, job.file.size)
+
+
+@login_required
+@require_GET
+def admin_export(request, name):
+    """Выгрузка полной таблицы: CSV потоком, XLSX — фоновым заданием отчёта"""
+    if request.user.role != 'admin':
+        messages.error(request, 'Доступ запрещен. Требуются права администратора.')
+        return redirect('music:admin_panel')
+
+    fmt = request.GET.get('format', 'csv')
+    if name not in exports.EXPORTS or fmt not in exports.FORMATS:
+        messages.error(request, 'Неподдерживаемая выгрузка')
+        return redirect('music:admin_reports')
+    if name.startswith(exports.STATS_PREFIX) and distributions.summary() is None:
+        messages.info(request, 'Распределения ещё не готовы. Повторите выгрузку через минуту.')
         return redirect('music:admin_reports')
+    if fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            messages.error(request, 'Требуется пакет openpyxl для выгрузки. Установите его: pip install openpyxl')
+            return redirect('music:admin_reports')
+        # Книга собирается в фоне, страница отчётов скачает её по готовности
+        job = reports.request_report(fmt, request.user, export=name)
+        if job.status == 'done':
+            return redirect('music:admin_report_download', job_id=job.pk)
+        return redirect(f"{reverse('music:admin_reports')}?{urlencode({'job': job.pk})}")
+
+    return exports.csv_response(request, name)
 
 
 @login_required
@@ -1467,6 +1589,13 @@ def admin_create_track(request):
                     duration=duration
                 )
                 
+                # Файл, загруженный поблочно, прикрепляем к созданному треку
+                upload_id = request.POST.get('upload_id')
+                if upload_id:
+                    _attach_upload(request, upload_id, track)
+                    track.save(update_fields=['file'])
+                    run_in_background(process_track_file, track.pk)
+                
                 # Создаем или получаем жанры
                 for genre_name in genre_names:
                     if genre_name:
@@ -1523,7 +1652,10 @@ def admin_edit_track(request, pk):
                     track.duration = None
                 
                 # Обработка загрузки нового файла
-                if 'file' in request.FILES:
+                upload_id = request.POST.get('upload_id')
+                if upload_id:
+                    _attach_upload(request, upload_id, track)
+                elif 'file' in request.FILES:
                     track.file = request.FILES['file']
                 
                 # Обработка загрузки нового фото
@@ -1568,6 +1700,9 @@ def admin_edit_track(request, pk):
                 track.album = album
                 track.save()
                 
+                if upload_id:
+                    run_in_background(process_track_file, track.pk)
+                
                 # Обновляем жанры
                 track.genres.clear()
                 for genre_id in genre_ids:
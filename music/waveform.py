@@ -0,0 +1,59 @@
+"""Расчёт пиков волновой формы трека.
+
+Пики хранятся как массив int8 вида [min0, max0, min1, max1, ...],
+по ``peaks_per_second`` пар на секунду звучания. Для 5-минутного трека
+при 10 парах в секунду это 6000 байт.
+"""
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .audio import open_audio
+
+
+def compute_peaks(blocks, sample_rate, peaks_per_second):
+    """Считает пары (min, max) по блокам отсчётов, не загружая файл целиком"""
+    samples_per_peak = max(1, int(round(sample_rate / peaks_per_second)))
+    leftover = np.empty(0, dtype=np.float32)
+    mins, maxs = [], []
+
+    for block in blocks:
+        data = np.concatenate((leftover, block)) if leftover.size else block
+        usable = data.size - data.size % samples_per_peak
+        if usable:
+            frames = data[:usable].reshape(-1, samples_per_peak)
+            mins.append(frames.min(axis=1))
+            maxs.append(frames.max(axis=1))
+        leftover = data[usable:]
+
+    if leftover.size:
+        mins.append(leftover.min(keepdims=True))
+        maxs.append(leftover.max(keepdims=True))
+
+    if not mins:
+        return np.empty(0, dtype=np.int8)
+
+    peaks = np.empty((sum(m.size for m in mins), 2), dtype=np.float32)
+    peaks[:, 0] = np.concatenate(mins)
+    peaks[:, 1] = np.concatenate(maxs)
+    return np.clip(np.round(peaks * 127), -127, 127).astype(np.int8).ravel()
+
+
+def build_waveform(track):
+    """Декодирует файл трека и сохраняет его пики"""
+    from .models import TrackWaveform
+
+    peaks_per_second = settings.WAVEFORM_PEAKS_PER_SECOND
+    sample_rate, blocks = open_audio(track.file.path)
+    peaks = compute_peaks(blocks, sample_rate, peaks_per_second)
+
+    waveform, _ = TrackWaveform.objects.update_or_create(
+        track=track,
+        defaults={
+            'peaks': peaks.tobytes(),
+            'peaks_per_second': peaks_per_second,
+            'source': track.file.name,
+            'computed_at': timezone.now(),
+        },
+    )
+    return waveform
@@ -0,0 +1,24 @@
+#!/bin/sh
+# Запускает команду manage.py на временном локальном PostgreSQL.
+#
+#   ./run_with_postgres.sh test
+#   ./run_with_postgres.sh benchmark_api --requests 500
+#
+# Нужны initdb/pg_ctl (пакет postgresql) в PATH. Кластер создаётся во
+# временном каталоге, слушает только unix-сокет и удаляется при выходе.
+set -e
+
+PGDATA=$(mktemp -d)
+DB_PORT=${DB_PORT:-54329}
+export PGDATA DB_PORT
+
+initdb -D "$PGDATA" -U music --auth=trust >/dev/null
+pg_ctl -D "$PGDATA" -o "-p $DB_PORT -k $PGDATA -c listen_addresses=''" -l "$PGDATA/postgres.log" -w start >/dev/null
+trap 'pg_ctl -D "$PGDATA" -m fast -w stop >/dev/null; rm -rf "$PGDATA"' EXIT
+createdb -h "$PGDATA" -p "$DB_PORT" -U music music
+createdb -h "$PGDATA" -p "$DB_PORT" -U music music_analytics
+
+export DB_ENGINE=postgres DB_HOST="$PGDATA" DB_USER=music DB_NAME=music
+python manage.py migrate --noinput >/dev/null
+python manage.py migrate --database=analytics --noinput >/dev/null
+python manage.py "$@"